@@ -0,0 +1,445 @@
+# Compressed log file backend for Log Insight
+# Kept free of Qt imports like the plain file backend it builds on
+
+import bz2
+import lzma
+import os
+import threading
+import weakref
+import zlib
+from array import array
+from bisect import bisect_right
+from concurrent.futures import Executor
+from itertools import accumulate, repeat
+from operator import add
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional
+
+from log_file import LogFile, parse_timestamps_and_levels
+from perf_trace import tracer
+from stream_decoders import (Bzip2BlockDecoder, GzipInflater, SeekPoint, StreamCheckpoint,
+                             gzip_checkpoints_supported)
+
+# zstd is in the standard library from Python 3.14 on, older versions need the zstandard package
+try:
+    from compression import zstd
+except ImportError:
+    zstd = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Leading bytes of every supported compression format
+MAGIC_NUMBERS: Dict[str, bytes] = {
+    'gzip': b'\x1f\x8b',
+    'bzip2': b'BZh',
+    'xz': b'\xfd7zXZ\x00',
+    'zstd': b'\x28\xb5\x2f\xfd',
+}
+
+# Extensions offered in the file dialog
+COMPRESSED_EXTENSIONS: List[str] = ['.gz', '.bz2', '.xz', '.zst']
+
+
+def compression_format(path: str) -> Optional[str]:
+    """Detect the compression format of a file from its leading bytes
+
+    Returns:
+        Name of the format, None for files that are not compressed
+    """
+    try:
+        with open(path, 'rb') as file:
+            head = file.read(max(map(len, MAGIC_NUMBERS.values())))
+    except OSError:
+        return None
+    for name, magic in MAGIC_NUMBERS.items():
+        if head.startswith(magic):
+            return name
+    return None
+
+
+def new_decompressor(compression: str) -> Any:
+    """Create a decompressor for one gzip member, bzip2 stream, xz stream or zstd frame
+
+    Raises:
+        ValueError: If the format is unknown or zstd support is not installed
+    """
+    if compression == 'gzip':
+        # Expect a gzip header
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if compression == 'bzip2':
+        return bz2.BZ2Decompressor()
+    if compression == 'xz':
+        return lzma.LZMADecompressor(lzma.FORMAT_XZ)
+    if compression == 'zstd':
+        if zstd is not None:
+            return zstd.ZstdDecompressor()
+        if zstandard is not None:
+            return zstandard.ZstdDecompressor().decompressobj()
+        raise ValueError("Reading zstd compressed files requires Python 3.14 or the zstandard package")
+    raise ValueError(f"Unknown compression format: {compression}")
+
+
+class _Cursor:
+    """Decompression position of one thread, with the data decompressed last"""
+
+    def __init__(self, path: str) -> None:
+        self.file: BinaryIO = open(path, 'rb')
+        self.decompressor: Any = None
+        # Offset of the next compressed byte to feed the decompressor
+        self.file_offset: int = 0
+        # Recently decompressed data and its offset in the decompressed data
+        self.buffer: bytearray = bytearray()
+        self.buffer_start: int = 0
+        self.at_end: bool = False
+
+    @property
+    def buffer_end(self) -> int:
+        return self.buffer_start + len(self.buffer)
+
+
+class DecompressedData:
+    """Random access to the decompressed content of a compressed file
+
+    Reads decompress sequentially from the nearest seek point at or before
+    the requested range. Every thread has its own cursor, so a thread reading
+    on through the data decompresses every byte only once, whatever other
+    threads read meanwhile.
+
+    Seek points are recorded wherever a new gzip member, bzip2 or xz stream
+    or zstd frame starts, as decompression can start afresh there. Within a
+    gzip member, a checkpoint with the bit position and the last 32 KB of
+    data is recorded at the first deflate block boundary after every
+    CHECKPOINT_SIZE bytes, and within a bzip2 stream at every block, see
+    stream_decoders. All of these are stored in the sidecar file, so a
+    reopened file seeks like one read before. Without the zlib C library,
+    gzip members fall back to copies of the zlib state, which only live in
+    memory. The xz and zstd formats have no such restart points inside a
+    stream or frame, so single stream files of these formats are
+    decompressed from the start for every backwards jump.
+    """
+
+    # Compressed bytes fed to the decompressor per step
+    INPUT_SIZE: int = 64 * 1024
+
+    # Decompressed bytes between gzip checkpoints
+    CHECKPOINT_SIZE: int = 8 * 1024 * 1024
+
+    # Decompressed bytes kept before the last read, so that nearby reads need no seek
+    KEEP_SIZE: int = 1024 * 1024
+
+    def __init__(self, path: str, compression: str) -> None:
+        self.path: str = path
+        self.compression: str = compression
+        # Size of the decompressed data, None until a cursor reached the end
+        self.size: Optional[int] = None
+        # Seek points ordered by data_offset, and their data offsets for bisection
+        self.seek_points: List[SeekPoint] = [SeekPoint(0, 0, None)]
+        self._seek_offsets: List[int] = [0]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # Cursors of live threads, a cursor goes away with its thread
+        self._cursors: weakref.WeakSet = weakref.WeakSet()
+        # Fail early for formats that cannot be read
+        new_decompressor(compression)
+
+    def read(self, start: int, end: int) -> bytes:
+        """Read a range of the decompressed data, shorter if the data ends before end"""
+        if end <= start:
+            return b''
+        cursor = self._cursor()
+        seek_point = self._seek_point_before(start)
+        if start < cursor.buffer_start or seek_point.data_offset > cursor.buffer_end or cursor.decompressor is None:
+            self._restore(cursor, seek_point)
+
+        if cursor.buffer_end < end and not cursor.at_end:
+            with tracer.span("decompress", start=start, end=end):
+                while cursor.buffer_end < end and not cursor.at_end:
+                    self._advance(cursor)
+                    # Drop data before the range while skipping forward, keeping a little for nearby reads
+                    if start - cursor.buffer_start > 2 * self.KEEP_SIZE:
+                        self._trim(cursor, start)
+        self._trim(cursor, start)
+        return bytes(cursor.buffer[start - cursor.buffer_start:end - cursor.buffer_start])
+
+    def persistent_seek_points(self) -> List[SeekPoint]:
+        """Get the seek points that need no in-memory decompressor state, which can be persisted"""
+        with self._lock:
+            return [seek_point for seek_point in self.seek_points
+                    if seek_point.state is None or isinstance(seek_point.state, StreamCheckpoint)]
+
+    def add_seek_points(self, seek_points: Iterable[SeekPoint]) -> None:
+        """Add persisted seek points, see persistent_seek_points"""
+        for seek_point in seek_points:
+            self._add_seek_point(seek_point)
+
+    def close(self) -> None:
+        """Close the file handles of all cursors"""
+        with self._lock:
+            for cursor in self._cursors:
+                cursor.file.close()
+
+    def _cursor(self) -> _Cursor:
+        """Get the cursor of the current thread"""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None or cursor.file.closed:
+            cursor = _Cursor(self.path)
+            self._local.cursor = cursor
+            with self._lock:
+                self._cursors.add(cursor)
+        return cursor
+
+    def _seek_point_before(self, offset: int) -> SeekPoint:
+        """Get the last seek point at or before a data offset"""
+        with self._lock:
+            return self.seek_points[bisect_right(self._seek_offsets, offset) - 1]
+
+    def _add_seek_point(self, seek_point: SeekPoint) -> None:
+        """Record a seek point unless there is one at its data offset already"""
+        with self._lock:
+            index = bisect_right(self._seek_offsets, seek_point.data_offset)
+            if self._seek_offsets[index - 1] == seek_point.data_offset:
+                return
+            self._seek_offsets.insert(index, seek_point.data_offset)
+            self.seek_points.insert(index, seek_point)
+
+    def _new_decompressor(self, data_offset: int, file_offset: int,
+                          checkpoint: Optional[StreamCheckpoint] = None) -> Any:
+        """Create a decompressor starting at a member, stream or frame start or at a checkpoint
+
+        Args:
+            data_offset: Offset in the decompressed data of the first output byte
+            file_offset: Offset in the file of the first input byte
+            checkpoint: Checkpoint to resume from, None at a member, stream or frame start
+        """
+        if self.compression == 'gzip' and gzip_checkpoints_supported():
+            return GzipInflater(data_offset, file_offset, self.CHECKPOINT_SIZE, checkpoint)
+        if self.compression == 'bzip2':
+            return Bzip2BlockDecoder(data_offset, file_offset, checkpoint)
+        return new_decompressor(self.compression)
+
+    def _restore(self, cursor: _Cursor, seek_point: SeekPoint) -> None:
+        """Move a cursor to a seek point"""
+        if seek_point.state is None or isinstance(seek_point.state, StreamCheckpoint):
+            cursor.decompressor = self._new_decompressor(seek_point.data_offset, seek_point.file_offset,
+                                                         seek_point.state)
+        else:
+            # Copy again, the stored state has to stay untouched for later restores
+            cursor.decompressor = seek_point.state.copy()
+        cursor.file_offset = seek_point.file_offset
+        cursor.file.seek(seek_point.file_offset)
+        cursor.buffer = bytearray()
+        cursor.buffer_start = seek_point.data_offset
+        cursor.at_end = False
+
+    def _trim(self, cursor: _Cursor, start: int) -> None:
+        """Drop buffered data more than KEEP_SIZE bytes before a data offset"""
+        excess = min(start - self.KEEP_SIZE - cursor.buffer_start, len(cursor.buffer))
+        if excess > 0:
+            del cursor.buffer[:excess]
+            cursor.buffer_start += excess
+
+    def _advance(self, cursor: _Cursor) -> None:
+        """Decompress the next input step of a cursor into its buffer"""
+        data = cursor.file.read(self.INPUT_SIZE)
+        if not data:
+            cursor.at_end = True
+            self.size = cursor.buffer_end
+            return
+
+        input_start = cursor.file_offset
+        cursor.file_offset += len(data)
+        while data:
+            if cursor.decompressor.eof:
+                if not data.strip(b'\0'):
+                    # Some tools pad compressed files with zero bytes
+                    break
+                # A new member, stream or frame starts where the previous one ended
+                self._add_seek_point(SeekPoint(cursor.buffer_end, input_start, None))
+                cursor.decompressor = self._new_decompressor(cursor.buffer_end, input_start)
+            cursor.buffer += cursor.decompressor.decompress(data)
+            # Checkpoints the decompressor recorded on the way
+            seek_points = getattr(cursor.decompressor, 'seek_points', None)
+            if seek_points:
+                self.add_seek_points(seek_points)
+                seek_points.clear()
+            if not cursor.decompressor.eof:
+                break
+            unused = cursor.decompressor.unused_data
+            input_start = cursor.file_offset - len(unused)
+            data = unused
+
+        # Without checkpoints of its own, copy the state now and then where the decompressor supports it
+        if (hasattr(cursor.decompressor, 'copy') and not cursor.decompressor.eof
+                and cursor.buffer_end - self._seek_point_before(cursor.buffer_end).data_offset
+                >= self.CHECKPOINT_SIZE):
+            self._add_seek_point(SeekPoint(cursor.buffer_end, cursor.file_offset,
+                                           cursor.decompressor.copy()))
+
+
+class CompressedLogFile(LogFile):
+    """Log file compressed with gzip, bzip2, xz or zstd, decompressed on the fly
+
+    Offsets in the line index refer to the decompressed data, which is never
+    written out. Indexing decompresses the file once, parsing the line starts
+    and timestamps on the way. Afterwards lines are read through the seek
+    points of DecompressedData. Compressed files are treated as complete, so
+    they are indexed once and never grow.
+
+    Worker processes cannot read ranges of the decompressed data, so the
+    index is built and filtered in the calling process. Filtering reads the
+    lines in order and runs at about the speed of the decompression.
+    """
+
+    worker_readable: bool = False
+
+    def __init__(self, path: str, encoding: str = 'utf-8', executor: Optional[Executor] = None,
+                 cache_dir: Optional[str] = None) -> None:
+        """Open and index a compressed log file
+
+        Args:
+            path: Path of the compressed file
+            encoding: Encoding used to decode lines, AUTO_ENCODING to detect it from the decompressed data
+            executor: Ignored, compressed files are indexed in this process
+            cache_dir: Directory of the sidecar index files, None to disable them
+
+        Raises:
+            ValueError: If the file is not compressed in a supported format
+        """
+        compression = compression_format(path)
+        if compression is None:
+            raise ValueError(f"Not a compressed file: {path}")
+        self.compression: str = compression
+        self.data: DecompressedData = DecompressedData(path, compression)
+        # Set once the whole file was decompressed and indexed
+        self._indexed: bool = False
+        super().__init__(path, encoding, None, cache_dir)
+
+    def file_size(self) -> int:
+        """Get the size of the decompressed data, which is known once it was indexed"""
+        return self.size if self.data.size is None else self.data.size
+
+    def read_from_disk(self, start: int, end: int) -> bytes:
+        return self.read_bytes(start, end)
+
+    def grow(self, max_bytes: int = 0) -> bool:
+        """Index the file on the first call, compressed files are not expected to grow
+
+        The whole file is indexed at once, regardless of max_bytes.
+        """
+        with self._lock:
+            if not self._indexed:
+                self._index_data()
+                self._indexed = True
+            return True
+
+    def _remap(self, file_size: int) -> None:
+        # Nothing is mapped, lines are read through the decompressor
+        pass
+
+    def _index_data(self) -> None:
+        """Decompress the whole file once, collecting line starts, timestamps and levels"""
+        starts = array('Q')
+        values = array('q')
+        levels = array('B')
+        pos = 0
+        chunk_size = self.INDEX_CHUNK_SIZE
+        while True:
+            data = self.data.read(pos, pos + chunk_size)
+            newline = data.rfind(b'\n')
+            if newline < 0:
+                if len(data) < chunk_size:
+                    break
+                # A single line longer than the chunk, read on until its line break
+                chunk_size *= 2
+                continue
+            chunk_size = self.INDEX_CHUNK_SIZE
+            lines = data[:newline + 1]
+            # Each line start is the previous one plus the line length and its '\n'
+            line_lengths = map(len, lines.split(b'\n')[:-1])
+            line_starts = accumulate(map(add, line_lengths, repeat(1)), initial=pos)
+            next(line_starts)
+            starts.extend(line_starts)
+            self._parse_timestamps(lines, values, levels)
+            pos += newline + 1
+
+        end = self.data.size
+        partial = pos < end
+        if partial:
+            # Trailing line without line break, indexed like readlines() would
+            starts.append(end)
+            self._parse_timestamps(self.data.read(pos, end), values, levels)
+        self.offsets[1:] = starts
+        self.partial = partial
+        self.size = end
+        # Timestamps and levels come for free with the decompression pass, so they are always kept
+        self.time_run_starts = array('Q')
+        timestamps = array('q')
+        self.levels = array('B')
+        self._commit_timestamps(timestamps, self.levels, 0, values, levels)
+        self.timestamps = timestamps
+
+    @staticmethod
+    def _parse_timestamps(data: bytes, values: array, levels: array) -> None:
+        """Append the timestamps and levels of a block of lines, continuing the previous block"""
+        block_values, block_levels = parse_timestamps_and_levels(
+            data, values[-1] if values else -1, levels[-1] if levels else 0)
+        values.extend(block_values)
+        levels.extend(block_levels)
+
+    def read_bytes(self, start: int, end: int) -> bytes:
+        """Read raw bytes from the decompressed data"""
+        return self.data.read(start, end)
+
+    def _cache_arrays(self) -> Dict[str, array]:
+        seek_points = self.data.persistent_seek_points()
+        checkpoints = [seek_point.state or StreamCheckpoint(-1, 0, b'') for seek_point in seek_points]
+        # Windows of gzip checkpoints are mostly text, they compress well
+        windows = [zlib.compress(checkpoint.window, 1) if checkpoint.window else b'' for checkpoint in checkpoints]
+        arrays = super()._cache_arrays()
+        arrays["seek_data_offsets"] = array('Q', (seek_point.data_offset for seek_point in seek_points))
+        arrays["seek_file_offsets"] = array('Q', (seek_point.file_offset for seek_point in seek_points))
+        # -1 where a member, stream or frame starts and no checkpoint is needed
+        arrays["seek_bits"] = array('b', (checkpoint.bits for checkpoint in checkpoints))
+        arrays["seek_values"] = array('B', (checkpoint.value for checkpoint in checkpoints))
+        arrays["seek_window_sizes"] = array('Q', map(len, windows))
+        arrays["seek_windows"] = array('B', b''.join(windows))
+        return arrays
+
+    def _cache_identity(self) -> dict:
+        # The compressed file is identified, the decompressed data is never on disk
+        stat = os.fstat(self._file.fileno())
+        return {
+            "compression": self.compression,
+            "file_size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "head": self._fingerprint(0, min(stat.st_size, self.FINGERPRINT_SIZE)),
+            "tail": self._fingerprint(max(0, stat.st_size - self.FINGERPRINT_SIZE), stat.st_size),
+        }
+
+    def _cache_matches(self, header: dict) -> bool:
+        identity = self._cache_identity()
+        return all(header.get(name) == value for name, value in identity.items())
+
+    def _apply_cache(self, header: dict, arrays: Dict[str, array]) -> None:
+        super()._apply_cache(header, arrays)
+        windows = arrays["seek_windows"].tobytes()
+        window_ends = accumulate(arrays["seek_window_sizes"], initial=0)
+        window_start = next(window_ends)
+        seek_points = []
+        for data_offset, file_offset, bits, value, window_end in zip(
+                arrays["seek_data_offsets"], arrays["seek_file_offsets"], arrays["seek_bits"],
+                arrays["seek_values"], window_ends):
+            window = windows[window_start:window_end]
+            window_start = window_end
+            checkpoint = None
+            if bits >= 0:
+                checkpoint = StreamCheckpoint(bits, value, zlib.decompress(window) if window else b'')
+            seek_points.append(SeekPoint(data_offset, file_offset, checkpoint))
+        self.data.add_seek_points(seek_points)
+        self.data.size = self.size
+        self._indexed = True
+
+    def close(self) -> None:
+        super().close()
+        self.data.close()
@@ -0,0 +1,134 @@
+# Diagnostics panel for Log Insight
+
+import time
+from typing import Callable, Dict
+
+from PyQt6.QtWidgets import (QDockWidget, QFileDialog, QHBoxLayout, QHeaderView, QMessageBox, QPlainTextEdit,
+                             QPushButton, QSplitter, QTableWidget, QTableWidgetItem, QVBoxLayout, QWidget)
+from PyQt6.QtGui import QFont
+from PyQt6.QtCore import Qt, QTimer
+
+from perf_trace import memory_usage, tracer
+
+# Callback returning application gauges, such as the number of result rows
+GaugeCallback = Callable[[], Dict[str, float]]
+
+
+class DiagnosticsPanel(QDockWidget):
+    """Dock showing the stage timings, counters and gauges collected by the tracer
+
+    Tracing only runs while the panel is shown, so it costs nothing
+    otherwise. Collected data is kept when the panel is hidden and can be
+    exported as a Chrome trace for chrome://tracing or Perfetto.
+    """
+
+    # Milliseconds between refreshes while the panel is shown
+    REFRESH_INTERVAL: int = 500
+
+    STAGE_COLUMNS = ["Stage", "Calls", "Total ms", "Self ms", "Avg ms", "Max ms"]
+
+    def __init__(self, gauges: GaugeCallback, parent=None) -> None:
+        """Set up the panel, hidden until toggled
+
+        Args:
+            gauges: Callback returning application gauges, sampled on every refresh
+            parent: Parent widget
+        """
+        super().__init__("Diagnostics", parent)
+        self.setObjectName("diagnosticsPanel")
+        self.gauges: GaugeCallback = gauges
+
+        content = QWidget()
+        layout = QVBoxLayout(content)
+        layout.setContentsMargins(5, 5, 5, 5)
+        layout.setSpacing(5)
+
+        splitter = QSplitter(Qt.Orientation.Horizontal)
+        self.stage_table = QTableWidget(0, len(self.STAGE_COLUMNS))
+        self.stage_table.setHorizontalHeaderLabels(self.STAGE_COLUMNS)
+        self.stage_table.verticalHeader().setVisible(False)
+        self.stage_table.setEditTriggers(QTableWidget.EditTrigger.NoEditTriggers)
+        self.stage_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.ResizeMode.Stretch)
+        splitter.addWidget(self.stage_table)
+
+        # Counters, gauges and recent events
+        self.values_text = QPlainTextEdit()
+        self.values_text.setReadOnly(True)
+        self.values_text.setFont(QFont("Consolas", 9))
+        splitter.addWidget(self.values_text)
+        layout.addWidget(splitter, 1)
+
+        button_layout = QHBoxLayout()
+        button_layout.addStretch()
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        button_layout.addWidget(reset_button)
+        export_button = QPushButton("Export Chrome Trace...")
+        export_button.clicked.connect(self.export_trace)
+        button_layout.addWidget(export_button)
+        layout.addLayout(button_layout)
+        self.setWidget(content)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(self.REFRESH_INTERVAL)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.toggleViewAction().toggled.connect(self.set_tracing)
+
+    def set_tracing(self, enabled: bool) -> None:
+        """Trace while the panel is shown"""
+        tracer.enable(enabled)
+        if enabled:
+            self.refresh()
+            self.refresh_timer.start()
+        else:
+            self.refresh_timer.stop()
+
+    def reset(self) -> None:
+        tracer.reset()
+        self.refresh()
+
+    def sample_gauges(self) -> None:
+        """Record memory use and the application gauges"""
+        current, peak = memory_usage()
+        if current is not None:
+            tracer.gauge("memory.rss_mb", round(current / (1 << 20), 1))
+        if peak is not None:
+            tracer.gauge("memory.peak_rss_mb", round(peak / (1 << 20), 1))
+        for name, value in self.gauges().items():
+            tracer.gauge(name, value)
+
+    def refresh(self) -> None:
+        """Sample the gauges and show the current snapshot"""
+        self.sample_gauges()
+        snapshot = tracer.snapshot()
+
+        stages = sorted(snapshot['stages'].items(), key=lambda item: item[1]['self_ms'], reverse=True)
+        self.stage_table.setRowCount(len(stages))
+        for row, (name, stats) in enumerate(stages):
+            values = [name, str(stats['calls']), f"{stats['total_ms']:.1f}", f"{stats['self_ms']:.1f}",
+                      f"{stats['total_ms'] / stats['calls']:.2f}", f"{stats['max_ms']:.1f}"]
+            for column, value in enumerate(values):
+                item = QTableWidgetItem(value)
+                if column:
+                    item.setTextAlignment(Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter)
+                self.stage_table.setItem(row, column, item)
+
+        lines = ["Counters"]
+        lines += [f"  {name}: {value:,}" for name, value in sorted(snapshot['counters'].items())]
+        lines.append("Gauges")
+        lines += [f"  {name}: {value:,}" for name, value in sorted(snapshot['gauges'].items())]
+        lines.append("Events")
+        lines += [f"  {time.strftime('%H:%M:%S', time.localtime(when))} {message}"
+                  for when, message in list(tracer.messages)[-20:]]
+        self.values_text.setPlainText("\n".join(lines))
+
+    def export_trace(self) -> None:
+        """Save the collected events as a Chrome trace JSON file"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self, "Export Chrome Trace", "loginsight-trace.json", "JSON Files (*.json);;All Files (*.*)")
+        if not file_path:
+            return
+        try:
+            tracer.export_chrome_trace(file_path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Cannot export trace: {str(e)}")
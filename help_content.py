@@ -15,7 +15,12 @@ def get_help_content() -> str:
     <h3>Main Features</h3>
     <ul>
         <li><b>Log Filtering</b> - Filter log content based on keywords and time range</li>
+        <li><b>Regular Expressions</b> - Check the .* toggle next to the include or exclude keywords to match each keyword as a regular expression</li>
+        <li><b>Encodings</b> - UTF-8, GBK and latin-1 files are detected automatically, the encoding is shown in the status bar</li>
+        <li><b>Timeline</b> - The strip above the results shows the lines and the filter matches per time bucket, click or drag to filter a time range and right click to zoom back out</li>
+        <li><b>Log Levels</b> - The level buttons above the results show the number of lines per level, uncheck a level to filter its lines out without searching the text again</li>
         <li><b>Real-time Monitoring</b> - Monitor log file changes in real-time</li>
+        <li><b>Merged View</b> - Open several log files at once to read and filter them as one timeline ordered by timestamp</li>
         <li><b>Text Search</b> - Search for specific text within log content</li>
         <li><b>Theme Switching</b> - Support for light and dark themes</li>
         <li><b>Word Wrap</b> - Control whether text automatically wraps</li>
@@ -35,6 +40,10 @@ def get_help_content() -> str:
             <td>F1</td>
             <td>Display help dialog</td>
         </tr>
+        <tr>
+            <td>Ctrl+Shift+D</td>
+            <td>Show or hide the diagnostics panel</td>
+        </tr>
         <tr>
             <td>Ctrl+Mouse Wheel</td>
             <td>Adjust font size</td>
@@ -48,7 +57,7 @@ def get_help_content() -> str:
     <h3>Filter Function Description</h3>
     <p><b>Include Keywords</b> - Only display log lines containing specified keywords</p>
     <p><b>Exclude Keywords</b> - Do not display log lines containing specified keywords</p>
-    <p><b>Time Range</b> - Only display log lines within the specified time range (Format: HH:MM:SS.mmm)</p>
+    <p><b>Time Range</b> - Only display log lines within the specified time range (Format: HH:MM:SS.mmm). Lines without a timestamp, such as stack traces, are kept or dropped together with the entry they follow</p>
     <p>Keywords support the following formats:</p>
     <ul>
         <li>Single keyword: <code>error</code></li>
@@ -57,6 +66,7 @@ def get_help_content() -> str:
     </ul>
     
     <h3>Other Features</h3>
-    <p><b>Drag and Drop Support</b> - Open log files by dragging and dropping them into the application window</p>
+    <p><b>Drag and Drop Support</b> - Open log files by dragging and dropping them into the application window, dropping several files merges them</p>
+    <p><b>Diagnostics Panel</b> - Shows where the time of filters, indexing, tailing and painting goes, with memory use and queue depths; the collected timeline can be exported as a Chrome trace and opened in chrome://tracing or Perfetto</p>
     <p><b>Auto-save Settings</b> - Automatically save filter conditions, theme settings, and other configurations</p>
     """
\ No newline at end of file
@@ -0,0 +1,102 @@
+# Vectorized access to the per-line index arrays of a log file, such as its timestamps and levels
+# Kept free of Qt imports, filters use it in worker threads and the benchmarks
+
+from array import array
+from typing import Collection, Iterator, Sequence, Tuple
+
+import numpy as np
+
+# Values copied out of an index array per step, bounds the temporary memory
+CHUNK_LINES: int = 1 << 20
+
+
+def iter_chunks(values: array, start: int, end: int, dtype) -> Iterator[Tuple[int, np.ndarray]]:
+    """Copy a range of an index array chunk by chunk into NumPy arrays
+
+    Index arrays are extended in place while the file grows, which fails
+    while a NumPy array shares their memory, so only copies are handed out.
+
+    Args:
+        values: Index array, such as LogFile.timestamps
+        start: First line of the range
+        end: Line after the last line of the range
+        dtype: NumPy type of the array items
+
+    Yields:
+        First line of every chunk and its values
+    """
+    for chunk_start in range(start, end, CHUNK_LINES):
+        yield chunk_start, np.frombuffer(values[chunk_start:min(end, chunk_start + CHUNK_LINES)], dtype=dtype)
+
+
+def gather(values: array, line_ids: np.ndarray, dtype) -> np.ndarray:
+    """Look up the values of the given lines in an index array
+
+    The array is copied window by window of CHUNK_LINES lines and indexed
+    with the ids falling into each window, so sparse ids cost one copy per
+    window they touch.
+
+    Args:
+        values: Index array, such as LogFile.levels
+        line_ids: Ids of the lines in ascending order, as unsigned 64-bit integers
+        dtype: NumPy type of the array items
+
+    Returns:
+        Value of every line, in the order of line_ids
+    """
+    if not len(line_ids):
+        return np.zeros(0, dtype=dtype)
+    windows = line_ids // CHUNK_LINES
+    bounds = [0, *(np.flatnonzero(windows[1:] != windows[:-1]) + 1).tolist(), len(line_ids)]
+    parts = []
+    for start, end in zip(bounds, bounds[1:]):
+        base = int(windows[start]) * CHUNK_LINES
+        window_ids = line_ids[start:end] - np.uint64(base)
+        window = np.frombuffer(values[base:base + int(window_ids[-1]) + 1], dtype=dtype)
+        parts.append(window[window_ids])
+    return np.concatenate(parts)
+
+
+def level_table(codes: Collection[int]) -> np.ndarray:
+    """Get a lookup table telling for every level code whether it is selected"""
+    table = np.zeros(256, dtype=bool)
+    table[list(codes)] = True
+    return table
+
+
+def select_levels(levels: array, line_ids: Sequence[int], codes: Collection[int]) -> array:
+    """Keep the lines whose level is one of the given ones
+
+    Args:
+        levels: Level code of every line, see LogFile.levels
+        line_ids: Compact array with the ascending ids of the lines to check
+        codes: Selected level codes
+
+    Returns:
+        Compact array with the ids of the lines on a selected level
+    """
+    table = level_table(codes)
+    result = array('Q')
+    for start in range(0, len(line_ids), CHUNK_LINES):
+        chunk_ids = np.frombuffer(line_ids[start:start + CHUNK_LINES], dtype=np.uint64)
+        result.frombytes(chunk_ids[table[gather(levels, chunk_ids, np.uint8)]].tobytes())
+    return result
+
+
+def lines_with_levels(levels: array, start: int, end: int, codes: Collection[int]) -> array:
+    """Find the lines of a range whose level is one of the given ones, without reading any text
+
+    Args:
+        levels: Level code of every line, see LogFile.levels
+        start: First line of the range
+        end: Line after the last line of the range
+        codes: Selected level codes
+
+    Returns:
+        Compact array with the ids of the lines on a selected level
+    """
+    table = level_table(codes)
+    result = array('Q')
+    for chunk_start, chunk in iter_chunks(levels, start, end, np.uint8):
+        result.frombytes((np.flatnonzero(table[chunk]).astype(np.uint64) + np.uint64(chunk_start)).tobytes())
+    return result
@@ -0,0 +1,76 @@
+# Log level facet bar for Log Insight
+
+from typing import FrozenSet, List, Optional, Sequence
+
+from PyQt6.QtWidgets import QHBoxLayout, QLabel, QToolButton, QWidget
+from PyQt6.QtCore import pyqtSignal
+
+from log_file import LOG_LEVELS
+
+
+class LevelBar(QWidget):
+    """Row of toggle buttons showing the number of lines on every log level
+
+    Levels are read from the level index of the file, so the counts and a
+    changed selection never scan any text. Unchecked levels are left out
+    of the filter results, lines without a level are the OTHER level.
+    """
+
+    # Emitted whenever a level is checked or unchecked
+    levelsChanged = pyqtSignal()
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.counts: List[int] = [0] * len(LOG_LEVELS)
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(QLabel("Levels:"))
+        self.buttons: List[QToolButton] = []
+        for level in LOG_LEVELS:
+            button = QToolButton()
+            button.setCheckable(True)
+            button.setChecked(True)
+            button.setToolTip(f"Show {level} lines" if level != "OTHER" else "Show lines without a level")
+            button.toggled.connect(self.on_toggled)
+            layout.addWidget(button)
+            self.buttons.append(button)
+        layout.addStretch(1)
+        self.update_buttons()
+
+    def set_counts(self, counts: Optional[Sequence[int]]) -> None:
+        """Show the number of lines of every level, None while they are not counted
+
+        Args:
+            counts: Line count of every level, indexed by level code
+        """
+        self.counts = [0] * len(LOG_LEVELS) if counts is None else [int(count) for count in counts]
+        self.update_buttons()
+
+    def update_buttons(self) -> None:
+        """Label the buttons with their counts, levels without lines are only shown while unchecked"""
+        for level, button in enumerate(self.buttons):
+            button.setText(f"{LOG_LEVELS[level]} {self.counts[level]:,}")
+            button.setVisible(self.counts[level] > 0 or not button.isChecked())
+        # Files without levels only have OTHER lines, there is nothing to choose from
+        self.setVisible(any(self.counts[1:]) or self.selected_levels() is not None)
+
+    def on_toggled(self, checked: bool) -> None:
+        self.update_buttons()
+        self.levelsChanged.emit()
+
+    def selected_levels(self) -> Optional[FrozenSet[int]]:
+        """Get the codes of the checked levels, None if every level is checked"""
+        codes = frozenset(level for level, button in enumerate(self.buttons) if button.isChecked())
+        return None if len(codes) == len(LOG_LEVELS) else codes
+
+    def hidden_levels(self) -> List[str]:
+        """Get the names of the unchecked levels, for the configuration file"""
+        return [LOG_LEVELS[level] for level, button in enumerate(self.buttons) if not button.isChecked()]
+
+    def set_hidden_levels(self, names: Sequence[str]) -> None:
+        """Uncheck the levels with the given names and check the others, without emitting levelsChanged"""
+        for level, button in enumerate(self.buttons):
+            button.blockSignals(True)
+            button.setChecked(LOG_LEVELS[level] not in names)
+            button.blockSignals(False)
+        self.update_buttons()
@@ -0,0 +1,435 @@
+# Benchmark suite for Log Insight
+# Runs without a display, every scenario drives the Qt-free modules directly
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak memory is not reported there
+    resource = None
+
+from log_file import LogFile
+from log_filter import FilterCache, FilterQuery, LogFilter
+from log_generator import generate_log, parse_size
+from log_tail import LogTailer
+from text_search import TextSearch
+from timeline import Timeline
+from trigram_index import TrigramIndex
+
+# Keywords of the filter scenarios, common ones hit a few percent of the lines
+COMMON_KEYWORDS = ['error']
+EXCLUDE_KEYWORDS = ['timeout']
+RARE_KEYWORDS = ['OutOfMemoryError']
+
+# Regular expression of the regex scenario, hitting about as many lines as the common keywords
+REGEX_TERMS = [r'Timeout waiting for \w+ after \d{4,} ms']
+
+# Level codes of the level scenario, WARN and ERROR like a level bar with only those checked
+LEVEL_CODES = [4, 5]
+
+# Text searched with Ctrl+F in the search scenario
+SEARCH_TEXT = 'timeout'
+
+# Bytes appended to the followed file per write in the tail scenario, and at most in total
+TAIL_WRITE_SIZE = 256 * 1024
+TAIL_MAX_SIZE = 256 * 1024 * 1024
+
+# Seconds the tail scenario waits for the pipeline before giving up
+TAIL_TIMEOUT = 600.0
+
+# Format of the result files
+RESULT_VERSION = 1
+
+
+class Measurement(NamedTuple):
+    """Outcome of one timed run of a scenario"""
+    # Wall time of the timed part in seconds
+    seconds: float
+    # Number of lines and bytes processed
+    lines: int
+    bytes: int
+    # Number of matching lines or matches found, -1 where nothing is matched
+    matches: int = -1
+
+
+def keyword_query(include: List[str], exclude: Optional[List[str]] = None,
+                  start_time: str = "", end_time: str = "") -> FilterQuery:
+    """Build a case insensitive query like the filter panel does"""
+    return FilterQuery.create(include, False, exclude or [], False, start_time, end_time)
+
+
+def open_indexed(path: str) -> LogFile:
+    """Open a log file and build its timestamp index, outside of any timing"""
+    log_file = LogFile.open(path)
+    log_file.ensure_timestamps()
+    return log_file
+
+
+def timed_filter(log_file: LogFile, query: FilterQuery, workers: int = 1) -> Measurement:
+    """Filter a log file with an empty result cache and time it"""
+    start = time.perf_counter()
+    line_ids = LogFilter.filter_cached(log_file, query, FilterCache(), workers=workers)
+    seconds = time.perf_counter() - start
+    return Measurement(seconds, len(log_file), log_file.size, len(line_ids))
+
+
+def bench_load(path: str, workers: int) -> Measurement:
+    """Open a file without index cache, building the line and timestamp index"""
+    executor = LogFilter.get_executor(workers) if workers > 1 else None
+    start = time.perf_counter()
+    log_file = LogFile.open(path, executor=executor)
+    log_file.ensure_timestamps()
+    seconds = time.perf_counter() - start
+    log_file.close()
+    return Measurement(seconds, len(log_file), log_file.size)
+
+
+def bench_load_cached(path: str, workers: int) -> Measurement:
+    """Open a file again whose index was saved to the cache"""
+    cache_dir = tempfile.mkdtemp(prefix="loginsight-benchmark-")
+    try:
+        LogFile.open(path, cache_dir=cache_dir).close()
+        start = time.perf_counter()
+        log_file = LogFile.open(path, cache_dir=cache_dir)
+        seconds = time.perf_counter() - start
+        log_file.close()
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+    return Measurement(seconds, len(log_file), log_file.size)
+
+
+def bench_trigram_index(path: str, workers: int) -> Measurement:
+    """Build the keyword index of a file"""
+    log_file = open_indexed(path)
+    executor = LogFilter.get_executor(workers) if workers > 1 else None
+    index = TrigramIndex(log_file.encoding)
+    start = time.perf_counter()
+    index.extend(log_file, executor)
+    seconds = time.perf_counter() - start
+    log_file.close()
+    return Measurement(seconds, len(log_file), log_file.size)
+
+
+def bench_filter_common(path: str, workers: int) -> Measurement:
+    """Filter for a keyword found in a few percent of the lines, in one process"""
+    log_file = open_indexed(path)
+    return timed_filter(log_file, keyword_query(COMMON_KEYWORDS, EXCLUDE_KEYWORDS))
+
+
+def bench_filter_rare(path: str, workers: int) -> Measurement:
+    """Filter for a keyword found in very few lines, in one process without keyword index"""
+    log_file = open_indexed(path)
+    return timed_filter(log_file, keyword_query(RARE_KEYWORDS))
+
+
+def bench_filter_regex(path: str, workers: int) -> Measurement:
+    """Filter for a regular expression, in one process without keyword index"""
+    log_file = open_indexed(path)
+    return timed_filter(log_file, FilterQuery.create(REGEX_TERMS, False, [], False, include_regex=True))
+
+
+def bench_filter_rare_indexed(path: str, workers: int) -> Measurement:
+    """Filter for a keyword found in very few lines with the keyword index"""
+    log_file = open_indexed(path)
+    index = TrigramIndex(log_file.encoding)
+    index.extend(log_file)
+    log_file.trigram_index = index
+    return timed_filter(log_file, keyword_query(RARE_KEYWORDS))
+
+
+def bench_filter_parallel(path: str, workers: int) -> Measurement:
+    """Filter for a common keyword over all worker processes"""
+    log_file = open_indexed(path)
+    # Start the pool before timing, like the application does on its first filter
+    LogFilter.get_executor(workers).submit(int).result()
+    return timed_filter(log_file, keyword_query(COMMON_KEYWORDS, EXCLUDE_KEYWORDS), workers)
+
+
+def bench_time_range(path: str, workers: int) -> Measurement:
+    """Filter the middle third of the timeline without keywords"""
+    log_file = open_indexed(path)
+    timestamps = log_file.timestamps
+    first, last = timestamps[len(timestamps) // 3], timestamps[2 * len(timestamps) // 3]
+    start_ms, end_ms = min(first, last), max(first, last)
+    query = keyword_query([], [], LogFilter.format_time(start_ms), LogFilter.format_time(end_ms))
+    return timed_filter(log_file, query)
+
+
+def bench_tail_ingest(path: str, workers: int) -> Measurement:
+    """Append a file to a followed file as fast as possible until every line was filtered"""
+    size = min(os.path.getsize(path), TAIL_MAX_SIZE)
+    directory = tempfile.mkdtemp(prefix="loginsight-benchmark-")
+    tail_path = os.path.join(directory, "tail.log")
+    open(tail_path, 'wb').close()
+    log_file = LogFile(tail_path)
+    match_count = 0
+
+    def on_results(generation: int, line_ids, end_line: int) -> None:
+        nonlocal match_count
+        match_count += len(line_ids)
+
+    tailer = LogTailer(log_file, on_results, lambda: None, lambda: None)
+    try:
+        tailer.start(keyword_query(COMMON_KEYWORDS, EXCLUDE_KEYWORDS), 0)
+        line_count = 0
+        start = time.perf_counter()
+        with open(path, 'rb') as source, open(tail_path, 'ab') as target:
+            remaining = size
+            while remaining > 0:
+                data = source.read(min(TAIL_WRITE_SIZE, remaining))
+                target.write(data)
+                target.flush()
+                tailer.notify()
+                line_count += data.count(b'\n')
+                remaining -= len(data)
+        # Wait until the filter thread has handled every complete line
+        while tailer.next_line < line_count:
+            if time.perf_counter() - start > TAIL_TIMEOUT or tailer.stopped:
+                raise RuntimeError(f"tail pipeline stalled at line {tailer.next_line} of {line_count}")
+            time.sleep(0.001)
+        seconds = time.perf_counter() - start
+    finally:
+        tailer.stop()
+        log_file.close()
+        shutil.rmtree(directory, ignore_errors=True)
+    return Measurement(seconds, line_count, size, match_count)
+
+
+def bench_search(path: str, workers: int) -> Measurement:
+    """Find every occurrence of a text in filter results, like Ctrl+F in the result view"""
+    log_file = open_indexed(path)
+    line_ids = LogFilter.filter_cached(log_file, keyword_query(COMMON_KEYWORDS), FilterCache(), workers=1)
+    byte_count = sum(log_file.offsets[line_id + 1] - log_file.offsets[line_id] for line_id in line_ids)
+    # Same search as the worker behind LogInsight.find_all_matches
+    start = time.perf_counter()
+    matches = TextSearch.find_all(log_file, line_ids, SEARCH_TEXT)
+    seconds = time.perf_counter() - start
+    return Measurement(seconds, len(line_ids), byte_count, len(matches))
+
+
+def bench_timeline(path: str, workers: int) -> Measurement:
+    """Count the lines and the filter matches per time bucket, like the timeline strip"""
+    log_file = open_indexed(path)
+    line_ids = LogFilter.filter_cached(log_file, keyword_query(COMMON_KEYWORDS), FilterCache(), workers=1)
+    start = time.perf_counter()
+    timeline = Timeline(log_file)
+    timeline.update_lines()
+    timeline.reset_matches(True)
+    timeline.add_matches(line_ids, 0, len(line_ids))
+    seconds = time.perf_counter() - start
+    return Measurement(seconds, len(log_file), log_file.size, timeline.matches.total)
+
+
+def bench_filter_levels(path: str, workers: int) -> Measurement:
+    """Filter on log levels through the level index, like the level buttons, without reading any text"""
+    log_file = open_indexed(path)
+    return timed_filter(log_file, FilterQuery.create([], False, [], False, levels=LEVEL_CODES))
+
+
+# Scenarios by name, in the order they run
+SCENARIOS: Dict[str, Callable[[str, int], Measurement]] = {
+    'load': bench_load,
+    'load_cached': bench_load_cached,
+    'trigram_index': bench_trigram_index,
+    'filter_common': bench_filter_common,
+    'filter_rare': bench_filter_rare,
+    'filter_regex': bench_filter_regex,
+    'filter_rare_indexed': bench_filter_rare_indexed,
+    'filter_parallel': bench_filter_parallel,
+    'time_range': bench_time_range,
+    'tail_ingest': bench_tail_ingest,
+    'search': bench_search,
+    'timeline': bench_timeline,
+    'filter_levels': bench_filter_levels,
+}
+
+
+def peak_rss_mb(who: int) -> Optional[float]:
+    """Get the peak resident memory of this process or of its largest child in megabytes
+
+    Args:
+        who: resource.RUSAGE_SELF or resource.RUSAGE_CHILDREN
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Reported in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1)
+
+
+def run_scenario(name: str, path: str, workers: int) -> dict:
+    """Run one scenario once in this process
+
+    Returns:
+        Measurement and peak memory of the run
+    """
+    try:
+        measurement = SCENARIOS[name](path, workers)
+    finally:
+        LogFilter.shutdown_executor()
+    result = measurement._asdict()
+    result['peak_rss_mb'] = peak_rss_mb(resource.RUSAGE_SELF) if resource else None
+    result['worker_peak_rss_mb'] = peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None
+    return result
+
+
+def run_isolated(name: str, path: str, workers: int) -> dict:
+    """Run one scenario once in a fresh interpreter, so that peak memory and caches are its own
+
+    Raises:
+        RuntimeError: If the scenario failed
+    """
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-scenario", name, "--log", path,
+         "--workers", str(workers)],
+        capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"scenario {name} failed:\n{process.stderr}")
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def summarize(runs: List[dict]) -> dict:
+    """Combine the runs of a scenario, reporting the median wall time"""
+    seconds = statistics.median(run['seconds'] for run in runs)
+    lines, byte_count = runs[0]['lines'], runs[0]['bytes']
+    peaks = [run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None]
+    worker_peaks = [run['worker_peak_rss_mb'] for run in runs if run['worker_peak_rss_mb'] is not None]
+    return {
+        'seconds': round(seconds, 4),
+        'runs': [round(run['seconds'], 4) for run in runs],
+        'lines': lines,
+        'bytes': byte_count,
+        'matches': runs[0]['matches'],
+        'lines_per_second': round(lines / seconds) if seconds else None,
+        'mb_per_second': round(byte_count / seconds / (1 << 20), 1) if seconds else None,
+        'peak_rss_mb': max(peaks) if peaks else None,
+        'worker_peak_rss_mb': max(worker_peaks) if worker_peaks else None,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Print the results next to a baseline
+
+    Args:
+        results: Result file contents of this run
+        baseline: Result file contents of an earlier run
+        tolerance: Share a scenario may be slower than the baseline before it counts as a regression
+
+    Returns:
+        Names of the scenarios that regressed
+    """
+    regressions = []
+    print(f"{'scenario':<22}{'baseline s':>12}{'current s':>12}{'change':>10}")
+    for name, current in results['results'].items():
+        previous = baseline.get('results', {}).get(name)
+        if previous is None:
+            print(f"{name:<22}{'-':>12}{current['seconds']:>12.3f}{'new':>10}")
+            continue
+        change = current['seconds'] / previous['seconds'] - 1 if previous['seconds'] else 0.0
+        flag = ""
+        if change > tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<22}{previous['seconds']:>12.3f}{current['seconds']:>12.3f}{change:>+10.1%}{flag}")
+    if baseline.get('log', {}).get('bytes') != results['log']['bytes']:
+        print("Note: the baseline was measured on a log of a different size")
+    return regressions
+
+
+def benchmark_log(size: int, seed: int) -> str:
+    """Get a generated log of the given size and seed, generating it on first use"""
+    path = os.path.join(tempfile.gettempdir(), f"loginsight-benchmark-{size}-{seed}.log")
+    if not os.path.exists(path) or os.path.getsize(path) < size:
+        print(f"Generating {size / (1 << 20):.0f} MB benchmark log {path}", file=sys.stderr)
+        generate_log(path + ".tmp", size, seed)
+        os.replace(path + ".tmp", path)
+    return path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the benchmark suite from the command line
+
+    Returns:
+        0 on success, 1 if a scenario regressed against the baseline
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark loading, filtering, tailing and searching logs without a display.")
+    parser.add_argument("--log", help="log file to benchmark, by default a synthetic log is generated")
+    parser.add_argument("--size", default="100MB",
+                        help="size of the generated log such as 500MB or 20GB (default: 100MB)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated log (default: 0)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="comma separated scenarios to run (default: all): " + ", ".join(SCENARIOS))
+    parser.add_argument("--repeat", type=int, default=3, help="runs per scenario, the median counts (default: 3)")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="worker processes of the parallel scenarios, 0 for one per CPU core (default: 0)")
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="slowdown against the baseline counted as regression (default: 0.1)")
+    parser.add_argument("--run-scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    workers = args.workers or os.cpu_count() or 1
+
+    if args.run_scenario:
+        # Child process started by run_isolated
+        print(json.dumps(run_scenario(args.run_scenario, args.log, workers)))
+        return 0
+
+    names = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+    try:
+        path = args.log or benchmark_log(parse_size(args.size), args.seed)
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = {
+        'version': RESULT_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'workers': workers,
+        },
+        'log': {'path': path, 'bytes': os.path.getsize(path), 'seed': None if args.log else args.seed},
+        'results': {},
+    }
+    for name in names:
+        runs = [run_isolated(name, path, workers) for _ in range(args.repeat)]
+        summary = summarize(runs)
+        results['results'][name] = summary
+        print(f"{name:<22}{summary['seconds']:>9.3f} s {summary['lines_per_second'] or 0:>12,} lines/s "
+              f"{summary['mb_per_second'] or 0:>8.1f} MB/s  peak {summary['peak_rss_mb'] or 0:.0f} MB",
+              file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
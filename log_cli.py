@@ -0,0 +1,427 @@
+# Headless command line filter for Log Insight
+# Imports no Qt, so that it starts fast and runs on servers without a display
+
+import argparse
+import json
+import os
+import re
+import sys
+from collections import deque
+from concurrent.futures import Executor
+from itertools import compress
+from typing import Callable, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from compressed_log import DecompressedData, compression_format
+from log_file import AUTO_ENCODING, LogFile, detect_encoding, parse_timestamps, read_file_range
+from log_filter import FilterQuery, LogFilter, Matcher, parse_keywords
+
+
+class ChunkMatches(NamedTuple):
+    """Matching lines of one chunk of complete log lines"""
+    # Runs of consecutive matching lines, as the index of their first line in the chunk and their
+    # text, or all matches as one block with index -1 if line numbers and times were not needed
+    blocks: List[Tuple[int, str]]
+    # Number of lines in the chunk
+    line_count: int
+    # Number of leading lines before the first timestamp, their time depends on earlier chunks
+    untimed_lines: int
+    # Timestamp of the last line, -1 if the chunk has none
+    last_time: int
+    # Timestamps of all lines, only collected when asked for
+    times: Optional[List[int]]
+
+
+def filter_chunk(data: bytes, encoding: str,
+                 include_matcher: Optional[Matcher],
+                 exclude_matcher: Optional[Matcher],
+                 start_ms: Optional[int], end_ms: Optional[int],
+                 with_times: bool) -> ChunkMatches:
+    """Filter a chunk of complete log lines
+
+    Lines before the first timestamp of the chunk are kept whatever the time
+    range, as their time is only known once the previous chunk was filtered,
+    see CommandLineFilter.resolve_untimed.
+
+    Args:
+        data: Raw bytes of whole lines
+        encoding: Encoding used to decode the lines
+        include_matcher: Matcher for include keywords, None to include all lines
+        exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+        start_ms: Start of the time range in milliseconds, None for no lower bound
+        end_ms: End of the time range in milliseconds, None for no upper bound
+        with_times: Whether to return the timestamps of all lines
+
+    Returns:
+        Matching lines and what is needed to combine them with other chunks
+    """
+    time_range = start_ms is not None or end_ms is not None
+    times = parse_timestamps(data) if time_range or with_times else None
+    low = -1 if start_ms is None else start_ms
+    high = sys.maxsize if end_ms is None else end_ms
+
+    # Keywords are matched on the raw data, only the matching lines are decoded
+    spans = LogFilter.match_byte_spans(data, encoding, include_matcher, exclude_matcher)
+    if times is None:
+        # Line numbers are not needed, so hand over all matches as one block
+        matches = b''.join([data[start:end] for start, end in spans]).decode(encoding, errors='ignore')
+        blocks = [(-1, matches)] if matches else []
+    else:
+        blocks = []
+        for line_index, line_count, start, end in LogFilter.number_spans(data, 0, spans):
+            block = data[start:end].decode(encoding, errors='ignore')
+            if time_range:
+                # Keep the lines of the run that lie within the range, untimed lines are decided later
+                lines = LogFile.LINE_PATTERN.findall(block)
+                in_range = [value < 0 or low <= value <= high
+                            for value in times[line_index:line_index + line_count]]
+                if all(in_range):
+                    blocks.append((line_index, block))
+                else:
+                    blocks.extend(compress(zip(range(line_index, line_index + line_count), lines), in_range))
+            else:
+                blocks.append((line_index, block))
+
+    total_lines = data.count(b'\n') + bool(data and not data.endswith(b'\n'))
+    return ChunkMatches(blocks, total_lines,
+                        times.count(-1) if times is not None else 0,
+                        times[-1] if times else -1,
+                        list(times) if with_times else None)
+
+
+def _filter_file_range(path: str, encoding: str, byte_start: int, byte_end: int,
+                       include_matcher: Optional[Matcher],
+                       exclude_matcher: Optional[Matcher],
+                       start_ms: Optional[int], end_ms: Optional[int],
+                       with_times: bool) -> ChunkMatches:
+    """Filter a byte range of whole lines of a file in a worker process"""
+    return filter_chunk(read_file_range(path, byte_start, byte_end), encoding,
+                        include_matcher, exclude_matcher, start_ms, end_ms, with_times)
+
+
+class CommandLineFilter:
+    """Filters log files or standard input to an output stream in constant memory
+
+    Input is read in chunks of READ_SIZE bytes cut at line breaks, so memory
+    use does not depend on the size of the input. Large plain files can be
+    split into chunks of PARALLEL_CHUNK_SIZE bytes that are filtered in
+    worker processes, only a few of them are in flight at a time. Keywords
+    and time ranges have the same meaning as in the filter panel.
+    """
+
+    # Bytes read per step when streaming
+    READ_SIZE: int = 4 * 1024 * 1024
+
+    # Bytes filtered by one worker task in parallel mode
+    PARALLEL_CHUNK_SIZE: int = 32 * 1024 * 1024
+
+    # Worker tasks in flight per worker process
+    TASKS_PER_WORKER: int = 2
+
+    def __init__(self, query: FilterQuery, output: TextIO, encoding: str = AUTO_ENCODING,
+                 count_only: bool = False, json_output: bool = False,
+                 executor: Optional[Executor] = None, workers: int = 1,
+                 show_names: bool = False) -> None:
+        """Set up the filter
+
+        Args:
+            query: Normalized filter conditions
+            output: Stream receiving the matching lines, counts or JSON objects
+            encoding: Encoding used to decode the input, AUTO_ENCODING to detect it for every input
+            count_only: Whether to print only the number of matching lines per input
+            json_output: Whether to print JSON objects instead of plain lines
+            executor: Process pool filtering large files in parallel, None to filter in this process
+            workers: Number of processes of the pool
+            show_names: Whether to prefix lines and counts with the name of their input
+        """
+        self.query: FilterQuery = query
+        self.output: TextIO = output
+        self.encoding: str = encoding
+        self.count_only: bool = count_only
+        self.json_output: bool = json_output
+        self.executor: Optional[Executor] = executor
+        self.workers: int = workers
+        self.show_names: bool = show_names
+        self.include_matcher: Optional[Matcher] = query.include_matcher()
+        self.exclude_matcher: Optional[Matcher] = query.exclude_matcher()
+        # JSON objects carry the time of every line
+        self.with_times: bool = json_output and not count_only
+
+    def filter_path(self, path: str) -> int:
+        """Filter a file, decompressing it on the fly if needed, or standard input for '-'
+
+        Returns:
+            Number of matching lines
+        """
+        if path == '-':
+            return self.filter_stream("(standard input)", sys.stdin.buffer.read)
+        compression = compression_format(path)
+        if compression is not None:
+            data = DecompressedData(path, compression)
+            position = 0
+
+            def read_decompressed(size: int) -> bytes:
+                nonlocal position
+                chunk = data.read(position, position + size)
+                position += len(chunk)
+                return chunk
+            try:
+                return self.filter_stream(path, read_decompressed)
+            finally:
+                data.close()
+        if self.executor is not None and os.path.getsize(path) > self.PARALLEL_CHUNK_SIZE:
+            return self.filter_parallel(path)
+        with open(path, 'rb') as file:
+            return self.filter_stream(path, file.read)
+
+    def filter_stream(self, name: str, read: Callable[[int], bytes]) -> int:
+        """Filter a stream chunk by chunk
+
+        Args:
+            name: Name of the input shown in the output
+            read: Function returning up to the given number of bytes, empty at the end
+
+        Returns:
+            Number of matching lines
+        """
+        def chunks() -> Iterator[ChunkMatches]:
+            rest = b''
+            encoding = None
+            while True:
+                data = read(self.READ_SIZE)
+                if not data:
+                    break
+                if encoding is None:
+                    encoding = self.input_encoding(data[:LogFile.ENCODING_SAMPLE_SIZE])
+                data = rest + data
+                newline = data.rfind(b'\n')
+                if newline < 0:
+                    # A line longer than the read size, keep collecting it
+                    rest = data
+                    continue
+                rest = data[newline + 1:]
+                yield self._filter_data(data[:newline + 1], encoding)
+            if rest:
+                # Last line without line break
+                yield self._filter_data(rest, encoding)
+        return self._write_chunks(name, chunks())
+
+    def filter_parallel(self, path: str) -> int:
+        """Filter a plain file in chunks spread over the worker processes
+
+        Returns:
+            Number of matching lines
+        """
+        encoding = self.input_encoding(read_file_range(path, 0, LogFile.ENCODING_SAMPLE_SIZE))
+
+        def chunks() -> Iterator[ChunkMatches]:
+            pending = deque()
+            for byte_start, byte_end in self.line_aligned_ranges(path, self.PARALLEL_CHUNK_SIZE):
+                pending.append(self.executor.submit(
+                    _filter_file_range, path, encoding, byte_start, byte_end,
+                    self.include_matcher, self.exclude_matcher,
+                    self.query.start_ms, self.query.end_ms, self.with_times))
+                if len(pending) >= self.workers * self.TASKS_PER_WORKER:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        return self._write_chunks(path, chunks())
+
+    @staticmethod
+    def line_aligned_ranges(path: str, chunk_size: int) -> Iterator[Tuple[int, int]]:
+        """Split a file into byte ranges of about chunk_size bytes that end after a line break"""
+        size = os.path.getsize(path)
+        with open(path, 'rb') as file:
+            start = 0
+            while start < size:
+                end = start + chunk_size
+                if end >= size:
+                    end = size
+                else:
+                    # Move the boundary past the next line break
+                    file.seek(end)
+                    while True:
+                        data = file.read(64 * 1024)
+                        newline = data.find(b'\n')
+                        if not data or newline >= 0:
+                            end = end + newline + 1 if newline >= 0 else size
+                            break
+                        end += len(data)
+                yield start, end
+                start = end
+
+    def input_encoding(self, sample: bytes) -> str:
+        """Get the encoding of an input, detecting it from its first bytes unless one was given"""
+        return detect_encoding(sample) if self.encoding == AUTO_ENCODING else self.encoding
+
+    def _filter_data(self, data: bytes, encoding: str) -> ChunkMatches:
+        return filter_chunk(data, encoding, self.include_matcher, self.exclude_matcher,
+                            self.query.start_ms, self.query.end_ms, self.with_times)
+
+    def resolve_untimed(self, chunk: ChunkMatches, previous: int) -> ChunkMatches:
+        """Apply the time of the previous chunk to the leading lines without a timestamp
+
+        Args:
+            chunk: Filtered chunk
+            previous: Timestamp of the last line before the chunk, -1 if none
+        """
+        if not chunk.untimed_lines or previous < 0:
+            return chunk
+        times = chunk.times
+        if times is not None:
+            times[:chunk.untimed_lines] = [previous] * chunk.untimed_lines
+        start_ms, end_ms = self.query.start_ms, self.query.end_ms
+        if ((start_ms is None or previous >= start_ms) and (end_ms is None or previous <= end_ms)):
+            return chunk._replace(times=times)
+
+        # The untimed lines continue an entry outside the time range, drop them
+        blocks = []
+        for first_line, block in chunk.blocks:
+            if first_line < chunk.untimed_lines:
+                lines = LogFile.LINE_PATTERN.findall(block)
+                skip = chunk.untimed_lines - first_line
+                if skip >= len(lines):
+                    continue
+                first_line, block = first_line + skip, ''.join(lines[skip:])
+            blocks.append((first_line, block))
+        return chunk._replace(blocks=blocks, times=times)
+
+    def _write_chunks(self, name: str, chunks: Iterator[ChunkMatches]) -> int:
+        """Write the matches of consecutive chunks of one input
+
+        Returns:
+            Number of matching lines
+        """
+        prefix = name + ':' if self.show_names else ''
+        match_count = 0
+        first_line = 0
+        previous = -1
+        for chunk in chunks:
+            chunk = self.resolve_untimed(chunk, previous)
+            if chunk.last_time >= 0:
+                previous = chunk.last_time
+            for index, block in chunk.blocks:
+                line_count = block.count('\n') + (not block.endswith('\n'))
+                match_count += line_count
+                if self.count_only:
+                    continue
+                if not block.endswith('\n'):
+                    block += '\n'
+                if self.json_output:
+                    for line_index, line in enumerate(LogFile.LINE_PATTERN.findall(block), index):
+                        time_ms = chunk.times[line_index]
+                        self.output.write(json.dumps({
+                            "file": name,
+                            "line": first_line + line_index + 1,
+                            "time": LogFilter.format_time(time_ms) if time_ms >= 0 else None,
+                            "text": line.rstrip('\r\n'),
+                        }, ensure_ascii=False) + '\n')
+                elif prefix:
+                    self.output.writelines(prefix + line for line in LogFile.LINE_PATTERN.findall(block))
+                else:
+                    self.output.write(block)
+            first_line += chunk.line_count
+
+        if self.count_only:
+            if self.json_output:
+                self.output.write(json.dumps({"file": name, "count": match_count}, ensure_ascii=False) + '\n')
+            else:
+                self.output.write(f"{prefix}{match_count}\n")
+        return match_count
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Build the parser of the command line options"""
+    parser = argparse.ArgumentParser(
+        prog="log_insight.py --cli",
+        description="Filter log files like the Log Insight filter panel, without a display. "
+                    "Matching lines are written to standard output.")
+    parser.add_argument("files", nargs="*", default=["-"],
+                        help="plain or compressed log files, - or nothing for standard input")
+    parser.add_argument("-i", "--include", default="",
+                        help="include keywords, space separated, quote keywords containing spaces; "
+                             "lines containing any of them match")
+    parser.add_argument("-I", "--include-case-sensitive", action="store_true",
+                        help="match include keywords case sensitively")
+    parser.add_argument("-e", "--exclude", default="",
+                        help="exclude keywords, lines containing any of them never match")
+    parser.add_argument("-E", "--exclude-case-sensitive", action="store_true",
+                        help="match exclude keywords case sensitively")
+    parser.add_argument("--include-regex", action="store_true",
+                        help="treat include keywords as regular expressions")
+    parser.add_argument("--exclude-regex", action="store_true",
+                        help="treat exclude keywords as regular expressions")
+    parser.add_argument("-s", "--start", default="", metavar="HH:MM:SS.mmm",
+                        help="start of the time range")
+    parser.add_argument("-t", "--end", default="", metavar="HH:MM:SS.mmm",
+                        help="end of the time range (inclusive)")
+    parser.add_argument("-c", "--count", action="store_true",
+                        help="only print the number of matching lines of every input")
+    parser.add_argument("-j", "--workers", type=int, default=1,
+                        help="worker processes for large plain files, 0 for one per CPU core")
+    parser.add_argument("--json", action="store_true",
+                        help="print a JSON object per matching line, or per input with --count")
+    parser.add_argument("--encoding", default=AUTO_ENCODING,
+                        help="encoding of the input, detected from its first bytes by default")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the command line filter
+
+    Args:
+        argv: Command line arguments without the program name, defaults to sys.argv
+
+    Returns:
+        Exit status like grep, 0 if any line matched, 1 if none did, 2 on errors
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+    # Also started through log_insight.py --cli
+    argv = [arg for arg in argv if arg != "--cli"]
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    for option, value in (("--start", args.start), ("--end", args.end)):
+        if value and LogFilter.parse_time(value) is None:
+            parser.error(f"invalid {option} time, please use format: HH:MM:SS.mmm")
+
+    query = FilterQuery.create(parse_keywords(args.include), args.include_case_sensitive,
+                               parse_keywords(args.exclude), args.exclude_case_sensitive,
+                               args.start, args.end, args.include_regex, args.exclude_regex)
+    try:
+        query.include_matcher()
+        query.exclude_matcher()
+    except re.error as e:
+        parser.error(f"invalid regular expression: {str(e)}")
+    workers = args.workers or os.cpu_count() or 1
+    log_filter = CommandLineFilter(
+        query, sys.stdout, args.encoding, args.count, args.json,
+        LogFilter.get_executor(workers) if workers > 1 else None, workers,
+        show_names=len(args.files) > 1)
+
+    status = 1
+    try:
+        for path in args.files:
+            try:
+                if log_filter.filter_path(path) and status == 1:
+                    status = 0
+            except BrokenPipeError:
+                raise
+            except (OSError, ValueError) as e:
+                print(f"Error filtering {path}: {str(e)}", file=sys.stderr)
+                status = 2
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # The reader went away, such as head, stop quietly. Only matches are
+        # written, so something matched
+        status = 0
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    except KeyboardInterrupt:
+        status = 130
+    finally:
+        LogFilter.shutdown_executor()
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
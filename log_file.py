@@ -0,0 +1,843 @@
+# Memory-mapped log file backend for Log Insight
+
+import codecs
+import hashlib
+import json
+import mmap
+import os
+import re
+import sys
+import tempfile
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Executor
+from functools import lru_cache
+from itertools import accumulate, compress, islice, repeat
+from operator import add, gt
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from perf_trace import tracer
+
+if TYPE_CHECKING:
+    from trigram_index import TrigramIndex
+
+# Milliseconds in a day, timestamps are times of day without a date
+DAY_MS = 24 * 60 * 60 * 1000
+
+# Matches one whole line, capturing a leading HH:MM:SS.mmm timestamp if present.
+# Consuming the line keeps the regex engine from retrying at every character.
+TIMESTAMP_PATTERN = re.compile(rb'(?:(\d\d:\d\d:\d\d)\.(\d\d\d))?[^\n]*\n?')
+
+# Like TIMESTAMP_PATTERN, also capturing a log level among the first three words after the timestamp,
+# such as in "12:00:00.000 INFO", "12:00:00.000 [main] WARN" or "12:00:00.000 [worker 1] [ERROR]"
+TIMESTAMP_LEVEL_PATTERN = re.compile(
+    rb'(?:(\d\d:\d\d:\d\d)\.(\d\d\d)(?:\S*[ \t]+(?:[^ \t\n]+[ \t]+){0,2}?\[?'
+    rb'(TRACE|DEBUG|INFO|WARN(?:ING)?|ERROR|FATAL|CRITICAL)\b)?)?[^\n]*\n?')
+
+# Log levels by their code in the level index, lines of entries without a level have code 0
+LOG_LEVELS = ('OTHER', 'TRACE', 'DEBUG', 'INFO', 'WARN', 'ERROR', 'FATAL')
+
+# Level code of every level word matched by TIMESTAMP_LEVEL_PATTERN
+LEVEL_CODES = {b'': 0, b'TRACE': 1, b'DEBUG': 2, b'INFO': 3, b'WARN': 4, b'WARNING': 4,
+               b'ERROR': 5, b'FATAL': 6, b'CRITICAL': 6}
+
+# Encoding name asking for the encoding to be detected from the start of the data
+AUTO_ENCODING = 'auto'
+
+# Share of the non-ASCII characters of a sample that have to be common Chinese ones to take it as GBK
+GBK_COMMON_SHARE = 0.9
+
+# Matches a non-ASCII character
+NON_ASCII_PATTERN = re.compile(r'[^\x00-\x7f]')
+
+
+def detect_encoding(sample: bytes) -> str:
+    """Guess the encoding of log data from a sample of its first bytes
+
+    UTF-8, which includes plain ASCII, is taken if the sample is valid
+    UTF-8. Otherwise GBK if the sample is valid GBK and its non-ASCII
+    characters are mostly common Chinese ones from the GB2312 set, which
+    text in other encodings seldom decodes to. Anything else is taken as
+    latin-1, which decodes every byte.
+
+    Args:
+        sample: First bytes of the data, may end inside a character
+
+    Returns:
+        Name of the encoding
+    """
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    try:
+        text = codecs.getincrementaldecoder('gbk')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'latin-1'
+    chars = ''.join(NON_ASCII_PATTERN.findall(text))
+    # GB2312 characters take two bytes each
+    common = len(chars.encode('gb2312', errors='ignore')) // 2
+    return 'gbk' if common >= GBK_COMMON_SHARE * len(chars) else 'latin-1'
+
+
+@lru_cache(maxsize=None)
+def ascii_compatible(encoding: str) -> bool:
+    """Check whether ASCII text is encoded as the same bytes, so that it can be found in raw data"""
+    ascii_bytes = bytes(range(0x80))
+    try:
+        return ascii_bytes.decode('ascii').encode(encoding) == ascii_bytes
+    except (LookupError, UnicodeError):
+        return False
+
+
+@lru_cache(maxsize=None)
+def self_synchronizing(encoding: str) -> bool:
+    """Check whether encoded text found in raw data always lies on character boundaries
+
+    This holds for UTF-8 and for single byte encodings such as latin-1. In
+    encodings such as GBK, the second byte of a character can be an ASCII
+    byte, so encoded text found in the raw data may not be in the decoded text.
+    """
+    if not ascii_compatible(encoding):
+        return False
+    if codecs.lookup(encoding).name in ('utf-8', 'utf-8-sig'):
+        return True
+    # Multibyte encodings pair up some of the bytes into one character
+    return len(bytes(range(256)).decode(encoding, errors='replace')) == 256
+
+
+def parse_timestamps(data: bytes, previous: int = -1) -> array:
+    """Parse the leading timestamp of every line in a block of lines
+
+    Lines without a timestamp of their own, such as stack trace lines, take
+    the timestamp of the entry they continue.
+
+    Args:
+        data: Raw bytes of one or more lines
+        previous: Timestamp of the line before the block, -1 if unknown
+
+    Returns:
+        Array with the time of day in milliseconds of every line
+    """
+    values = array('q')
+    append = values.append
+    # Timestamps change far less often than lines, so cache the seconds part
+    seconds_cache = {}
+    for hms, millis in TIMESTAMP_PATTERN.findall(data):
+        if hms:
+            base = seconds_cache.get(hms)
+            if base is None:
+                base = (int(hms[0:2]) * 3600 + int(hms[3:5]) * 60 + int(hms[6:8])) * 1000
+                seconds_cache[hms] = base
+            previous = base + int(millis)
+        append(previous)
+    # The pattern also matches the empty string at the very end
+    values.pop()
+    return values
+
+
+def parse_timestamps_and_levels(data: bytes, previous: int = -1,
+                                previous_level: int = 0) -> Tuple[array, array]:
+    """Parse the leading timestamp and the log level of every line in one pass
+
+    Like their timestamp, lines without a timestamp of their own take the
+    level of the entry they continue.
+
+    Args:
+        data: Raw bytes of one or more lines
+        previous: Timestamp of the line before the block, -1 if unknown
+        previous_level: Level code of the line before the block
+
+    Returns:
+        Arrays with the time of day in milliseconds and the level code of every line
+    """
+    values = array('q')
+    levels = array('B')
+    append = values.append
+    append_level = levels.append
+    seconds_cache = {}
+    for hms, millis, level in TIMESTAMP_LEVEL_PATTERN.findall(data):
+        if hms:
+            base = seconds_cache.get(hms)
+            if base is None:
+                base = (int(hms[0:2]) * 3600 + int(hms[3:5]) * 60 + int(hms[6:8])) * 1000
+                seconds_cache[hms] = base
+            previous = base + int(millis)
+            previous_level = LEVEL_CODES[level]
+        append(previous)
+        append_level(previous_level)
+    # The pattern also matches the empty string at the very end
+    values.pop()
+    levels.pop()
+    return values, levels
+
+
+def read_file_range(path: str, start: int, end: int) -> bytes:
+    """Read a byte range of a file, used by index worker processes"""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        return file.read(end - start)
+
+
+def _find_line_starts(path: str, start: int, end: int) -> array:
+    """Find the offsets following every line break in a byte range of a file"""
+    pieces = read_file_range(path, start, end).split(b'\n')
+    pieces.pop()
+    starts = accumulate(map(add, map(len, pieces), repeat(1)), initial=start)
+    next(starts)
+    return array('Q', starts)
+
+
+def _parse_timestamp_range(path: str, start: int, end: int) -> Tuple[array, array]:
+    """Parse the timestamps and levels of the lines in a byte range of a file"""
+    return parse_timestamps_and_levels(read_file_range(path, start, end))
+
+
+class LogFile:
+    """Read-only, memory-mapped view of a log file
+
+    The file is indexed once into a compact array of line start offsets.
+    Lines stay as raw bytes in the mapping and are only decoded when they are
+    requested, so resident memory stays close to the size of the file itself.
+
+    The index can be persisted in a sidecar file, keyed by path, size,
+    modification time and fingerprints of the head and tail of the indexed
+    data. When the file has only grown since, the stored index is loaded and
+    extended with the appended bytes.
+    """
+
+    # Bytes scanned per step while building the line index
+    INDEX_CHUNK_SIZE: int = 16 * 1024 * 1024
+
+    # Minimum number of new bytes before the index is built in worker processes
+    PARALLEL_INDEX_SIZE: int = 64 * 1024 * 1024
+
+    # Approximate bytes decoded per step while iterating over lines
+    DECODE_CHUNK_SIZE: int = 4 * 1024 * 1024
+
+    # Number of lines summarized by one entry of the block summaries
+    BLOCK_LINES: int = 65536
+
+    # Bytes hashed at the head and at the tail of the indexed data
+    FINGERPRINT_SIZE: int = 64 * 1024
+
+    # Bytes read from the start of the file to detect its encoding
+    ENCODING_SAMPLE_SIZE: int = 64 * 1024
+
+    # Format of the sidecar index files
+    CACHE_VERSION: int = 3
+    CACHE_MAGIC: bytes = b'LOGINSIGHT-INDEX\n'
+
+    # Splits decoded text into lines, keeping line breaks like readlines()
+    LINE_PATTERN = re.compile(r'[^\n]*\n|[^\n]+')
+
+    # Whether worker processes can read byte ranges of the data straight from the file
+    worker_readable: bool = True
+
+    def __init__(self, path: str, encoding: str = 'utf-8', executor: Optional[Executor] = None,
+                 cache_dir: Optional[str] = None) -> None:
+        """Open and index a log file
+
+        Args:
+            path: Path of the log file
+            encoding: Encoding used to decode lines, AUTO_ENCODING to detect it from the start of the file
+            executor: Process pool used to build the index over file chunks in parallel
+            cache_dir: Directory of the sidecar index files, None to disable them
+        """
+        self.path: str = path
+        self.executor: Optional[Executor] = executor
+        self.cache_dir: Optional[str] = cache_dir
+        # Start offset of every line, followed by the end offset of the last line
+        self.offsets: array = array('Q', [0])
+        # Number of bytes covered by the index
+        self.size: int = 0
+        # Whether the last indexed line has no trailing line break yet
+        self.partial: bool = False
+        # Time of day in milliseconds of every line, built on first use
+        self.timestamps: Optional[array] = None
+        # Level code of every line, see LOG_LEVELS, built together with the timestamps
+        self.levels: Optional[array] = None
+        # First line of every run of non-decreasing timestamps
+        self.time_run_starts: array = array('Q')
+        # Lowest and highest timestamp of every block of BLOCK_LINES lines
+        self.block_min_times: array = array('q')
+        self.block_max_times: array = array('q')
+        # Trigram index narrowing keyword filters, attached once built in the background
+        self.trigram_index: Optional['TrigramIndex'] = None
+        self._file = open(path, 'rb')
+        self._mmap: Optional[mmap.mmap] = None
+        # Number of bytes covered by the sidecar index file
+        self._cached_size: int = 0
+        # Serializes index updates, readers do not take it
+        self._lock = threading.RLock()
+        if encoding == AUTO_ENCODING:
+            encoding = detect_encoding(self.read_from_disk(0, self.ENCODING_SAMPLE_SIZE))
+        self.encoding: str = encoding
+
+        if cache_dir:
+            self._cached_size = self.load_cache()
+            self.refresh()
+            # Timestamps are part of the persisted index, so build them right away
+            self.ensure_timestamps()
+            if self.size != self._cached_size or not self._cached_size:
+                self.save_cache()
+        else:
+            self.refresh()
+
+    @classmethod
+    def open(cls, path: str, encoding: str = AUTO_ENCODING, executor: Optional[Executor] = None,
+             cache_dir: Optional[str] = None) -> 'LogFile':
+        """Open and index a log file, decompressing it on the fly if it is compressed
+
+        Takes the same arguments as the constructor, the encoding is detected by default.
+        """
+        # Imported here, the compressed backend builds on this module
+        from compressed_log import CompressedLogFile, compression_format
+        if compression_format(path):
+            return CompressedLogFile(path, encoding, executor, cache_dir)
+        return cls(path, encoding, executor, cache_dir)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> str:
+        return self.line(index)
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_lines()
+
+    @property
+    def complete_line_count(self) -> int:
+        """Number of lines terminated by a line break"""
+        return len(self) - 1 if self.partial else len(self)
+
+    def file_size(self) -> int:
+        """Get the current size of the opened file, which may be ahead of the index"""
+        return os.fstat(self._file.fileno()).st_size
+
+    def is_truncated(self) -> bool:
+        """Check whether the file shrank below the indexed data"""
+        return self.file_size() < self.size
+
+    def file_identity(self) -> Tuple[int, int]:
+        """Get the device and inode of the opened file, which stay the same across renames"""
+        stat = os.fstat(self._file.fileno())
+        return stat.st_dev, stat.st_ino
+
+    def read_from_disk(self, start: int, end: int) -> bytes:
+        """Read raw bytes through the file handle instead of the mapping
+
+        Unlike read_bytes, this is safe for ranges the file may have been
+        truncated below, the result is just shorter then.
+        """
+        with self._lock:
+            self._file.seek(start)
+            return self._file.read(end - start)
+
+    def refresh(self, max_bytes: int = 0, rebuild: bool = False) -> bool:
+        """Extend the index with data appended to the file since the last call
+
+        Only the new bytes are scanned. If the file shrank, it is treated as
+        truncated and indexed again from the beginning. Unlike growth, this
+        replaces the index, so it must not race with readers in other threads.
+
+        Args:
+            max_bytes: Maximum number of new bytes to index, 0 for all of them
+            rebuild: Whether to index again from the beginning even if the file did
+                not shrink, such as after it was truncated and grew past its old size
+
+        Returns:
+            True if the file was truncated and the index was rebuilt
+        """
+        with self._lock:
+            truncated = rebuild or self.is_truncated()
+            if truncated:
+                self.offsets = array('Q', [0])
+                self.size = 0
+                self.partial = False
+                if self.timestamps is not None:
+                    self.timestamps = array('q')
+                    self.levels = array('B')
+                    self.time_run_starts = array('Q')
+                    self.block_min_times = array('q')
+                    self.block_max_times = array('q')
+                self.trigram_index = None
+            self.grow(max_bytes)
+            return truncated
+
+    def grow(self, max_bytes: int = 0) -> bool:
+        """Extend the index with appended data, leaving it alone if the file shrank
+
+        Growth is committed with single slice assignments, so other threads
+        can keep reading lines while the index is extended.
+
+        Args:
+            max_bytes: Maximum number of new bytes to index, 0 for all of them
+
+        Returns:
+            False if the file is smaller than the indexed data, True otherwise
+        """
+        with self._lock:
+            file_size = self.file_size()
+            if file_size < self.size:
+                return False
+            end = min(file_size, self.size + max_bytes) if max_bytes else file_size
+            if end == self.size:
+                return True
+
+            self._remap(end)
+
+            # Re-scan the previous last line if it was still incomplete
+            first_line = len(self) - 1 if self.partial else len(self)
+            with tracer.span("index", bytes=end - self.offsets[first_line]):
+                starts, partial = self._scan(self.offsets[first_line], end)
+            # Order the updates so that complete_line_count never counts an incomplete line
+            if partial:
+                self.partial = True
+            self.offsets[first_line + 1:] = starts
+            self.partial = partial
+            self.size = end
+            if self.timestamps is not None:
+                self._index_timestamps(self.timestamps, self.levels, first_line)
+            return True
+
+    def _remap(self, file_size: int) -> None:
+        """Map the file again so that the mapping covers file_size bytes
+
+        The new mapping is created first and then published in one
+        assignment, so readers in other threads always find a mapping while
+        the file has data. The previous mapping is not closed explicitly,
+        it is released once the last reader drops it.
+        """
+        new_map = mmap.mmap(self._file.fileno(), file_size, access=mmap.ACCESS_READ) if file_size > 0 else None
+        self._mmap = new_map
+
+    def _scan(self, start: int, end: int) -> Tuple[array, bool]:
+        """Find the start offsets of the lines following start, up to end
+
+        Returns:
+            Tuple of the offsets, ending with end if the last line has no line
+            break, and whether that is the case
+        """
+        starts = array('Q')
+        if self.executor is not None and end - start >= self.PARALLEL_INDEX_SIZE:
+            # Line breaks can be searched in any byte range, so chunks need no alignment
+            futures = [self.executor.submit(_find_line_starts, self.path, chunk_start,
+                                            min(chunk_start + self.INDEX_CHUNK_SIZE, end))
+                       for chunk_start in range(start, end, self.INDEX_CHUNK_SIZE)]
+            for future in futures:
+                starts.extend(future.result())
+            pos = starts[-1] if starts else start
+        else:
+            mm = self._mmap
+            pos = start
+            while pos < end:
+                if self.file_size() < end:
+                    # Truncated while it is scanned, see read_bytes. The index is
+                    # rebuilt once the truncation is noticed.
+                    break
+                stop = min(pos + self.INDEX_CHUNK_SIZE, end)
+                newline = mm.rfind(b'\n', pos, stop)
+                if newline < 0:
+                    # A single line longer than the chunk size
+                    newline = mm.find(b'\n', stop, end)
+                    if newline < 0:
+                        break
+                # Each line start is the previous one plus the line length and its '\n'
+                line_lengths = map(len, mm[pos:newline].split(b'\n'))
+                line_starts = accumulate(map(add, line_lengths, repeat(1)), initial=pos)
+                next(line_starts)
+                starts.extend(line_starts)
+                pos = newline + 1
+
+        partial = pos < end
+        if partial:
+            # Trailing line without line break, indexed like readlines() would
+            starts.append(end)
+        return starts, partial
+
+    def _line_chunks(self, start: int, end: int) -> List[Tuple[int, int]]:
+        """Split a range of lines into ranges of about INDEX_CHUNK_SIZE bytes"""
+        chunks = []
+        while start < end:
+            target = self.offsets[start] + self.INDEX_CHUNK_SIZE
+            chunk_end = min(max(bisect_left(self.offsets, target, start), start + 1), end)
+            chunks.append((start, chunk_end))
+            start = chunk_end
+        return chunks
+
+    def ensure_timestamps(self) -> array:
+        """Get the per-line timestamps, parsing them and the levels on first use
+
+        Returns:
+            Array with the time of day in milliseconds of every line, -1 for
+            lines before the first timestamp
+        """
+        if self.timestamps is None:
+            with self._lock:
+                if self.timestamps is None:
+                    timestamps = array('q')
+                    levels = array('B')
+                    self.time_run_starts = array('Q')
+                    self._index_timestamps(timestamps, levels, 0)
+                    # Only publish the arrays once they cover every line
+                    self.levels = levels
+                    self.timestamps = timestamps
+        return self.timestamps
+
+    def ensure_levels(self) -> array:
+        """Get the per-line level codes, see LOG_LEVELS, parsing them with the timestamps on first use"""
+        self.ensure_timestamps()
+        return self.levels
+
+    def _index_timestamps(self, timestamps: array, levels: array, start: int) -> None:
+        """Parse the timestamps and levels from line start on and track monotonic runs
+
+        The new values are collected first and then committed with slice
+        assignments, so readers in other threads never see the arrays shrink.
+        """
+        with tracer.span("index.timestamps", lines=len(self) - start):
+            values, level_values = self._parse_line_timestamps(timestamps, levels, start)
+            self._commit_timestamps(timestamps, levels, start, values, level_values)
+
+    def _parse_line_timestamps(self, timestamps: array, levels: array, start: int) -> Tuple[array, array]:
+        """Parse the timestamps and levels of the lines from line start on"""
+        previous = timestamps[start - 1] if start else -1
+        previous_level = levels[start - 1] if start else 0
+        values = array('q')
+        level_values = array('B')
+        chunks = self._line_chunks(start, len(self))
+        if (self.executor is not None and len(chunks) > 1
+                and self.offsets[-1] - self.offsets[start] >= self.PARALLEL_INDEX_SIZE):
+            futures = [self.executor.submit(_parse_timestamp_range, self.path,
+                                            self.offsets[chunk_start], self.offsets[chunk_end])
+                       for chunk_start, chunk_end in chunks]
+            for future in futures:
+                chunk_values, chunk_levels = future.result()
+                # Workers cannot see the previous chunk, so its last timestamp and level
+                # are carried into the untimed lines at the start of this one
+                previous = values[-1] if values else previous
+                previous_level = level_values[-1] if level_values else previous_level
+                untimed = chunk_values.count(-1)
+                if untimed and previous >= 0:
+                    chunk_values[:untimed] = array('q', [previous]) * untimed
+                    chunk_levels[:untimed] = array('B', [previous_level]) * untimed
+                values.extend(chunk_values)
+                level_values.extend(chunk_levels)
+        else:
+            for chunk_start, chunk_end in chunks:
+                previous = values[-1] if values else previous
+                previous_level = level_values[-1] if level_values else previous_level
+                data = self.read_bytes(self.offsets[chunk_start], self.offsets[chunk_end])
+                chunk_values, chunk_levels = parse_timestamps_and_levels(data, previous, previous_level)
+                values.extend(chunk_values)
+                level_values.extend(chunk_levels)
+        return values, level_values
+
+    def _commit_timestamps(self, timestamps: array, levels: array, start: int, values: array,
+                           level_values: array) -> None:
+        """Store the timestamps and levels of the lines from line start on and update the runs and blocks"""
+        # Start a new run wherever the time goes backwards
+        run_starts = array('Q')
+        if values and (not start or values[0] < timestamps[start - 1]):
+            run_starts.append(start)
+        backwards = map(gt, values, islice(values, 1, None))
+        run_starts.extend(compress(range(start + 1, start + len(values)), backwards))
+
+        levels[start:] = level_values
+        timestamps[start:] = values
+        self.time_run_starts[bisect_left(self.time_run_starts, start):] = run_starts
+        self._update_blocks(timestamps, start)
+
+    def _update_blocks(self, timestamps: array, start: int) -> None:
+        """Summarize the blocks of lines from the one holding line start on"""
+        block = start // self.BLOCK_LINES
+        block_min_times = array('q')
+        block_max_times = array('q')
+        for block_start in range(block * self.BLOCK_LINES, len(timestamps), self.BLOCK_LINES):
+            values = timestamps[block_start:block_start + self.BLOCK_LINES]
+            block_min_times.append(min(values))
+            block_max_times.append(max(values))
+        self.block_min_times[block:] = block_min_times
+        self.block_max_times[block:] = block_max_times
+
+    def time_window(self, start_ms: Optional[int], end_ms: Optional[int]) -> List[Tuple[int, int]]:
+        """Find the lines within a time range by binary search
+
+        Each run of non-decreasing timestamps is searched separately, so logs
+        that wrap around midnight or interleave sources still work. Logs with
+        more runs than blocks are scanned block by block instead, skipping the
+        blocks whose time span does not overlap the range.
+
+        Args:
+            start_ms: Start of the range in milliseconds, None for no lower bound
+            end_ms: End of the range in milliseconds (inclusive), None for no upper bound
+
+        Returns:
+            List of (start_line, end_line) ranges in file order
+        """
+        timestamps = self.ensure_timestamps()
+        if len(self.time_run_starts) > len(self.block_min_times):
+            return self._scan_time_window(start_ms, end_ms)
+
+        run_bounds = list(self.time_run_starts) + [len(timestamps)]
+        windows = []
+        for run_start, run_end in zip(run_bounds, run_bounds[1:]):
+            first = run_start if start_ms is None else bisect_left(timestamps, start_ms, run_start, run_end)
+            last = run_end if end_ms is None else bisect_right(timestamps, end_ms, first, run_end)
+            if first < last:
+                windows.append((first, last))
+        return windows
+
+    def _scan_time_window(self, start_ms: Optional[int], end_ms: Optional[int]) -> List[Tuple[int, int]]:
+        """Find the lines within a time range using the block summaries"""
+        low = -1 if start_ms is None else start_ms
+        high = sys.maxsize if end_ms is None else end_ms
+        timestamps = self.timestamps
+        windows = []
+        for block, (block_min, block_max) in enumerate(zip(self.block_min_times, self.block_max_times)):
+            if block_max < low or block_min > high:
+                continue
+            block_start = block * self.BLOCK_LINES
+            block_end = min(block_start + self.BLOCK_LINES, len(timestamps))
+            if low <= block_min and block_max <= high:
+                matching = range(block_start, block_end)
+            else:
+                matching = compress(range(block_start, block_end),
+                                    (low <= value <= high for value in timestamps[block_start:block_end]))
+            for index in matching:
+                # Extend the previous window while the lines are contiguous
+                if windows and windows[-1][1] == index:
+                    windows[-1] = (windows[-1][0], index + 1)
+                else:
+                    windows.append((index, index + 1))
+        return windows
+
+    @staticmethod
+    def default_cache_dir() -> str:
+        """Get the directory of the sidecar index files inside the user cache directory"""
+        cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_home, 'loginsight')
+
+    def cache_path(self) -> str:
+        """Get the path of the sidecar index file of this log file"""
+        key = hashlib.sha1(os.path.abspath(self.path).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key + '.idx')
+
+    def _fingerprint(self, start: int, end: int) -> str:
+        """Hash a byte range of the file"""
+        self._file.seek(start)
+        return hashlib.blake2b(self._file.read(end - start), digest_size=16).hexdigest()
+
+    def save_cache(self) -> None:
+        """Write the index to the sidecar file, replacing the previous one atomically"""
+        if not self.cache_dir or self.timestamps is None:
+            return
+        with self._lock:
+            self._write_cache()
+
+    def _write_cache(self) -> None:
+        """Write the sidecar file while index updates are held off"""
+        arrays = self._cache_arrays()
+        header = {
+            "version": self.CACHE_VERSION,
+            "byteorder": sys.byteorder,
+            "path": os.path.abspath(self.path),
+            "encoding": self.encoding,
+            "size": self.size,
+            "partial": self.partial,
+            **self._cache_identity(),
+            "arrays": [[name, values.typecode, len(values)] for name, values in arrays.items()],
+        }
+
+        temp_path = None
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as cache_file:
+                cache_file.write(self.CACHE_MAGIC)
+                cache_file.write(json.dumps(header).encode('utf-8') + b'\n')
+                for values in arrays.values():
+                    values.tofile(cache_file)
+            os.replace(temp_path, self.cache_path())
+            self._cached_size = self.size
+        except OSError as e:
+            # The index stays usable in memory, it just has to be built again next time
+            tracer.instant(f"Error saving index cache: {str(e)}", path=self.path)
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def load_cache(self) -> int:
+        """Load the index from the sidecar file if it still describes this file
+
+        The stored index is used if the file has the same size and
+        modification time, or if it has grown and the head and tail of the
+        previously indexed bytes are unchanged.
+
+        Returns:
+            Number of bytes covered by the loaded index, 0 if nothing was loaded
+        """
+        try:
+            with open(self.cache_path(), 'rb') as cache_file:
+                if cache_file.readline() != self.CACHE_MAGIC:
+                    return 0
+                header = json.loads(cache_file.readline())
+                if (header.get("version") != self.CACHE_VERSION
+                        or header.get("byteorder") != sys.byteorder
+                        or header.get("path") != os.path.abspath(self.path)
+                        or header.get("encoding") != self.encoding):
+                    return 0
+
+                if header["size"] == 0 or not self._cache_matches(header):
+                    return 0
+
+                arrays = {}
+                for name, typecode, length in header["arrays"]:
+                    values = array(typecode)
+                    values.fromfile(cache_file, length)
+                    arrays[name] = values
+                self._apply_cache(header, arrays)
+        except FileNotFoundError:
+            return 0
+        except (OSError, ValueError, KeyError, TypeError, EOFError) as e:
+            tracer.instant(f"Error loading index cache: {str(e)}", path=self.path)
+            return 0
+        return self.size
+
+    def _cache_arrays(self) -> Dict[str, array]:
+        """Get the index arrays stored in the sidecar file, by name"""
+        return {
+            "offsets": self.offsets,
+            "timestamps": self.timestamps,
+            "levels": self.levels,
+            "time_run_starts": self.time_run_starts,
+            "block_min_times": self.block_min_times,
+            "block_max_times": self.block_max_times,
+        }
+
+    def _cache_identity(self) -> dict:
+        """Get the header fields identifying the indexed data in the sidecar file"""
+        stat = os.fstat(self._file.fileno())
+        return {
+            # The modification time only identifies the file if it was fully indexed
+            "mtime": stat.st_mtime_ns if stat.st_size == self.size else 0,
+            "head": self._fingerprint(0, min(self.size, self.FINGERPRINT_SIZE)),
+            "tail": self._fingerprint(max(0, self.size - self.FINGERPRINT_SIZE), self.size),
+        }
+
+    def _cache_matches(self, header: dict) -> bool:
+        """Check whether a sidecar file header still describes the file"""
+        stat = os.fstat(self._file.fileno())
+        size = header["size"]
+        if stat.st_size < size:
+            return False
+        if stat.st_size == size and stat.st_mtime_ns != header["mtime"]:
+            return False
+        return (self._fingerprint(0, min(size, self.FINGERPRINT_SIZE)) == header["head"]
+                and self._fingerprint(max(0, size - self.FINGERPRINT_SIZE), size) == header["tail"])
+
+    def _apply_cache(self, header: dict, arrays: Dict[str, array]) -> None:
+        """Take over the index arrays loaded from the sidecar file"""
+        self.offsets = arrays["offsets"]
+        self.levels = arrays["levels"]
+        self.timestamps = arrays["timestamps"]
+        self.time_run_starts = arrays["time_run_starts"]
+        self.block_min_times = arrays["block_min_times"]
+        self.block_max_times = arrays["block_max_times"]
+        self.partial = header["partial"]
+        self.size = header["size"]
+        self._remap(self.size)
+
+    def read_bytes(self, start: int, end: int) -> bytes:
+        """Read raw bytes from the indexed part of the file
+
+        Mapped pages past the end of a truncated file cannot be read, touching
+        them ends the process with SIGBUS. Ranges the file no longer covers are
+        therefore read through the file handle, the result is shorter then.
+        """
+        # Take one reference, the mapping can be replaced by refresh() in another thread
+        mapping = self._mmap
+        if mapping is None:
+            return b''
+        if end > self.file_size():
+            return self.read_from_disk(start, end)
+        return mapping[start:end]
+
+    def read_lines(self, line_ids: Sequence[int]) -> bytes:
+        """Join the raw bytes of lines, checking the file size once for all of them
+
+        Args:
+            line_ids: Ascending ids of the lines to read
+
+        Returns:
+            The lines with their line breaks, shorter if the file was truncated, see read_bytes
+        """
+        if not line_ids:
+            return b''
+        offsets = self.offsets
+        mapping = self._mmap
+        if mapping is None or offsets[line_ids[-1] + 1] > self.file_size():
+            read_bytes = self.read_bytes
+            return b''.join([read_bytes(offsets[line_id], offsets[line_id + 1]) for line_id in line_ids])
+        return b''.join([mapping[offsets[line_id]:offsets[line_id + 1]] for line_id in line_ids])
+
+    def line_bytes(self, index: int) -> bytes:
+        """Get the raw bytes of a line, including its line break"""
+        return self.read_bytes(self.offsets[index], self.offsets[index + 1])
+
+    def line(self, index: int) -> str:
+        """Get a decoded line, including its line break"""
+        if index < 0:
+            index += len(self)
+        return self.line_bytes(index).decode(self.encoding, errors='ignore')
+
+    def lines(self, start: int = 0, end: Optional[int] = None) -> List[str]:
+        """Decode a contiguous range of lines
+
+        Args:
+            start: Index of the first line
+            end: Index after the last line, defaults to the end of the file
+
+        Returns:
+            List of decoded lines, including line breaks
+        """
+        if end is None:
+            end = len(self)
+        if start >= end:
+            return []
+        with tracer.span("read"):
+            data = self.read_bytes(self.offsets[start], self.offsets[end])
+        with tracer.span("decode"):
+            return self.LINE_PATTERN.findall(data.decode(self.encoding, errors='ignore'))
+
+    def iter_lines(self, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+        """Iterate over decoded lines, decoding the file in bounded chunks
+
+        Args:
+            start: Index of the first line
+            end: Index after the last line, defaults to the end of the file
+        """
+        if end is None:
+            end = len(self)
+        while start < end:
+            target = self.offsets[start] + self.DECODE_CHUNK_SIZE
+            chunk_end = min(max(bisect_left(self.offsets, target, start, end), start + 1), end)
+            yield from self.lines(start, chunk_end)
+            start = chunk_end
+
+    def text(self) -> str:
+        """Decode the whole indexed file content"""
+        return self.read_bytes(0, self.size).decode(self.encoding, errors='ignore')
+
+    def close(self) -> None:
+        """Persist the index if it grew, then release the mapping and the file handle
+
+        The mapping is not closed explicitly, a reader still holding it keeps
+        it valid until it drops it, like after _remap.
+        """
+        if self.cache_dir and self.size != self._cached_size:
+            self.save_cache()
+        self._mmap = None
+        self._file.close()
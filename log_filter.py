@@ -0,0 +1,1574 @@
+# Log filtering logic for Log Insight
+# Kept free of Qt imports so that it can run in worker processes and without a display
+
+import io
+import os
+import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import datetime
+from functools import lru_cache
+from itertools import accumulate, chain, repeat
+from operator import add
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Tuple, Union
+
+from index_arrays import lines_with_levels, select_levels
+from log_file import LogFile, ascii_compatible, self_synchronizing
+from perf_trace import tracer
+from trigram_index import fold_pattern
+
+# Private modules of the re package, without them expressions are matched without a literal prefilter
+try:
+    from re import _constants as sre_constants, _parser as sre_parser
+except ImportError:
+    sre_constants = sre_parser = None
+
+# Matches a HH:MM:SS.mmm timestamp at the start of a line
+LINE_TIME_PATTERN = re.compile(r'(\d\d):(\d\d):(\d\d)\.(\d\d\d)')
+
+# Callback receiving the number of bytes filtered so far and the total number of bytes to filter
+ProgressCallback = Callable[[int, int], None]
+
+# Callback receiving the ids of the next matching lines, in file order
+BatchCallback = Callable[[array], None]
+
+
+# Matches a keyword in double quotes, which may contain spaces, or a run of non-space characters
+KEYWORD_PATTERN = re.compile(r'"([^"]*)"|\S+')
+
+
+def parse_keywords(input_str: str) -> List[str]:
+    """Parse keywords, supporting space separation and keywords with spaces inside quotes
+    
+    Args:
+        input_str: Input keyword string
+        
+    Returns:
+        Parsed keyword list
+    """
+    if not input_str:
+        return []
+    
+    keywords: List[str] = []
+    for match in KEYWORD_PATTERN.finditer(input_str):
+        # Inside quotes, group(1) holds the keyword, otherwise the full match is the keyword
+        keywords.append(match.group(1) if match.group(1) is not None else match.group(0))
+    return [keyword.strip() for keyword in keywords if keyword.strip()]
+
+
+class FilterCancelled(Exception):
+    """Raised when a filter run is cancelled before it finished"""
+
+
+class FilterTimeout(Exception):
+    """Raised when a regular expression filter ran out of its time budget"""
+
+
+class KeywordMatcher:
+    """Tests lines against any number of literal keywords in a single scan
+    
+    The keywords are merged into a prefix trie that is compiled into one
+    regular expression, so each line is scanned once however many keywords
+    there are. Case insensitive matching casefolds the line and the keywords
+    instead of using re.IGNORECASE, which keeps the literal fast paths of the
+    regex engine.
+    """
+    
+    # Every hit of scan_pattern in a block of lines is a match of its line
+    exact: bool = True
+    
+    def __init__(self, terms: List[str], case_sensitive: bool) -> None:
+        self.terms: List[str] = terms
+        self.case_sensitive: bool = case_sensitive
+        keys = terms if case_sensitive else [term.casefold() for term in terms]
+        self.pattern: Pattern = re.compile(self.trie_regex(keys))
+        # Pattern searched in whole blocks of lines, casefolded ones if folds_case
+        self.scan_pattern: Pattern = self.pattern
+        self.folds_case: bool = not case_sensitive
+        # Literal keywords every matching line contains, for the trigram index
+        self.keywords: Optional[KeywordMatcher] = self
+        # Patterns searching raw data, by encoding, see byte_pattern
+        self._byte_patterns: Dict[str, Optional[Pattern]] = {}
+    
+    def search(self, line: str) -> bool:
+        """Check whether the line contains at least one of the keywords"""
+        if not self.case_sensitive:
+            line = line.casefold()
+        return self.pattern.search(line) is not None
+    
+    def line_matches(self, text: str, folded: Optional[str], start: int, end: int) -> bool:
+        """Check whether the line between two offsets of a block matches
+        
+        Args:
+            text: Block of lines
+            folded: Casefolded block, offsets lining up with text, needed if folds_case
+            start: Offset of the line
+            end: Offset after the line
+        """
+        return self.pattern.search(folded if self.folds_case else text, start, end) is not None
+    
+    def byte_pattern(self, encoding: str) -> Optional[Pattern]:
+        """Get a pattern finding the keywords in raw data of an encoding
+        
+        Case sensitive keywords are encoded as they are. Case insensitive
+        keywords have to be ASCII, they are searched lowercased in data
+        lowered by bytes.lower(), which agrees with casefolding for ASCII.
+        In encodings that are not self-synchronizing, such as GBK, hits are
+        only candidates that have to be confirmed on the decoded line.
+        
+        Returns:
+            Bytes pattern, or None if the keywords cannot be searched in raw data
+        """
+        if encoding not in self._byte_patterns:
+            pattern = None
+            if ascii_compatible(encoding):
+                try:
+                    keys = ([term.encode(encoding) for term in self.terms] if self.case_sensitive
+                            else [term.casefold().encode('ascii') for term in self.terms])
+                    # Bytes map one to one to latin-1 characters, so the trie is built over those
+                    source = self.trie_regex([key.decode('latin-1') for key in keys])
+                    pattern = re.compile(source.encode('latin-1'))
+                except UnicodeEncodeError:
+                    pass
+            self._byte_patterns[encoding] = pattern
+        return self._byte_patterns[encoding]
+    
+    @staticmethod
+    def trie_regex(terms: List[str]) -> str:
+        """Build a regex matching any of the terms from a prefix trie of them
+        
+        Args:
+            terms: Literal terms, not empty
+            
+        Returns:
+            Regex source where alternatives sharing a prefix share a branch
+        """
+        trie: dict = {}
+        for term in terms:
+            node = trie
+            for char in term:
+                node = node.setdefault(char, {})
+            # A term ending here makes any longer term with this prefix redundant
+            node.clear()
+            node[''] = True
+        
+        def build(node: dict) -> str:
+            # Follow single-branch chains iteratively to keep recursion shallow
+            prefix = []
+            while '' not in node and len(node) == 1:
+                char, node = next(iter(node.items()))
+                prefix.append(char)
+            source = re.escape(''.join(prefix))
+            if '' in node:
+                return source
+            
+            single_chars = []
+            branches = []
+            for char, child in sorted(node.items()):
+                if '' in child:
+                    single_chars.append(re.escape(char))
+                else:
+                    branches.append(re.escape(char) + build(child))
+            if len(single_chars) == 1:
+                branches.append(single_chars[0])
+            elif single_chars:
+                branches.append('[' + ''.join(single_chars) + ']')
+            
+            if len(branches) == 1:
+                return source + branches[0]
+            return source + '(?:' + '|'.join(branches) + ')'
+        
+        return build(trie)
+
+
+class RegexMatcher:
+    """Tests lines against any number of regular expressions
+    
+    The expressions are combined into one alternation, compiled with
+    re.MULTILINE so that ^ and $ match at line boundaries when a block of
+    lines is scanned at once. Literal text that every match of an expression
+    has to contain is extracted from the parsed expression. When every
+    expression has some, lines are first tested for those literals with a
+    KeywordMatcher, and only the lines containing one of them are tested
+    against the full expressions, so most lines cost a literal scan. The
+    literals also narrow the lines to scan by the trigram index.
+    
+    Expressions with an unbounded repeat inside another repeat, such as
+    (a+)+, are rejected, as they can backtrack for an exponential time on a
+    single line. The time budget of the filter is only checked between
+    blocks of lines, so it cannot stop them.
+    """
+    
+    # Hits of scan_pattern are only candidates, the prefilter or a match spanning lines can hit
+    exact: bool = False
+    
+    # Shorter literals hit too many lines to be worth testing for first
+    MIN_LITERAL_LENGTH: int = 3
+    
+    def __init__(self, terms: List[str], case_sensitive: bool) -> None:
+        """Compile the expressions
+        
+        Raises:
+            re.error: If an expression is invalid or nests unbounded repeats
+        """
+        self.terms: List[str] = terms
+        self.case_sensitive: bool = case_sensitive
+        flags = re.MULTILINE if case_sensitive else re.MULTILINE | re.IGNORECASE
+        literals: Optional[List[str]] = [] if sre_parser is not None else None
+        literals_case_sensitive = case_sensitive
+        for term in terms if sre_parser is not None else []:
+            parsed = sre_parser.parse(term, flags)
+            if len(terms) > 1 and self._has_backreference(parsed):
+                raise re.error(f"backreferences need the expression to be used alone: {term}")
+            if self._has_nested_repeat(parsed):
+                raise re.error(f"nested repeats can take exponential time, make the inner one possessive "
+                               f"(*+, ++) or atomic ((?>...)): {term}")
+            ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+            literals_case_sensitive = literals_case_sensitive and not ignore_case
+            term_literals = self.required_literals(parsed, ignore_case)
+            if (term_literals is None or literals is None
+                    or min(map(len, term_literals)) < self.MIN_LITERAL_LENGTH):
+                literals = None
+            else:
+                literals.extend(term_literals)
+        # A single expression stays as is, so it can start with global flags such as (?i)
+        source = terms[0] if len(terms) == 1 else '|'.join(f'(?:{term})' for term in terms)
+        self.pattern: Pattern = re.compile(source, flags)
+        # Literal keywords every matching line contains, None if some expression has none
+        self.keywords: Optional[KeywordMatcher] = (
+            KeywordMatcher(sorted(set(literals)), literals_case_sensitive) if literals else None)
+        # Pattern searched in whole blocks of lines, casefolded ones if folds_case
+        self.scan_pattern: Pattern = self.keywords.pattern if self.keywords is not None else self.pattern
+        self.folds_case: bool = self.keywords is not None and not self.keywords.case_sensitive
+    
+    def byte_pattern(self, encoding: str) -> Optional[Pattern]:
+        """Get a pattern finding the required literals in raw data, see KeywordMatcher.byte_pattern
+        
+        Hits are only candidates, the expressions are tested on the decoded line.
+        """
+        return self.keywords.byte_pattern(encoding) if self.keywords is not None else None
+    
+    def search(self, line: str) -> bool:
+        """Check whether any of the expressions matches in the line"""
+        if self.keywords is not None and not self.keywords.search(line):
+            return False
+        return self.pattern.search(line) is not None
+    
+    def line_matches(self, text: str, folded: Optional[str], start: int, end: int) -> bool:
+        """Check whether the line between two offsets of a block matches
+        
+        Args:
+            text: Block of lines
+            folded: Casefolded block, offsets lining up with text, needed if folds_case
+            start: Offset of the line
+            end: Offset after the line
+        """
+        if self.keywords is not None and not self.keywords.line_matches(text, folded, start, end):
+            return False
+        return self.pattern.search(text, start, end) is not None
+    
+    @classmethod
+    def required_literals(cls, items, ignore_case: bool) -> Optional[List[str]]:
+        """Find literal text that every match of a parsed expression contains
+        
+        Args:
+            items: Parsed expression or a part of it, as (opcode, argument) tuples
+            ignore_case: Whether the expression ignores case, literals are then kept to ASCII
+                so that casefolding them agrees with the case folding of the regex engine
+            
+        Returns:
+            Literals of which every match contains at least one, preferring the most
+            selective choice, or None if no such literals were found
+        """
+        best: Optional[List[str]] = None
+        
+        def consider(candidate: Optional[List[str]]) -> None:
+            nonlocal best
+            if not candidate or not all(candidate):
+                return
+            # Longer literals are rarer, and fewer alternatives are cheaper to scan for
+            score = (min(map(len, candidate)), -len(candidate))
+            if best is None or score > (min(map(len, best)), -len(best)):
+                best = candidate
+        
+        run: List[str] = []
+        for opcode, argument in items:
+            if opcode is sre_constants.LITERAL and (not ignore_case or argument < 128):
+                run.append(chr(argument))
+                continue
+            consider([''.join(run)])
+            run = []
+            if opcode is sre_constants.SUBPATTERN:
+                _, add_flags, del_flags, sub_items = argument
+                # Case flags switched inside the group would change how its literals match
+                if not (add_flags | del_flags) & re.IGNORECASE:
+                    consider(cls.required_literals(sub_items, ignore_case))
+            elif opcode is sre_constants.ATOMIC_GROUP:
+                consider(cls.required_literals(argument, ignore_case))
+            elif opcode in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT,
+                            sre_constants.POSSESSIVE_REPEAT):
+                min_count, _, sub_items = argument
+                if min_count >= 1:
+                    consider(cls.required_literals(sub_items, ignore_case))
+            elif opcode is sre_constants.BRANCH:
+                alternatives = [cls.required_literals(sub_items, ignore_case) for sub_items in argument[1]]
+                if all(alternatives):
+                    consider(sorted({literal for literals in alternatives for literal in literals}))
+        consider([''.join(run)])
+        return best
+    
+    @staticmethod
+    def _has_backreference(items) -> bool:
+        """Check whether a parsed expression refers back to one of its groups"""
+        for opcode, argument in items:
+            if opcode in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+                return True
+            arguments = argument if isinstance(argument, (list, tuple)) else [argument]
+            for value in arguments:
+                if isinstance(value, sre_parser.SubPattern) and RegexMatcher._has_backreference(value):
+                    return True
+                if isinstance(value, list) and any(isinstance(sub_items, sre_parser.SubPattern)
+                                                   and RegexMatcher._has_backreference(sub_items)
+                                                   for sub_items in value):
+                    return True
+        return False
+    
+    @staticmethod
+    def _has_nested_repeat(items, repeated: bool = False) -> bool:
+        """Check whether a parsed expression has an unbounded repeat inside another repeat
+        
+        Possessive repeats and atomic groups give up no positions once they
+        matched, so their contents are left out.
+        
+        Args:
+            items: Parsed expression or a part of it, as (opcode, argument) tuples
+            repeated: Whether the items are inside a repeat of more than one time
+        """
+        for opcode, argument in items:
+            if opcode in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+                _, max_count, sub_items = argument
+                if repeated and max_count is sre_constants.MAXREPEAT:
+                    return True
+                if RegexMatcher._has_nested_repeat(sub_items, repeated or max_count > 1):
+                    return True
+            elif opcode is sre_constants.SUBPATTERN:
+                if RegexMatcher._has_nested_repeat(argument[3], repeated):
+                    return True
+            elif opcode is sre_constants.BRANCH:
+                if any(RegexMatcher._has_nested_repeat(sub_items, repeated) for sub_items in argument[1]):
+                    return True
+            elif opcode is sre_constants.GROUPREF_EXISTS:
+                if any(sub_items is not None and RegexMatcher._has_nested_repeat(sub_items, repeated)
+                       for sub_items in argument[1:]):
+                    return True
+        return False
+
+
+# Either kind of matcher, both test lines with search() and blocks of lines with scan_pattern
+Matcher = Union[KeywordMatcher, RegexMatcher]
+
+
+class FilterQuery(NamedTuple):
+    """Normalized filter conditions, usable as a cache key
+    
+    Terms of case insensitive keyword lists are stored casefolded, so
+    queries that only differ in the case of such terms are equal. Regular
+    expressions are stored as entered, casefolding would change their meaning.
+    Levels are codes of LOG_LEVELS, checked against the level index of the
+    file instead of its text.
+    """
+    include_terms: FrozenSet[str]
+    include_case_sensitive: bool
+    exclude_terms: FrozenSet[str]
+    exclude_case_sensitive: bool
+    start_ms: Optional[int]
+    end_ms: Optional[int]
+    include_regex: bool = False
+    exclude_regex: bool = False
+    levels: Optional[FrozenSet[int]] = None
+    
+    @classmethod
+    def create(cls, include_terms: List[str], include_case_sensitive: bool,
+               exclude_terms: List[str], exclude_case_sensitive: bool,
+               start_time: str = "", end_time: str = "",
+               include_regex: bool = False, exclude_regex: bool = False,
+               levels: Optional[Iterable[int]] = None) -> 'FilterQuery':
+        """Build a normalized query from raw filter conditions
+        
+        Args:
+            include_terms: Include keywords
+            include_case_sensitive: Whether include keywords are case sensitive
+            exclude_terms: Exclude keywords
+            exclude_case_sensitive: Whether exclude keywords are case sensitive
+            start_time: Start time string in format HH:MM:SS.mmm
+            end_time: End time string in format HH:MM:SS.mmm
+            include_regex: Whether include keywords are regular expressions
+            exclude_regex: Whether exclude keywords are regular expressions
+            levels: Codes of the levels to keep, None for every level
+        """
+        def normalize(terms: List[str], case_sensitive: bool, regex: bool) -> Tuple[FrozenSet[str], bool]:
+            if not terms:
+                return frozenset(), False
+            if not case_sensitive and not regex:
+                terms = [term.casefold() for term in terms]
+            return frozenset(terms), case_sensitive
+        
+        return cls(*normalize(include_terms, include_case_sensitive, include_regex),
+                   *normalize(exclude_terms, exclude_case_sensitive, exclude_regex),
+                   LogFilter.parse_time(start_time), LogFilter.parse_time(end_time),
+                   include_regex and bool(include_terms), exclude_regex and bool(exclude_terms),
+                   None if levels is None else frozenset(levels))
+    
+    def include_matcher(self) -> Optional['Matcher']:
+        """Compile the include terms
+        
+        Raises:
+            re.error: If a regular expression is invalid
+        """
+        return LogFilter.compile_matcher(sorted(self.include_terms), self.include_case_sensitive,
+                                         self.include_regex)
+    
+    def exclude_matcher(self) -> Optional['Matcher']:
+        """Compile the exclude terms
+        
+        Raises:
+            re.error: If a regular expression is invalid
+        """
+        return LogFilter.compile_matcher(sorted(self.exclude_terms), self.exclude_case_sensitive,
+                                         self.exclude_regex)
+    
+    def has_regex(self) -> bool:
+        """Check whether the query matches regular expressions"""
+        return self.include_regex or self.exclude_regex
+    
+    def matches_all(self) -> bool:
+        """Check whether the query has no conditions, so that every line matches"""
+        return (not self.include_terms and not self.exclude_terms
+                and self.start_ms is None and self.end_ms is None and self.levels is None)
+    
+    def without_levels(self) -> 'FilterQuery':
+        """Get the query without its level selection, matching on keywords and time only"""
+        return self._replace(levels=None)
+    
+    def is_within(self, other: 'FilterQuery') -> bool:
+        """Check whether every line matching this query also matches another one
+        
+        Args:
+            other: Possibly broader query
+        """
+        if other.start_ms is not None and (self.start_ms is None or self.start_ms < other.start_ms):
+            return False
+        if other.end_ms is not None and (self.end_ms is None or self.end_ms > other.end_ms):
+            return False
+        if other.levels is not None and (self.levels is None or not self.levels <= other.levels):
+            return False
+        
+        # Every line with one of our include keywords has to contain one of theirs
+        if other.include_terms and not (
+                self.include_terms and self._terms_imply(self.include_terms, self.include_case_sensitive,
+                                                         self.include_regex, other.include_terms,
+                                                         other.include_case_sensitive, other.include_regex)):
+            return False
+        
+        # Every line they exclude has to be excluded by us as well
+        if other.exclude_terms and not (
+                self.exclude_terms and self._terms_imply(other.exclude_terms, other.exclude_case_sensitive,
+                                                         other.exclude_regex, self.exclude_terms,
+                                                         self.exclude_case_sensitive, self.exclude_regex)):
+            return False
+        return True
+    
+    @staticmethod
+    def _terms_imply(terms: FrozenSet[str], case_sensitive: bool, regex: bool,
+                     other_terms: FrozenSet[str], other_case_sensitive: bool, other_regex: bool) -> bool:
+        """Check whether a line containing any of terms always contains one of other_terms"""
+        if regex or other_regex:
+            # Expressions are only compared as a whole
+            return regex == other_regex and case_sensitive == other_case_sensitive and terms <= other_terms
+        if other_case_sensitive and not case_sensitive:
+            return False
+        if not other_case_sensitive:
+            terms = [term.casefold() for term in terms]
+        # A term containing another term can only occur together with it
+        return all(any(other_term in term for other_term in other_terms) for term in terms)
+
+
+class FilterCache:
+    """LRU cache of filter results for one log file
+    
+    Each result is stored with the number of lines it covers, so that it
+    can be extended when the file grows. Results of broader queries are
+    reused to compute narrower ones.
+    """
+    
+    # Maximum number of cached results
+    MAX_ENTRIES: int = 16
+    
+    # Maximum number of line ids kept over all cached results
+    MAX_LINE_IDS: int = 8 * 1024 * 1024
+    
+    def __init__(self) -> None:
+        self._entries: OrderedDict = OrderedDict()
+        self._line_id_count: int = 0
+    
+    def clear(self) -> None:
+        """Drop all cached results, such as after the file was truncated or replaced"""
+        self._entries.clear()
+        self._line_id_count = 0
+    
+    def get(self, query: FilterQuery) -> Optional[Tuple[array, int]]:
+        """Get the cached result of a query
+        
+        Returns:
+            Tuple of the matching line ids and the number of lines they cover,
+            or None if the query is not cached
+        """
+        entry = self._entries.get(query)
+        if entry is not None:
+            self._entries.move_to_end(query)
+        return entry
+    
+    def find_broader(self, query: FilterQuery) -> Optional[Tuple[array, int]]:
+        """Find the smallest cached result of a query matching a superset of the lines of query
+        
+        Returns:
+            Tuple of the matching line ids and the number of lines they cover,
+            or None if no broader query is cached
+        """
+        best = None
+        for cached_query, entry in self._entries.items():
+            if (best is None or len(entry[0]) < len(best[1][0])) and query.is_within(cached_query):
+                best = cached_query, entry
+        if best is None:
+            return None
+        self._entries.move_to_end(best[0])
+        return best[1]
+    
+    def put(self, query: FilterQuery, line_ids: array, line_count: int) -> None:
+        """Store the result of a query, evicting the least recently used results
+        
+        Args:
+            query: Normalized query
+            line_ids: Matching line ids, must not be modified afterwards
+            line_count: Number of lines of the file covered by the result
+        """
+        old_entry = self._entries.pop(query, None)
+        if old_entry is not None:
+            self._line_id_count -= len(old_entry[0])
+        if len(line_ids) > self.MAX_LINE_IDS:
+            return
+        
+        self._entries[query] = (line_ids, line_count)
+        self._line_id_count += len(line_ids)
+        while len(self._entries) > self.MAX_ENTRIES or self._line_id_count > self.MAX_LINE_IDS:
+            _, (evicted_ids, _) = self._entries.popitem(last=False)
+            self._line_id_count -= len(evicted_ids)
+
+
+class LogFilter:
+    """Utility class for filtering log content"""
+    
+    # Default number of bytes filtered by one worker task in parallel mode
+    PARALLEL_CHUNK_SIZE: int = 32 * 1024 * 1024
+    
+    # Number of bytes filtered between progress reports when filtering in this process
+    SEQUENTIAL_CHUNK_SIZE: int = 1024 * 1024
+    
+    # Size of the first chunk of a run, later chunks double up to the full chunk size
+    # so that the first matches are ready after a fraction of a second
+    FIRST_CHUNK_SIZE: int = 256 * 1024
+    
+    # Number of matches per batch yielded by iter_match_batches
+    MATCH_BATCH_SIZE: int = 1000
+    
+    # Number of line ids re-checked between progress reports when narrowing a cached result
+    SUBSET_BATCH_SIZE: int = 64 * 1024
+    
+    # Seconds a query with regular expressions may run before it is stopped with FilterTimeout
+    REGEX_TIME_BUDGET: float = 60.0
+    
+    # Process pool shared by parallel filter runs, created on first use
+    _executor: Optional[ProcessPoolExecutor] = None
+    _executor_workers: int = 0
+    
+    @staticmethod
+    def compile_matcher(terms: List[str], case_sensitive: bool, regex: bool = False) -> Optional[Matcher]:
+        """Compile terms into a single matcher
+        
+        Matchers are kept in a small LRU cache, so filtering again, tailing
+        and re-running a query do not parse and compile the terms again.
+        
+        Args:
+            terms: List of search terms
+            case_sensitive: Whether to use case sensitive matching
+            regex: Whether the terms are regular expressions rather than plain strings
+            
+        Returns:
+            Matcher for all terms, or None if there are no terms
+            
+        Raises:
+            re.error: If a regular expression is invalid
+        """
+        if not terms:
+            return None
+        return _cached_matcher(tuple(terms), case_sensitive, regex)
+    
+    @staticmethod
+    def iter_matches(log_lines: Iterable[str], 
+                     include_matcher: Optional[Matcher],
+                     exclude_matcher: Optional[Matcher],
+                     start_time: str = "",
+                     end_time: str = "") -> Iterator[Tuple[int, str]]:
+        """Yield the log lines matching the keywords and time range
+        
+        Args:
+            log_lines: Log lines to filter, such as a list or a LogFile
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            start_time: Start time string in format HH:MM:SS.mmm
+            end_time: End time string in format HH:MM:SS.mmm
+            
+        Yields:
+            Tuple of (line_index, line) for every matching line
+        """
+        start_ms = LogFilter.parse_time(start_time)
+        end_ms = LogFilter.parse_time(end_time)
+        use_time_filter = start_ms is not None or end_ms is not None
+        
+        if isinstance(log_lines, LogFile):
+            # Narrow the file down to the time range and keyword candidates before matching keywords
+            windows = LogFilter.candidate_windows(log_lines, include_matcher, start_ms, end_ms)
+            yield from LogFilter._match_windows(log_lines, windows, include_matcher, exclude_matcher)
+            return
+        
+        numbered_lines = enumerate(log_lines)
+        if use_time_filter:
+            numbered_lines = LogFilter._in_time_range(numbered_lines, start_ms, end_ms)
+        yield from LogFilter._match_keywords(numbered_lines, include_matcher, exclude_matcher)
+    
+    @staticmethod
+    def _match_windows(log_file: LogFile, windows: Iterable[Tuple[int, int]],
+                       include_matcher: Optional[Matcher],
+                       exclude_matcher: Optional[Matcher]) -> Iterator[Tuple[int, str]]:
+        """Yield the numbered lines of some line ranges passing the include and exclude keywords
+        
+        The ranges are matched as raw data in chunks of about DECODE_CHUNK_SIZE
+        bytes, and only the matching lines are decoded.
+        """
+        offsets = log_file.offsets
+        encoding = log_file.encoding
+        for first_line, end_line in windows:
+            for chunk_start, chunk_end in LogFilter.split_chunks(log_file, LogFile.DECODE_CHUNK_SIZE,
+                                                                 first_line, end_line):
+                data = log_file.read_bytes(offsets[chunk_start], offsets[chunk_end])
+                spans = LogFilter.match_byte_spans(data, encoding, include_matcher, exclude_matcher)
+                runs = list(LogFilter.number_spans(data, chunk_start, spans))
+                if not runs:
+                    continue
+                # Decode the matching lines of the chunk at once, they are numbered run by run
+                text = b''.join([data[start:end] for _, _, start, end in runs]).decode(encoding, errors='ignore')
+                line_ids = chain.from_iterable(range(line_index, line_index + line_count)
+                                               for line_index, line_count, _, _ in runs)
+                yield from zip(line_ids, LogFile.LINE_PATTERN.findall(text))
+    
+    @staticmethod
+    def _match_keywords(numbered_lines: Iterable[Tuple[int, str]],
+                        include_matcher: Optional[Matcher],
+                        exclude_matcher: Optional[Matcher]) -> Iterator[Tuple[int, str]]:
+        """Yield the numbered lines passing the include and exclude keywords"""
+        for line_index, line in numbered_lines:
+            # Check for any exclude keywords (high priority)
+            if exclude_matcher and exclude_matcher.search(line):
+                continue
+            
+            # Check for at least one include keyword
+            if include_matcher and not include_matcher.search(line):
+                continue
+            
+            yield line_index, line
+    
+    @staticmethod
+    def match_spans(text: str,
+                    include_matcher: Optional[Matcher],
+                    exclude_matcher: Optional[Matcher]) -> Iterator[Tuple[int, int]]:
+        """Find the lines of a block of text passing the include and exclude keywords
+        
+        Instead of testing line by line, the keywords are searched in the
+        whole block and only the lines they hit are looked at, so a block is
+        scanned at the speed of the regex engine. Hits of a regular
+        expression matcher, such as lines holding its required literals, are
+        confirmed by testing their line on its own.
+        
+        Args:
+            text: Decoded lines, including line breaks
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            
+        Yields:
+            Start and end offsets of runs of consecutive matching lines in text
+        """
+        folded = None
+        if (include_matcher and include_matcher.folds_case) or (exclude_matcher and exclude_matcher.folds_case):
+            folded = text.casefold()
+            if len(folded) != len(text):
+                # Casefolding expanded some characters, so offsets no longer line up, test line by line
+                lines = LogFile.LINE_PATTERN.findall(text)
+                for start, line in LogFilter._match_keywords(zip(accumulate(map(len, lines), initial=0), lines),
+                                                             include_matcher, exclude_matcher):
+                    yield start, start + len(line)
+                return
+        include_text = folded if include_matcher and include_matcher.folds_case else text
+        exclude_text = folded if exclude_matcher and exclude_matcher.folds_case else text
+        
+        if include_matcher is None:
+            # Every line matches except the excluded ones
+            pos = 0
+            if exclude_matcher is not None:
+                search = exclude_matcher.scan_pattern.search
+                exact = exclude_matcher.exact
+                match = search(exclude_text)
+                while match:
+                    line_start = text.rfind('\n', 0, match.start()) + 1
+                    if line_start >= len(text):
+                        # An empty match after the last line break is not on any line
+                        break
+                    line_end = text.find('\n', match.start()) + 1 or len(text)
+                    if exact or exclude_matcher.line_matches(text, folded, line_start, line_end):
+                        if line_start > pos:
+                            yield pos, line_start
+                        pos = line_end
+                    # Searching again from the end of the text would find the same empty match forever
+                    match = search(exclude_text, line_end) if line_end < len(text) else None
+            if pos < len(text):
+                yield pos, len(text)
+            return
+        
+        search = include_matcher.scan_pattern.search
+        exact = include_matcher.exact
+        match = search(include_text)
+        while match:
+            line_start = text.rfind('\n', 0, match.start()) + 1
+            if line_start >= len(text):
+                # An empty match after the last line break is not on any line
+                break
+            line_end = text.find('\n', match.start()) + 1 or len(text)
+            if ((exact or include_matcher.line_matches(text, folded, line_start, line_end))
+                    and (exclude_matcher is None
+                         or not exclude_matcher.line_matches(text, folded, line_start, line_end))):
+                yield line_start, line_end
+            # Searching again from the end of the text would find the same empty match forever
+            match = search(include_text, line_end) if line_end < len(text) else None
+    
+    @staticmethod
+    def match_byte_spans(data: bytes, encoding: str,
+                         include_matcher: Optional[Matcher],
+                         exclude_matcher: Optional[Matcher]) -> Iterator[Tuple[int, int]]:
+        """Find the lines of a block of raw data passing the include and exclude keywords
+        
+        Like match_spans, but the keywords are searched in the encoded data,
+        so the block is never decoded as a whole. A line is only decoded to
+        confirm a hit that may not be a match: hits of the required literals
+        of a regular expression, and any hit in an encoding such as GBK,
+        where the bytes of a keyword can also turn up across characters.
+        Lines are matched on their raw bytes, so bytes that do not decode
+        cannot join the characters around them into a keyword. Blocks that
+        cannot be matched this way, because a keyword cannot be encoded or
+        the block holds characters that casefold to ASCII, are decoded and
+        matched by match_spans.
+        
+        Args:
+            data: Raw bytes of whole lines
+            encoding: Encoding of the data, its line breaks have to be b'\n'
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            
+        Yields:
+            Start and end byte offsets of runs of consecutive matching lines in data
+        """
+        include_pattern = include_matcher.byte_pattern(encoding) if include_matcher else None
+        exclude_pattern = exclude_matcher.byte_pattern(encoding) if exclude_matcher else None
+        folds_case = bool((include_matcher and include_matcher.folds_case)
+                          or (exclude_matcher and exclude_matcher.folds_case))
+        if ((include_matcher and include_pattern is None) or (exclude_matcher and exclude_pattern is None)
+                or (folds_case and not data.isascii() and LogFilter._folds_to_ascii(data, encoding))):
+            yield from LogFilter._match_decoded_spans(data, encoding, include_matcher, exclude_matcher)
+            return
+        lowered = data.lower() if folds_case else None
+        self_synchronized = self_synchronizing(encoding)
+        
+        def confirmed(matcher: Matcher, line_start: int, line_end: int) -> bool:
+            """Check whether a line hit by the pattern of a matcher really matches"""
+            if self_synchronized and matcher.exact:
+                return True
+            return matcher.search(data[line_start:line_end].decode(encoding, errors='ignore'))
+        
+        if include_matcher is None:
+            # Every line matches except the excluded ones
+            pos = 0
+            if exclude_matcher is not None:
+                exclude_data = lowered if exclude_matcher.folds_case else data
+                search = exclude_pattern.search
+                match = search(exclude_data)
+                while match:
+                    line_start = data.rfind(b'\n', 0, match.start()) + 1
+                    if line_start >= len(data):
+                        break
+                    line_end = data.find(b'\n', match.start()) + 1 or len(data)
+                    if confirmed(exclude_matcher, line_start, line_end):
+                        if line_start > pos:
+                            yield pos, line_start
+                        pos = line_end
+                    match = search(exclude_data, line_end) if line_end < len(data) else None
+            if pos < len(data):
+                yield pos, len(data)
+            return
+        
+        include_data = lowered if include_matcher.folds_case else data
+        exclude_data = lowered if exclude_matcher and exclude_matcher.folds_case else data
+        search = include_pattern.search
+        match = search(include_data)
+        while match:
+            line_start = data.rfind(b'\n', 0, match.start()) + 1
+            if line_start >= len(data):
+                break
+            line_end = data.find(b'\n', match.start()) + 1 or len(data)
+            if (confirmed(include_matcher, line_start, line_end)
+                    and (exclude_matcher is None
+                         or not exclude_pattern.search(exclude_data, line_start, line_end)
+                         or not confirmed(exclude_matcher, line_start, line_end))):
+                yield line_start, line_end
+            match = search(include_data, line_end) if line_end < len(data) else None
+    
+    @staticmethod
+    def _folds_to_ascii(data: bytes, encoding: str) -> bool:
+        """Check whether raw data may hold characters that casefold to ASCII, such as 'ß' to 'ss'"""
+        pattern = fold_pattern(encoding)
+        return pattern is not None and pattern.search(data) is not None
+    
+    @staticmethod
+    def _match_decoded_spans(data: bytes, encoding: str,
+                             include_matcher: Optional[Matcher],
+                             exclude_matcher: Optional[Matcher]) -> Iterator[Tuple[int, int]]:
+        """Decode a block of raw data and match it with match_spans, see match_byte_spans"""
+        text = data.decode(encoding, errors='ignore')
+        # Line breaks survive decoding, so the lines of the text and of the data line up by number
+        line_starts = None
+        line_index = 0
+        pos = 0
+        for start, end in LogFilter.match_spans(text, include_matcher, exclude_matcher):
+            if line_starts is None:
+                line_lengths = map(len, data.split(b'\n'))
+                line_starts = list(accumulate(map(add, line_lengths, repeat(1)), initial=0))
+            line_index += text.count('\n', pos, start)
+            line_count = text.count('\n', start, end) + (not text.endswith('\n', start, end))
+            yield line_starts[line_index], min(line_starts[line_index + line_count], len(data))
+            line_index += line_count
+            pos = end
+    
+    @staticmethod
+    def number_spans(data: bytes, first_line: int,
+                     spans: Iterable[Tuple[int, int]]) -> Iterator[Tuple[int, int, int, int]]:
+        """Number the runs of lines found in a block of raw data, such as by match_byte_spans
+        
+        Args:
+            data: Raw bytes of whole lines
+            first_line: Number of the first line of the block
+            spans: Ascending start and end byte offsets of runs of whole lines
+            
+        Yields:
+            Tuple of the number of the first line of a run, its number of lines and its byte offsets
+        """
+        count = data.count
+        line_index = first_line
+        pos = 0
+        for start, end in spans:
+            line_index += count(b'\n', pos, start)
+            # Only the last line of the data can lack its line break
+            line_count = count(b'\n', start, end) + (not data.endswith(b'\n', start, end))
+            yield line_index, line_count, start, end
+            line_index += line_count
+            pos = end
+    
+    @staticmethod
+    def filter_bytes(data: bytes, encoding: str, first_line: int,
+                     include_matcher: Optional[Matcher],
+                     exclude_matcher: Optional[Matcher]) -> array:
+        """Filter a block of raw lines by keywords, returning the ids of the matching lines
+        
+        Args:
+            data: Raw bytes of whole lines
+            encoding: Encoding of the data
+            first_line: Id of the first line of the block
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            
+        Returns:
+            Compact array with the ids of the matching lines
+        """
+        line_ids = array('Q')
+        spans = LogFilter.match_byte_spans(data, encoding, include_matcher, exclude_matcher)
+        for line_index, line_count, _, _ in LogFilter.number_spans(data, first_line, spans):
+            line_ids.extend(range(line_index, line_index + line_count))
+        return line_ids
+    
+    @staticmethod
+    def _in_time_range(numbered_lines: Iterable[Tuple[int, str]],
+                       start_ms: Optional[int],
+                       end_ms: Optional[int]) -> Iterator[Tuple[int, str]]:
+        """Yield the numbered lines within a time range
+        
+        Lines without a timestamp take the time of the entry they continue,
+        like in the timestamp index of LogFile. Lines before the first
+        timestamp are always kept.
+        """
+        line_time = -1
+        for line_index, line in numbered_lines:
+            time_match = LINE_TIME_PATTERN.match(line)
+            if time_match:
+                hours, minutes, seconds, millis = time_match.groups()
+                line_time = ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(millis)
+            
+            if line_time >= 0:
+                # Check time range
+                if start_ms is not None and line_time < start_ms:
+                    continue
+                if end_ms is not None and line_time > end_ms:
+                    continue
+            
+            yield line_index, line
+    
+    @staticmethod
+    def parse_time(time_str: str) -> Optional[int]:
+        """Convert a time string to milliseconds since midnight
+        
+        Args:
+            time_str: Time string in format HH:MM:SS.mmm
+            
+        Returns:
+            Milliseconds since midnight, or None if the string is empty or invalid
+        """
+        if not time_str:
+            return None
+        try:
+            value = datetime.strptime(time_str, "%H:%M:%S.%f")
+        except ValueError:
+            return None
+        return ((value.hour * 60 + value.minute) * 60 + value.second) * 1000 + value.microsecond // 1000
+    
+    @staticmethod
+    def format_time(time_ms: Optional[int]) -> str:
+        """Convert milliseconds since midnight back to a HH:MM:SS.mmm string
+        
+        Args:
+            time_ms: Milliseconds since midnight, or None
+            
+        Returns:
+            Time string, empty if time_ms is None
+        """
+        if time_ms is None:
+            return ""
+        seconds, millis = divmod(time_ms, 1000)
+        minutes, seconds = divmod(seconds, 60)
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+    
+    @staticmethod
+    def time_windows(log_file: LogFile, start_ms: Optional[int], end_ms: Optional[int]) -> List[Tuple[int, int]]:
+        """Get the line ranges of a log file within a time range
+        
+        Args:
+            log_file: Indexed log file
+            start_ms: Start of the range in milliseconds, None for no lower bound
+            end_ms: End of the range in milliseconds, None for no upper bound
+            
+        Returns:
+            List of (start_line, end_line) ranges in file order, the whole file
+            if there is no time range
+        """
+        if start_ms is None and end_ms is None:
+            return [(0, len(log_file))] if len(log_file) else []
+        
+        windows = log_file.time_window(start_ms, end_ms)
+        
+        # Lines before the first timestamp cannot be placed in time, always keep them
+        untimed_lines = bisect_right(log_file.timestamps, -1)
+        if untimed_lines and start_ms is not None:
+            windows.insert(0, (0, untimed_lines))
+        return windows
+    
+    @staticmethod
+    def candidate_windows(log_file: LogFile, include_matcher: Optional[Matcher],
+                          start_ms: Optional[int], end_ms: Optional[int]) -> List[Tuple[int, int]]:
+        """Get the line ranges of a log file that can hold matches
+        
+        The time range is narrowed by the timestamp index and, once it is
+        built, the include keywords by the trigram index of the file.
+        
+        Args:
+            log_file: Indexed log file
+            include_matcher: Matcher for include keywords, None to include all lines
+            start_ms: Start of the range in milliseconds, None for no lower bound
+            end_ms: End of the range in milliseconds, None for no upper bound
+            
+        Returns:
+            List of (start_line, end_line) ranges in file order
+        """
+        windows = LogFilter.time_windows(log_file, start_ms, end_ms)
+        trigram_index = log_file.trigram_index
+        if trigram_index is None or include_matcher is None or include_matcher.keywords is None:
+            return windows
+        
+        # Lines appended after the index was built have to be checked as well
+        keywords = include_matcher.keywords
+        candidates = trigram_index.candidate_windows(keywords.terms, keywords.case_sensitive, len(log_file))
+        if candidates is None:
+            return windows
+        return LogFilter.intersect_windows(windows, candidates)
+    
+    @staticmethod
+    def intersect_windows(first: List[Tuple[int, int]], second: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        """Intersect two ordered lists of disjoint (start_line, end_line) ranges"""
+        windows = []
+        i = j = 0
+        while i < len(first) and j < len(second):
+            start = max(first[i][0], second[j][0])
+            end = min(first[i][1], second[j][1])
+            if start < end:
+                windows.append((start, end))
+            # Advance whichever range ends first
+            if first[i][1] < second[j][1]:
+                i += 1
+            else:
+                j += 1
+        return windows
+    
+    @staticmethod
+    def filter_logs(log_lines: Iterable[str], 
+                   include_matcher: Optional[Matcher],
+                   exclude_matcher: Optional[Matcher],
+                   start_time: str = "",
+                   end_time: str = "") -> Tuple[str, int]:
+        """Filter log lines based on keywords and time range
+        
+        Args:
+            log_lines: Log lines to filter, such as a list or a LogFile
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            start_time: Start time string in format HH:MM:SS.mmm
+            end_time: End time string in format HH:MM:SS.mmm
+            
+        Returns:
+            Tuple of (filtered_content, match_count)
+        """
+        # Write the lines straight into one buffer instead of joining a list of them
+        result_text = io.StringIO()
+        match_count = 0
+        for batch in LogFilter.iter_match_batches(log_lines, include_matcher, exclude_matcher,
+                                                  start_time, end_time):
+            result_text.writelines(line for _, line in batch)
+            match_count += len(batch)
+        return result_text.getvalue(), match_count
+    
+    @staticmethod
+    def iter_match_batches(log_lines: Iterable[str], 
+                           include_matcher: Optional[Matcher],
+                           exclude_matcher: Optional[Matcher],
+                           start_time: str = "",
+                           end_time: str = "",
+                           batch_size: int = 0) -> Iterator[List[Tuple[int, str]]]:
+        """Yield the matching log lines in batches, so that they can be shown while filtering
+        
+        Args:
+            log_lines: Log lines to filter, such as a list or a LogFile
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            start_time: Start time string in format HH:MM:SS.mmm
+            end_time: End time string in format HH:MM:SS.mmm
+            batch_size: Number of matches per batch, 0 for MATCH_BATCH_SIZE
+            
+        Yields:
+            Lists of (line_index, line) tuples in file order
+        """
+        batch_size = batch_size or LogFilter.MATCH_BATCH_SIZE
+        batch = []
+        for match in LogFilter.iter_matches(log_lines, include_matcher, exclude_matcher, start_time, end_time):
+            batch.append(match)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    
+    @staticmethod
+    def filter_line_ids(log_lines: Iterable[str], 
+                        include_matcher: Optional[Matcher],
+                        exclude_matcher: Optional[Matcher],
+                        start_time: str = "",
+                        end_time: str = "") -> array:
+        """Filter log lines like filter_logs, returning the matching line indexes
+        
+        Args:
+            log_lines: Log lines to filter, such as a list or a LogFile
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            start_time: Start time string in format HH:MM:SS.mmm
+            end_time: End time string in format HH:MM:SS.mmm
+            
+        Returns:
+            Compact array with the index of every matching line
+        """
+        return array('Q', (line_index for line_index, _ in LogFilter.iter_matches(
+            log_lines, include_matcher, exclude_matcher, start_time, end_time)))
+    
+    @staticmethod
+    def split_chunks(log_file: LogFile, chunk_size: int,
+                     first_line: int = 0, end_line: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Split a range of lines of a log file into ranges of roughly chunk_size bytes
+        
+        Args:
+            log_file: Indexed log file
+            chunk_size: Target number of bytes per range
+            first_line: First line to cover
+            end_line: Line after the last line to cover, defaults to the end of the file
+            
+        Returns:
+            List of (start_line, end_line) ranges covering every line in order
+        """
+        offsets = log_file.offsets
+        line_count = len(log_file) if end_line is None else end_line
+        chunks = []
+        start = first_line
+        while start < line_count:
+            end = bisect_left(offsets, offsets[start] + chunk_size, start + 1, line_count)
+            chunks.append((start, end))
+            start = end
+        return chunks
+    
+    @classmethod
+    def get_executor(cls, workers: int) -> ProcessPoolExecutor:
+        """Get the shared process pool, recreating it if the worker count changed
+        
+        Args:
+            workers: Number of worker processes
+        """
+        if cls._executor is None or cls._executor_workers != workers:
+            cls.shutdown_executor()
+            cls._executor = ProcessPoolExecutor(max_workers=workers)
+            cls._executor_workers = workers
+        return cls._executor
+    
+    @classmethod
+    def shutdown_executor(cls) -> None:
+        """Stop the worker processes of the shared process pool"""
+        if cls._executor is not None:
+            cls._executor.shutdown(wait=False, cancel_futures=True)
+            cls._executor = None
+            cls._executor_workers = 0
+    
+    @classmethod
+    def terminate_executor(cls) -> None:
+        """Kill the worker processes of the shared process pool, such as when one is stuck in a task"""
+        executor = cls._executor
+        if executor is None:
+            return
+        if hasattr(executor, 'terminate_workers'):
+            executor.terminate_workers()
+        else:
+            # No public way to stop running tasks before Python 3.14
+            processes = list((getattr(executor, '_processes', None) or {}).values())
+            cls.shutdown_executor()
+            for process in processes:
+                process.terminate()
+        cls._executor = None
+        cls._executor_workers = 0
+    
+    @classmethod
+    def filter_line_ids_parallel(cls, log_file: LogFile,
+                                 include_matcher: Optional[Matcher],
+                                 exclude_matcher: Optional[Matcher],
+                                 start_time: str = "",
+                                 end_time: str = "",
+                                 workers: int = 0,
+                                 chunk_size: int = 0,
+                                 first_line: int = 0,
+                                 end_line: Optional[int] = None,
+                                 progress: Optional[ProgressCallback] = None,
+                                 cancel_event: Optional[threading.Event] = None,
+                                 batch: Optional[BatchCallback] = None,
+                                 deadline: Optional[float] = None) -> array:
+        """Filter a log file like filter_line_ids, spreading the work over processes
+        
+        The file is split at line boundaries into chunks. Each worker reads its
+        chunk straight from the file, so only the query and the matching line
+        ids cross process boundaries. Results are merged back in file order.
+        With a single worker, the chunks are filtered in this process, so that
+        progress is still reported and cancellation still checked between them.
+        
+        Args:
+            log_file: Indexed log file to filter
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            start_time: Start time string in format HH:MM:SS.mmm
+            end_time: End time string in format HH:MM:SS.mmm
+            workers: Number of worker processes, 0 for one per CPU core
+            chunk_size: Bytes per worker task, 0 for PARALLEL_CHUNK_SIZE
+            first_line: First line to filter, earlier lines are skipped
+            end_line: Line after the last line to filter, defaults to the end of the file
+            progress: Callback receiving the filtered and total number of bytes after each chunk
+            cancel_event: Event that stops the run with FilterCancelled once set
+            batch: Callback receiving the matches of each chunk as soon as they are merged
+            deadline: time.monotonic() value after which the run stops with FilterTimeout
+            
+        Returns:
+            Compact array with the index of every matching line
+            
+        Raises:
+            FilterCancelled: If cancel_event was set before the run finished
+            FilterTimeout: If the deadline passed before the run finished
+        """
+        workers = workers or os.cpu_count() or 1
+        
+        # Only the lines inside the time range and keyword candidates are handed out to workers
+        windows = cls.candidate_windows(log_file, include_matcher,
+                                        cls.parse_time(start_time), cls.parse_time(end_time))
+        if end_line is None:
+            end_line = len(log_file)
+        if first_line or end_line < len(log_file):
+            windows = cls.intersect_windows(windows, [(first_line, end_line)])
+        
+        chunks = cls._split_windows(log_file, windows, chunk_size or cls.PARALLEL_CHUNK_SIZE,
+                                    cls.FIRST_CHUNK_SIZE)
+        # Not worth starting processes for a single chunk, and compressed files are read in order
+        parallel = workers > 1 and len(chunks) > 1 and log_file.worker_readable
+        offsets = log_file.offsets
+        if parallel:
+            executor = cls.get_executor(workers)
+            futures = [
+                executor.submit(_filter_chunk, log_file.path, log_file.encoding,
+                                offsets[start], offsets[end], start,
+                                include_matcher, exclude_matcher)
+                for start, end in chunks
+            ]
+            
+            def wait_results() -> Iterator[array]:
+                for future in futures:
+                    # Time spent waiting on workers, their own stages are not traced
+                    with tracer.span("match.wait"):
+                        try:
+                            chunk_ids = future.result(
+                                None if deadline is None else max(0.0, deadline - time.monotonic()))
+                        except FutureTimeoutError:
+                            # A worker may be stuck in one expression, later runs get fresh processes
+                            cls.terminate_executor()
+                            raise cls.timeout_error() from None
+                    yield chunk_ids
+            results = wait_results()
+        else:
+            chunks = cls._split_windows(log_file, windows, cls.SEQUENTIAL_CHUNK_SIZE,
+                                        cls.FIRST_CHUNK_SIZE)
+            
+            def match_chunks() -> Iterator[array]:
+                for start, end in chunks:
+                    # Includes reading, which is traced as a nested stage
+                    with tracer.span("match", lines=end - start):
+                        with tracer.span("read"):
+                            data = log_file.read_bytes(offsets[start], offsets[end])
+                        chunk_ids = cls.filter_bytes(data, log_file.encoding, start,
+                                                     include_matcher, exclude_matcher)
+                    yield chunk_ids
+            results = match_chunks()
+        
+        # Merge the per-chunk results in file order
+        total_bytes = sum(offsets[end] - offsets[start] for start, end in chunks)
+        done_bytes = 0
+        line_ids = array('Q')
+        for (start, end), chunk_ids in zip(chunks, results):
+            if cancel_event is not None and cancel_event.is_set():
+                if parallel:
+                    for future in futures:
+                        future.cancel()
+                raise FilterCancelled()
+            cls.check_deadline(deadline)
+            with tracer.span("join", matches=len(chunk_ids)):
+                line_ids.extend(chunk_ids)
+                if batch is not None and chunk_ids:
+                    batch(chunk_ids)
+            done_bytes += offsets[end] - offsets[start]
+            tracer.count("filter.bytes", offsets[end] - offsets[start])
+            tracer.count("filter.lines", end - start)
+            if progress is not None:
+                progress(done_bytes, total_bytes)
+        return line_ids
+    
+    @classmethod
+    def check_deadline(cls, deadline: Optional[float]) -> None:
+        """Stop a run with FilterTimeout once its deadline passed
+        
+        Args:
+            deadline: time.monotonic() value, None for no deadline
+        """
+        if deadline is not None and time.monotonic() >= deadline:
+            raise cls.timeout_error()
+    
+    @classmethod
+    def timeout_error(cls) -> FilterTimeout:
+        return FilterTimeout(f"the regular expressions took longer than {cls.REGEX_TIME_BUDGET:g} seconds, "
+                             f"try a more specific expression")
+    
+    @classmethod
+    def _split_windows(cls, log_file: LogFile, windows: List[Tuple[int, int]],
+                       chunk_size: int, first_chunk_size: int = 0) -> List[Tuple[int, int]]:
+        """Split line ranges into chunks of roughly chunk_size bytes
+        
+        With first_chunk_size, the chunks start at that size and double up to
+        chunk_size, so the first results of a run arrive early.
+        """
+        offsets = log_file.offsets
+        size = min(first_chunk_size, chunk_size) if first_chunk_size else chunk_size
+        chunks = []
+        for start, end_line in windows:
+            while start < end_line:
+                end = bisect_left(offsets, offsets[start] + size, start + 1, end_line)
+                chunks.append((start, end))
+                start = end
+                size = min(size * 2, chunk_size)
+        return chunks
+    
+    @classmethod
+    def filter_line_ids_subset(cls, log_file: LogFile, line_ids: Iterable[int],
+                               include_matcher: Optional[Matcher],
+                               exclude_matcher: Optional[Matcher],
+                               start_ms: Optional[int] = None,
+                               end_ms: Optional[int] = None,
+                               cancel_event: Optional[threading.Event] = None,
+                               deadline: Optional[float] = None) -> array:
+        """Filter only the given lines of a log file, such as the result of a broader query
+        
+        Args:
+            log_file: Indexed log file
+            line_ids: Ascending ids of the lines to check
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            start_ms: Start of the range in milliseconds, None for no lower bound
+            end_ms: End of the range in milliseconds, None for no upper bound
+            cancel_event: Event that stops the run with FilterCancelled once set
+            deadline: time.monotonic() value after which the run stops with FilterTimeout
+            
+        Returns:
+            Compact array with the ids of the matching lines
+            
+        Raises:
+            FilterCancelled: If cancel_event was set before the run finished
+            FilterTimeout: If the deadline passed before the run finished
+        """
+        if start_ms is not None or end_ms is not None:
+            timestamps = log_file.ensure_timestamps()
+            low = -1 if start_ms is None else start_ms
+            high = end_ms
+            # Lines before the first timestamp are always kept, like in time_windows
+            line_ids = [line_id for line_id in line_ids
+                        if timestamps[line_id] < 0
+                        or (low <= timestamps[line_id] and (high is None or timestamps[line_id] <= high))]
+        
+        if include_matcher is None and exclude_matcher is None:
+            return array('Q', line_ids)
+        
+        matches = array('Q')
+        for batch_start in range(0, len(line_ids), cls.SUBSET_BATCH_SIZE):
+            if cancel_event is not None and cancel_event.is_set():
+                raise FilterCancelled()
+            cls.check_deadline(deadline)
+            batch = line_ids[batch_start:batch_start + cls.SUBSET_BATCH_SIZE]
+            with tracer.span("match.subset", lines=len(batch)):
+                # The lines are matched as one block, only the last line of the file can lack a line break
+                data = log_file.read_lines(batch)
+                matches.extend(map(batch.__getitem__, cls.filter_bytes(
+                    data, log_file.encoding, 0, include_matcher, exclude_matcher)))
+        return matches
+    
+    @classmethod
+    def filter_line_range(cls, log_file: LogFile, first_line: int, end_line: int,
+                          include_matcher: Optional[Matcher],
+                          exclude_matcher: Optional[Matcher],
+                          start_ms: Optional[int] = None,
+                          end_ms: Optional[int] = None,
+                          levels: Optional[FrozenSet[int]] = None) -> Optional[array]:
+        """Filter a contiguous range of lines, such as lines appended while tailing
+        
+        The keywords are matched on the raw data of the range, and the time
+        range is checked for the matching lines against the timestamp index
+        instead of being searched in the whole file, so the cost only depends
+        on the size of the range.
+        
+        Args:
+            log_file: Indexed log file
+            first_line: First line to check
+            end_line: Line after the last line to check
+            include_matcher: Matcher for include keywords, None to include all lines
+            exclude_matcher: Matcher for exclude keywords, None to exclude nothing
+            start_ms: Start of the range in milliseconds, None for no lower bound
+            end_ms: End of the range in milliseconds, None for no upper bound
+            levels: Codes of the levels to keep, None for every level
+            
+        Returns:
+            Compact array with the ids of the matching lines, None if the file
+            was truncated below the lines, see LogFile.read_bytes
+        """
+        offsets = log_file.offsets
+        byte_start, byte_end = offsets[first_line], offsets[end_line]
+        if log_file.file_size() < byte_end:
+            return None
+        with tracer.span("match.range", lines=end_line - first_line):
+            data = log_file.read_bytes(byte_start, byte_end)
+            # Truncated while the lines were read
+            if len(data) < byte_end - byte_start:
+                return None
+            line_ids = cls.filter_bytes(data, log_file.encoding, first_line, include_matcher, exclude_matcher)
+        if start_ms is not None or end_ms is not None:
+            timestamps = log_file.ensure_timestamps()
+            low = -1 if start_ms is None else start_ms
+            high = sys.maxsize if end_ms is None else end_ms
+            # Lines before the first timestamp are always kept, like in time_windows
+            line_ids = array('Q', (line_id for line_id in line_ids
+                                   if timestamps[line_id] < 0 or low <= timestamps[line_id] <= high))
+        if levels is not None:
+            line_ids = select_levels(log_file.ensure_levels(), line_ids, levels)
+        return line_ids
+    
+    @classmethod
+    def filter_cached(cls, log_file: LogFile, query: FilterQuery, cache: FilterCache,
+                      workers: int = 0, chunk_size: int = 0,
+                      end_line: Optional[int] = None,
+                      progress: Optional[ProgressCallback] = None,
+                      cancel_event: Optional[threading.Event] = None,
+                      batch: Optional[BatchCallback] = None) -> array:
+        """Filter a log file, reusing cached results where possible
+        
+        A cached result of the same query only needs the lines appended
+        since. A narrower query is computed from the smallest cached result
+        of a broader one, so refining a filter step by step costs time
+        proportional to the previous result instead of the file size.
+        Queries with regular expressions are stopped once they ran for
+        REGEX_TIME_BUDGET seconds, so a pathological expression cannot keep
+        the workers busy for good. A level selection is applied to the
+        result of the keywords and time range, see filter_levels.
+        
+        Args:
+            log_file: Indexed log file
+            query: Normalized filter conditions
+            cache: Cache of results for this log file
+            workers: Number of worker processes, 0 for one per CPU core
+            chunk_size: Bytes per worker task, 0 for PARALLEL_CHUNK_SIZE
+            end_line: Line after the last line to filter, defaults to the end of the file
+            progress: Callback receiving the filtered and total number of bytes of the file scan
+            cancel_event: Event that stops the run with FilterCancelled once set
+            batch: Callback receiving the matching line ids in file order, as soon as they are known
+            
+        Returns:
+            Compact array with the index of every matching line, owned by the caller
+            
+        Raises:
+            FilterCancelled: If cancel_event was set before the run finished
+            FilterTimeout: If a query with regular expressions ran out of its time budget
+            re.error: If a regular expression of the query is invalid
+        """
+        if end_line is None:
+            end_line = len(log_file)
+        if query.levels is not None:
+            return cls.filter_levels(log_file, query, cache, workers, chunk_size, end_line,
+                                     progress, cancel_event, batch)
+        include_matcher = query.include_matcher()
+        exclude_matcher = query.exclude_matcher()
+        deadline = time.monotonic() + cls.REGEX_TIME_BUDGET if query.has_regex() else None
+        
+        exact_entry = cache.get(query)
+        if exact_entry is not None:
+            line_ids, covered_lines = exact_entry
+            line_ids = array('Q', line_ids)
+        else:
+            entry = cache.find_broader(query)
+            if entry is not None:
+                broader_ids, covered_lines = entry
+                line_ids = cls.filter_line_ids_subset(log_file, broader_ids, include_matcher, exclude_matcher,
+                                                      query.start_ms, query.end_ms, cancel_event, deadline)
+            else:
+                line_ids, covered_lines = array('Q'), 0
+        
+        if covered_lines > end_line:
+            # Cached while the file was longer than the range asked for
+            del line_ids[bisect_left(line_ids, end_line):]
+        if batch is not None and line_ids:
+            batch(array('Q', line_ids))
+        if covered_lines < end_line:
+            # Filter the lines the cached result does not cover yet
+            line_ids.extend(cls.filter_line_ids_parallel(
+                log_file, include_matcher, exclude_matcher,
+                cls.format_time(query.start_ms), cls.format_time(query.end_ms),
+                workers=workers, chunk_size=chunk_size, first_line=covered_lines, end_line=end_line,
+                progress=progress, cancel_event=cancel_event, batch=batch, deadline=deadline))
+        
+        # The last line can still grow while it has no line break, so leave it out of the cache
+        covered_lines = min(end_line, log_file.complete_line_count)
+        if exact_entry is None or covered_lines > exact_entry[1]:
+            cache.put(query, line_ids[:bisect_left(line_ids, covered_lines)], covered_lines)
+        return line_ids
+    
+    @classmethod
+    def filter_levels(cls, log_file: LogFile, query: FilterQuery, cache: FilterCache,
+                      workers: int, chunk_size: int, end_line: int,
+                      progress: Optional[ProgressCallback],
+                      cancel_event: Optional[threading.Event],
+                      batch: Optional[BatchCallback]) -> array:
+        """Filter a log file on a query with a level selection, see filter_cached
+        
+        The level of every line is looked up in the level index built with
+        the timestamps, so no text is read for it. Only the result of the
+        keywords and time range is cached, switching levels on top of it
+        costs one masked pass over the ids of that result, or over the level
+        index when there are no other conditions.
+        """
+        levels = log_file.ensure_levels()
+        if query.without_levels().matches_all():
+            with tracer.span("match.levels", lines=end_line):
+                line_ids = lines_with_levels(levels, 0, end_line, query.levels)
+            if batch is not None and line_ids:
+                batch(array('Q', line_ids))
+            return line_ids
+        
+        def level_batch(batch_ids: array) -> None:
+            batch_ids = select_levels(levels, batch_ids, query.levels)
+            if batch_ids:
+                batch(batch_ids)
+        
+        line_ids = cls.filter_cached(log_file, query.without_levels(), cache, workers, chunk_size, end_line,
+                                     progress, cancel_event, None if batch is None else level_batch)
+        with tracer.span("match.levels", lines=len(line_ids)):
+            return select_levels(levels, line_ids, query.levels)
+
+
+def _filter_chunk(path: str, encoding: str, byte_start: int, byte_end: int, first_line: int,
+                  include_matcher: Optional[Matcher], exclude_matcher: Optional[Matcher]) -> array:
+    """Filter one chunk of a log file in a worker process
+    
+    The chunk lies within the time range of the query, so only keywords are checked.
+    
+    Returns:
+        Line ids of the matching lines, relative to the whole file
+    """
+    with open(path, 'rb') as file:
+        file.seek(byte_start)
+        data = file.read(byte_end - byte_start)
+    return LogFilter.filter_bytes(data, encoding, first_line, include_matcher, exclude_matcher)
+
+
+@lru_cache(maxsize=64)
+def _cached_matcher(terms: Tuple[str, ...], case_sensitive: bool, regex: bool) -> Matcher:
+    """Compile a matcher, cached by its terms and options, see LogFilter.compile_matcher"""
+    if regex:
+        return RegexMatcher(list(terms), case_sensitive)
+    return KeywordMatcher(list(terms), case_sensitive)
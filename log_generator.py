@@ -0,0 +1,245 @@
+# Synthetic log generator for Log Insight benchmarks
+# Produces reproducible logs of any size from a seed, without Qt
+
+import argparse
+import bz2
+import gzip
+import lzma
+import random
+import re
+import sys
+from typing import BinaryIO, List
+
+from log_file import DAY_MS
+
+# Levels and their share of the entries
+LEVELS = ['TRACE', 'DEBUG', 'INFO', 'WARN', 'ERROR']
+LEVEL_WEIGHTS = [5, 25, 55, 10, 5]
+
+THREADS = [f"worker-{index}" for index in range(16)] + ['main', 'scheduler-1', 'http-nio-8080-exec-3', 'kafka-consumer-2']
+LOGGERS = ['com.example.api.OrderController', 'com.example.service.PaymentService',
+           'com.example.cache.RedisCache', 'com.example.db.ConnectionPool',
+           'com.example.auth.SessionManager', 'org.apache.kafka.clients.Consumer',
+           'com.example.scheduler.JobRunner', 'com.example.http.Client']
+SERVICES = ['inventory', 'billing', 'search', 'recommendation', 'shipping']
+EXCEPTIONS = ['java.lang.IllegalStateException', 'java.net.SocketTimeoutException',
+              'java.lang.NullPointerException', 'java.sql.SQLTransientConnectionException',
+              'com.example.service.PaymentDeclinedException']
+FRAME_CLASSES = ['OrderController', 'PaymentService', 'RedisCache', 'ConnectionPool', 'HttpClient',
+                 'JobRunner', 'SessionManager', 'RetryTemplate', 'DispatcherServlet', 'ThreadPoolExecutor']
+FRAME_METHODS = ['handle', 'process', 'execute', 'invoke', 'call', 'run', 'doFilter', 'lookup', 'acquire']
+
+# Entry that benchmarks search for as a rare token, about once per RARE_INTERVAL entries
+RARE_MESSAGE = "OutOfMemoryError in heap region {}"
+RARE_INTERVAL = 200000
+
+# Size suffixes accepted by parse_size
+SIZE_UNITS = {'': 1, 'B': 1, 'K': 1 << 10, 'KB': 1 << 10, 'M': 1 << 20, 'MB': 1 << 20,
+              'G': 1 << 30, 'GB': 1 << 30, 'T': 1 << 40, 'TB': 1 << 40}
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([A-Za-z]*)\s*$')
+
+
+def parse_size(size_str: str) -> int:
+    """Convert a size such as 512MB or 20GB to bytes
+
+    Raises:
+        ValueError: If the size or its unit is not recognized
+    """
+    match = SIZE_PATTERN.match(size_str)
+    if not match or match.group(2).upper() not in SIZE_UNITS:
+        raise ValueError(f"invalid size: {size_str}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def format_timestamp(time_ms: int) -> str:
+    """Format milliseconds since midnight as HH:MM:SS.mmm"""
+    seconds, millis = divmod(time_ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+class LogGenerator:
+    """Generates realistic log lines, the same ones for the same seed
+
+    Entries start with a HH:MM:SS.mmm timestamp followed by a level, a
+    thread and a logger, like typical Java or Python application logs. Some
+    ERROR and WARN entries carry a stack trace, whose lines have no
+    timestamp of their own, and a small share of entries carry a long
+    payload. Timestamps advance by a random step around the mean interval
+    implied by lines_per_second and wrap around at midnight.
+    """
+
+    # Entries generated per block
+    BLOCK_ENTRIES: int = 4096
+
+    def __init__(self, seed: int = 0, lines_per_second: float = 1000.0,
+                 stack_trace_ratio: float = 0.3, long_line_ratio: float = 0.002,
+                 long_line_size: int = 16 * 1024, start_ms: int = 0) -> None:
+        """Set up the generator
+
+        Args:
+            seed: Seed of the random generator
+            lines_per_second: Average number of entries per second of log time
+            stack_trace_ratio: Share of ERROR and WARN entries followed by a stack trace
+            long_line_ratio: Share of entries carrying a long payload
+            long_line_size: Average length of long payloads in characters
+            start_ms: Timestamp of the first entry in milliseconds since midnight
+        """
+        self.random = random.Random(seed)
+        self.mean_step: float = 1000.0 / lines_per_second
+        self.stack_trace_ratio: float = stack_trace_ratio
+        self.long_line_ratio: float = long_line_ratio
+        self.long_line_size: int = long_line_size
+        self.time_ms: int = start_ms
+        self.entry_count: int = 0
+
+    def stack_trace(self) -> List[str]:
+        """Generate the lines of a stack trace, including the exception line"""
+        rng = self.random
+        lines = [f"{rng.choice(EXCEPTIONS)}: operation failed for id {rng.getrandbits(32):08x}\n"]
+        for _ in range(rng.randint(4, 24)):
+            name = rng.choice(FRAME_CLASSES)
+            lines.append(f"\tat com.example.{name.lower()}.{name}.{rng.choice(FRAME_METHODS)}"
+                         f"({name}.java:{rng.randint(20, 900)})\n")
+        if rng.random() < 0.3:
+            lines.append(f"Caused by: {rng.choice(EXCEPTIONS)}: connection reset\n")
+            lines.append(f"\tat java.base/java.net.SocketInputStream.read(SocketInputStream.java:{rng.randint(100, 200)})\n")
+        return lines
+
+    def message(self, level: str) -> str:
+        """Generate the message of an entry"""
+        rng = self.random
+        if level in ('ERROR', 'WARN'):
+            kind = rng.randrange(3)
+            if kind == 0:
+                return f"Timeout waiting for {rng.choice(SERVICES)} after {rng.randint(100, 30000)} ms"
+            if kind == 1:
+                return f"Retrying operation {rng.choice(SERVICES)}.sync attempt {rng.randint(1, 5)}"
+            return f"Request {rng.getrandbits(64):016x} failed with status={rng.choice((500, 502, 503))}"
+        kind = rng.randrange(6)
+        if kind == 0:
+            return f"Request {rng.getrandbits(64):016x} completed in {rng.randint(1, 2000)} ms status={rng.choice((200, 201, 204, 404))}"
+        if kind == 1:
+            return f"User user{rng.randint(1, 50000)} logged in from 10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+        if kind == 2:
+            return f"Cache miss for key order:{rng.randint(1, 10 ** 7)}"
+        if kind == 3:
+            return f"Connection pool stats active={rng.randint(0, 50)} idle={rng.randint(0, 50)} waiting={rng.randint(0, 5)}"
+        if kind == 4:
+            return f"Processed batch of {rng.randint(1, 1000)} events from partition {rng.randint(0, 31)}"
+        return f"Scheduled job {rng.choice(SERVICES)}-cleanup finished, {rng.randint(0, 10000)} rows removed"
+
+    def payload(self) -> str:
+        """Generate a long payload of key value pairs"""
+        rng = self.random
+        target = int(self.long_line_size * (0.25 + rng.random() * 1.5))
+        fields = []
+        length = 0
+        while length < target:
+            field = f'"field{len(fields)}":"{rng.getrandbits(128):032x}"'
+            fields.append(field)
+            length += len(field) + 1
+        return " payload={" + ",".join(fields) + "}"
+
+    def block(self, entry_count: int = 0) -> str:
+        """Generate the next entries
+
+        Args:
+            entry_count: Number of entries, 0 for BLOCK_ENTRIES
+
+        Returns:
+            Text of the entries including their stack traces, ending with a line break
+        """
+        rng = self.random
+        entry_count = entry_count or self.BLOCK_ENTRIES
+        levels = rng.choices(LEVELS, LEVEL_WEIGHTS, k=entry_count)
+        threads = rng.choices(THREADS, k=entry_count)
+        loggers = rng.choices(LOGGERS, k=entry_count)
+        lines = []
+        for level, thread, logger in zip(levels, threads, loggers):
+            # Timestamps wrap around at midnight like daily logs do
+            self.time_ms = (self.time_ms + int(rng.expovariate(1.0 / self.mean_step))) % DAY_MS
+            self.entry_count += 1
+            if self.entry_count % RARE_INTERVAL == 0:
+                level, text = 'ERROR', RARE_MESSAGE.format(rng.randint(1, 64))
+            else:
+                text = self.message(level)
+            if rng.random() < self.long_line_ratio:
+                text += self.payload()
+            lines.append(f"{format_timestamp(self.time_ms)} {level:<5} [{thread}] {logger} - {text}\n")
+            if level in ('ERROR', 'WARN') and rng.random() < self.stack_trace_ratio:
+                lines.extend(self.stack_trace())
+        return ''.join(lines)
+
+    def write(self, output: BinaryIO, size: int) -> int:
+        """Write whole entries until at least size bytes were written
+
+        Returns:
+            Number of bytes written
+        """
+        written = 0
+        while written < size:
+            data = self.block().encode('utf-8')
+            output.write(data)
+            written += len(data)
+        return written
+
+
+def open_output(path: str) -> BinaryIO:
+    """Open a file for writing, compressing it if its extension asks for it"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wb', compresslevel=6)
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'wb')
+    if path.endswith('.xz'):
+        return lzma.open(path, 'wb')
+    return open(path, 'wb')
+
+
+def generate_log(path: str, size: int, seed: int = 0, **options) -> int:
+    """Write a synthetic log of at least size uncompressed bytes
+
+    Args:
+        path: Output path, .gz, .bz2 and .xz paths are compressed
+        size: Number of uncompressed bytes to write at least
+        seed: Seed of the random generator
+        options: Further arguments of LogGenerator
+
+    Returns:
+        Number of uncompressed bytes written
+    """
+    with open_output(path) as output:
+        return LogGenerator(seed, **options).write(output, size)
+
+
+def main(argv: List[str] = None) -> int:
+    """Generate a synthetic log from the command line"""
+    parser = argparse.ArgumentParser(description="Generate a reproducible synthetic log file for benchmarks.")
+    parser.add_argument("path", help="output file, .gz, .bz2 and .xz files are compressed, - for standard output")
+    parser.add_argument("--size", default="100MB", help="uncompressed size such as 500MB or 20GB (default: 100MB)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random generator (default: 0)")
+    parser.add_argument("--rate", type=float, default=1000.0, help="average entries per second of log time (default: 1000)")
+    parser.add_argument("--stack-traces", type=float, default=0.3,
+                        help="share of ERROR and WARN entries with a stack trace (default: 0.3)")
+    parser.add_argument("--long-lines", type=float, default=0.002,
+                        help="share of entries with a long payload (default: 0.002)")
+    parser.add_argument("--long-line-size", default="16KB", help="average length of long payloads (default: 16KB)")
+    args = parser.parse_args(argv)
+    try:
+        size = parse_size(args.size)
+        long_line_size = parse_size(args.long_line_size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    options = dict(lines_per_second=args.rate, stack_trace_ratio=args.stack_traces,
+                   long_line_ratio=args.long_lines, long_line_size=long_line_size)
+    if args.path == '-':
+        LogGenerator(args.seed, **options).write(sys.stdout.buffer, size)
+    else:
+        generate_log(args.path, size, args.seed, **options)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
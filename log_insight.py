@@ -1,169 +1,241 @@
 import sys
-import re
 import os
+import re
 import json
 import time
+import threading
+import multiprocessing
 from datetime import datetime
-from typing import List, Pattern, Optional, Tuple, override
+from array import array
+from bisect import bisect_right
+from typing import Dict, List, Optional, Tuple, override
+
+if __name__ == "__main__" and "--cli" in sys.argv:
+    # Headless filtering, dispatched before Qt is imported so it starts fast without a display
+    from log_cli import main
+    sys.exit(main())
 
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QLineEdit, QTextEdit, QFrame, QGroupBox,
                              QPushButton, QFileDialog, QMessageBox, QMenu,
-                             QGridLayout, QDialog, QToolButton)
-from PyQt6.QtGui import (QFont, QWheelEvent, QIcon,
-                         QDragEnterEvent, QDropEvent, QTextCursor, QTextCharFormat, QKeySequence,
+                             QGridLayout, QDialog, QToolButton, QProgressBar)
+from PyQt6.QtGui import (QColor, QFont, QWheelEvent, QIcon,
+                         QDragEnterEvent, QDropEvent, QKeySequence,
                          QShortcut)
-from PyQt6.QtCore import Qt, QTimer, QSize, QFileSystemWatcher, QThread, pyqtSignal
+from PyQt6.QtCore import Qt, QTimer, QSize, QFileSystemWatcher, QObject, QThread, pyqtSignal
 
-class LogFilter:
-    """Utility class for filtering log content"""
+from compressed_log import COMPRESSED_EXTENSIONS
+from diagnostics_panel import DiagnosticsPanel
+from level_bar import LevelBar
+from log_file import LogFile
+from log_filter import FilterCache, FilterCancelled, FilterQuery, LogFilter, parse_keywords
+from log_tail import LogTailer, RotatedLogLines
+from log_view import LogResultModel, LogView
+from merged_log import MergedLogFiles
+from perf_trace import tracer
+from text_search import SearchMatches, TextSearch
+from timeline import Timeline
+from timeline_view import TimelineView
+from trigram_index import TrigramIndex
+
+class TailSignals(QObject):
+    """Carries the callbacks of a LogTailer from its threads to the UI thread"""
+    resultsAvailable = pyqtSignal(int, object, int)
+    fileTruncated = pyqtSignal()
+    fileRotated = pyqtSignal()
+    errorOccurred = pyqtSignal(str)
+
+class SearchWorker(QThread):
+    """Worker thread running a filter query over the whole log file"""
+    progressChanged = pyqtSignal(int)
+    resultsAvailable = pyqtSignal(object)
+    searchComplete = pyqtSignal(object, int)
+    searchFailed = pyqtSignal(str)
     
-    @staticmethod
-    def compile_patterns(terms: List[str], case_sensitive: bool) -> List[Pattern]:
-        """Compile regex patterns from terms
-        
-        Args:
-            terms: List of search terms
-            case_sensitive: Whether to use case sensitive matching
-            
-        Returns:
-            List of compiled regex patterns
-        """
-        patterns = []
-        for term in terms:
-            # Consider it as normal string, rather than regular expression
-            escaped_term = re.escape(term)
-            if case_sensitive:
-                patterns.append(re.compile(escaped_term))
-            else:
-                patterns.append(re.compile(escaped_term, re.IGNORECASE))
-        return patterns
+    # Minimum seconds between two result batches, keeps the view from repainting for every chunk
+    BATCH_INTERVAL: float = 0.05
     
-    @staticmethod
-    def filter_logs(log_lines: List[str], 
-                   include_patterns: List[Pattern],
-                   exclude_patterns: List[Pattern],
-                   start_time: str = "",
-                   end_time: str = "") -> Tuple[str, int]:
-        """Filter log lines based on patterns and time range
-        
-        Args:
-            log_lines: List of log lines to filter
-            include_patterns: List of regex patterns to include
-            exclude_patterns: List of regex patterns to exclude
-            start_time: Start time string in format HH:MM:SS.mmm
-            end_time: End time string in format HH:MM:SS.mmm
-            
-        Returns:
-            Tuple of (filtered_content, match_count)
-        """
-        time_format = "%H:%M:%S.%f"
-        use_time_filter = False
-        start_datetime = None
-        end_datetime = None
-        
-        # Process time filters
-        if start_time:
-            try:
-                start_datetime = datetime.strptime(start_time, time_format)
-                use_time_filter = True
-            except ValueError:
-                pass
-                
-        if end_time:
-            try:
-                end_datetime = datetime.strptime(end_time, time_format)
-                use_time_filter = True
-            except ValueError:
-                pass
-        
-        # Time regex pattern (matches HH:MM:SS.XXX at line start)
-        time_pattern = re.compile(r'^(\d{2}:\d{2}:\d{2}\.\d{3})')
-        
-        match_count = 0
-        result_lines = []
-        
-        for line in log_lines:
-            # Check for any exclude keywords (high priority)
-            if exclude_patterns and any(pattern.search(line) for pattern in exclude_patterns):
-                continue
-            
-            # Check for at least one include keyword
-            if include_patterns and not any(pattern.search(line) for pattern in include_patterns):
-                continue
-            
-            # Time filtering
-            if use_time_filter:
-                time_match = time_pattern.search(line)
-                if time_match:
-                    line_time_str = time_match.group(1)
-                    try:
-                        line_time = datetime.strptime(line_time_str, time_format)
-                        
-                        # Check time range
-                        if start_datetime and line_time < start_datetime:
-                            continue
-                        if end_datetime and line_time > end_datetime:
-                            continue
-                    except ValueError:
-                        # Skip time filtering if time parsing fails
-                        pass
-            
-            # Add matching line to results list
-            result_lines.append(line)
-            match_count += 1
-        
-        # Join the collected lines into a single string for better performance
-        result_text = "".join(result_lines)
-        return result_text, match_count
+    def __init__(self, log_file, query, cache, workers=0, chunk_size=0, parent=None):
+        super().__init__(parent)
+        self.log_file = log_file
+        self.query = query
+        self.cache = cache
+        self.workers = workers
+        self.chunk_size = chunk_size
+        # Lines covered by the search, set once the index caught up with the file
+        self.end_line = len(log_file)
+        self.cancel_event = threading.Event()
+        self.last_percent = -1
+        # Matches not handed to the view yet
+        self.pending_ids = array('Q')
+        self.last_batch_time = 0.0
+    
+    def cancel(self):
+        """Ask the search to stop at the next chunk boundary"""
+        self.cancel_event.set()
+    
+    def report_progress(self, done_bytes, total_bytes):
+        """Emit the progress in percent, only when it changed to keep the event queue short"""
+        percent = done_bytes * 100 // total_bytes if total_bytes else 100
+        if percent != self.last_percent:
+            self.last_percent = percent
+            self.progressChanged.emit(percent)
+    
+    def report_batch(self, line_ids):
+        """Collect matches and hand them to the view at most every BATCH_INTERVAL seconds"""
+        self.pending_ids.extend(line_ids)
+        # The first matches are shown right away
+        now = time.monotonic()
+        if now - self.last_batch_time >= self.BATCH_INTERVAL:
+            self.flush_batch()
+            self.last_batch_time = now
+    
+    def flush_batch(self):
+        if self.pending_ids:
+            self.resultsAvailable.emit(self.pending_ids)
+            self.pending_ids = array('Q')
+    
+    @override
+    def run(self):
+        """Run the search in background thread"""
+        try:
+            # Index data appended since the file was opened, so the whole current file is searched.
+            # Later lines are left to tailing.
+            if not self.log_file.grow():
+                self.searchFailed.emit("The log file was truncated, filter again to reload it")
+                return
+            self.end_line = len(self.log_file)
+            with tracer.span("filter", lines=self.end_line, workers=self.workers):
+                if isinstance(self.log_file, MergedLogFiles):
+                    # Every source is filtered and the matches are merged into one timeline
+                    line_ids = self.log_file.filter(
+                        self.query,
+                        workers=self.workers,
+                        chunk_size=self.chunk_size,
+                        progress=self.report_progress,
+                        cancel_event=self.cancel_event,
+                        batch=self.report_batch
+                    )
+                else:
+                    line_ids = LogFilter.filter_cached(
+                        self.log_file,
+                        self.query,
+                        self.cache,
+                        workers=self.workers,
+                        chunk_size=self.chunk_size,
+                        end_line=self.end_line,
+                        progress=self.report_progress,
+                        cancel_event=self.cancel_event,
+                        batch=self.report_batch
+                    )
+            tracer.count("filter.matches", len(line_ids))
+        except FilterCancelled:
+            return
+        except Exception as e:
+            if not self.cancel_event.is_set():
+                self.searchFailed.emit(str(e))
+            return
+        if not self.cancel_event.is_set():
+            self.flush_batch()
+            self.searchComplete.emit(line_ids, self.end_line)
 
-class FilterWorker(QThread):
-    """Worker thread for filtering log content"""
-    filteringComplete = pyqtSignal(str, int)
+class IndexWorker(QThread):
+    """Worker thread building the trigram index of a log file, or extending it as the file grows"""
+    indexReady = pyqtSignal(object, object)
+    indexFailed = pyqtSignal(str)
     
-    def __init__(self, parent=None):
+    def __init__(self, log_file, executor=None, index=None, parent=None):
         super().__init__(parent)
-        self.log_lines = []
-        self.include_terms = []
-        self.exclude_terms = []
-        self.include_case_sensitive = False
-        self.exclude_case_sensitive = False
-        self.start_time = ""
-        self.end_time = ""
-        self.include_patterns = []
-        self.exclude_patterns = []
-        
-    def setup(self, log_lines, include_terms, exclude_terms, 
-              include_case_sensitive, exclude_case_sensitive,
-              start_time, end_time):
-        """Set up the worker with filtering parameters"""
-        self.log_lines = log_lines
-        self.include_terms = include_terms
-        self.exclude_terms = exclude_terms
-        self.include_case_sensitive = include_case_sensitive
-        self.exclude_case_sensitive = exclude_case_sensitive
-        self.start_time = start_time
-        self.end_time = end_time
-        
-        # Pre-compile patterns for better performance
-        self.include_patterns = LogFilter.compile_patterns(
-            self.include_terms, self.include_case_sensitive)
-        self.exclude_patterns = LogFilter.compile_patterns(
-            self.exclude_terms, self.exclude_case_sensitive)
+        self.log_file = log_file
+        self.executor = executor
+        self.index = index if index is not None else TrigramIndex(log_file.encoding)
+    
+    def cancel(self):
+        """Ask the build to stop after its current task"""
+        self.index.cancel()
     
     @override
     def run(self):
-        """Run the filtering process in background thread"""
-        # Use the shared filtering logic
-        result_text, match_count = LogFilter.filter_logs(
-            self.log_lines,
-            self.include_patterns,
-            self.exclude_patterns,
-            self.start_time,
-            self.end_time
-        )
-        
-        self.filteringComplete.emit(result_text, match_count)
+        """Build the index in background thread, the heavy lifting happens in the process pool"""
+        try:
+            with tracer.span("index.trigram", lines=len(self.log_file) - self.index.line_count):
+                self.index.extend(self.log_file, self.executor)
+        except Exception as e:
+            self.indexFailed.emit(f"Error building the keyword index: {str(e)}")
+            return
+        if not self.index.cancelled:
+            self.indexReady.emit(self.log_file, self.index)
+
+class TimelineWorker(QThread):
+    """Worker thread counting the lines of a log file per time bucket for the timeline strip"""
+    timelineReady = pyqtSignal(object)
+    timelineFailed = pyqtSignal(str)
+    
+    def __init__(self, log_file, parent=None):
+        super().__init__(parent)
+        self.log_file = log_file
+        self.cancel_event = threading.Event()
+    
+    def cancel(self):
+        """Drop the result once the count is done, parsed timestamps stay with the file"""
+        self.cancel_event.set()
+    
+    @override
+    def run(self):
+        """Parse the timestamps if needed and count the lines in background thread"""
+        try:
+            timeline = Timeline(self.log_file)
+            timeline.ensure_timestamps()
+            timeline.update_lines()
+        except Exception as e:
+            if not self.cancel_event.is_set():
+                self.timelineFailed.emit(f"Error building the timeline: {str(e)}")
+            return
+        if not self.cancel_event.is_set():
+            self.timelineReady.emit(timeline)
+
+class TextSearchWorker(QThread):
+    """Worker thread finding every occurrence of a text in the result rows"""
+    progressChanged = pyqtSignal(int)
+    searchComplete = pyqtSignal(object)
+    searchFailed = pyqtSignal(str)
+    
+    def __init__(self, source, line_ids, text, dropped_rows=0, parent=None):
+        super().__init__(parent)
+        self.source = source
+        # Snapshot of the rows, rows appended later are not searched
+        self.line_ids = line_ids
+        self.text = text
+        # Rows the result view had dropped from its front when the snapshot was taken
+        self.dropped_rows = dropped_rows
+        self.cancel_event = threading.Event()
+        self.last_percent = -1
+    
+    def cancel(self):
+        """Ask the search to stop at the next batch"""
+        self.cancel_event.set()
+    
+    def report_progress(self, done_rows, total_rows):
+        percent = done_rows * 100 // total_rows if total_rows else 100
+        if percent != self.last_percent:
+            self.last_percent = percent
+            self.progressChanged.emit(percent)
+    
+    @override
+    def run(self):
+        """Run the search in background thread"""
+        try:
+            matches = TextSearch.find_all(self.source, self.line_ids, self.text,
+                                          progress=self.report_progress,
+                                          cancel_event=self.cancel_event)
+        except FilterCancelled:
+            return
+        except Exception as e:
+            if not self.cancel_event.is_set():
+                self.searchFailed.emit(f"Error searching results: {str(e)}")
+            return
+        if not self.cancel_event.is_set():
+            self.searchComplete.emit(matches)
 
 class LogInsight(QMainWindow):
     CONFIG_FILE: str = os.path.join(os.path.expanduser('~'), "logInsight.json")
@@ -176,6 +248,9 @@ class LogInsight(QMainWindow):
     except:
         VERSION = "unknown"
     
+    # Milliseconds between two updates of the result view in tail mode, about 30 frames per second
+    TAIL_FLUSH_INTERVAL: int = 33
+    
     # Base path for icons
     ICONS_DIR: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "icons")
     
@@ -206,9 +281,6 @@ class LogInsight(QMainWindow):
         """
         return os.path.join(cls.ICONS_DIR, cls.ICON_NAMES.get(icon_name, icon_name))
 
-    # Track the last file position for tail mode
-    last_file_position: int = 0
-    
     def __init__(self) -> None:
         super().__init__()
         
@@ -218,10 +290,34 @@ class LogInsight(QMainWindow):
         app_icon = QIcon(self.get_icon_path('APP_LOGO'))
         self.setWindowIcon(app_icon)
         
-        self.log_content: List[str] = []
+        # Loaded log file, or several of them merged into one timeline
+        self.log_file: Optional[LogFile | MergedLogFiles] = None
+        # Results of recent filter queries on the loaded file
+        self.filter_cache: FilterCache = FilterCache()
+        # Running search workers, the last one serves the current query
+        self.search_workers: List[SearchWorker] = []
         self.current_file: Optional[str] = None
+        # Paths of all loaded files, more than one for a merged view
+        self.current_files: List[str] = []
         self.current_font_size: int = 10
         
+        # Parallel filtering settings, 0 workers means one per CPU core
+        self.filter_workers: int = 0
+        self.filter_chunk_size: int = LogFilter.PARALLEL_CHUNK_SIZE
+        
+        # Keep line and timestamp indexes in sidecar files, so reopening a file is instant
+        self.index_cache: bool = True
+        
+        # Build a trigram index after opening a file, so include keywords only scan candidate blocks
+        self.trigram_index: bool = True
+        # Running index workers, the last one builds the index of the current file
+        self.index_workers: List[IndexWorker] = []
+        
+        # Line and match counts per time bucket of the current file, None until counted
+        self.timeline: Optional[Timeline] = None
+        # Running timeline workers, the last one counts the lines of the current file
+        self.timeline_workers: List[TimelineWorker] = []
+        
         # Default prompt text when no file is loaded
         self.default_prompt_text = "Click \"Open Log File\" to open file or drag file here."
         
@@ -231,17 +327,35 @@ class LogInsight(QMainWindow):
         # Initialize file watcher variables
         self.file_watcher = QFileSystemWatcher()
         self.file_watcher.fileChanged.connect(self.on_file_changed)
+        # Follows the current file while tail mode is on, see start_tailing
+        self.log_tailer: Optional[LogTailer] = None
+        self.tail_signals = TailSignals(self)
+        self.tail_signals.resultsAvailable.connect(self.on_tail_results)
+        self.tail_signals.fileTruncated.connect(self.on_tail_truncated)
+        self.tail_signals.fileRotated.connect(self.on_tail_rotated)
+        self.tail_signals.errorOccurred.connect(self.report_error)
+        # Lines shown from files that were rotated away while tailing
+        self.rotated_lines: Optional[RotatedLogLines] = None
+        # Most rows kept in the result view while tailing, older rows are dropped, 0 for no limit
+        self.tail_max_lines: int = 100000
+        # Tailed matches collected until the next view update
+        self.pending_tail_ids: array = array('Q')
+        self.pending_tail_generation: int = 0
+        self.tail_flush_timer = QTimer(self)
+        self.tail_flush_timer.setSingleShot(True)
+        self.tail_flush_timer.setInterval(self.TAIL_FLUSH_INTERVAL)
+        self.tail_flush_timer.timeout.connect(self.flush_tail_results)
         
         self.filter_collapsed: bool = False
         self.button_collapsed: bool = False
         
         # Initialize search-related variables
         self.search_dialog = None
-        self.search_matches: List[int] = []
+        # Match positions in the result view, sorted by row and column
+        self.search_matches: SearchMatches = SearchMatches()
         self.current_match_index: int = -1
-        self.search_highlight_format = QTextCharFormat()
-        self.search_highlight_format.setBackground(Qt.GlobalColor.yellow)
-        self.search_highlight_format.setForeground(Qt.GlobalColor.black)
+        # Running text searches, the last one serves the current search text
+        self.text_search_workers: List[TextSearchWorker] = []
         
         self.case_sensitive_on_icon = QIcon(self.get_icon_path('CASE_SENSITIVE_ON'))
         self.case_sensitive_off_icon = QIcon(self.get_icon_path('CASE_SENSITIVE_OFF'))
@@ -256,10 +370,6 @@ class LogInsight(QMainWindow):
         self.load_config()
         self.setAcceptDrops(True)
         self.setup_shortcuts()
-        
-        # Create worker thread for filtering
-        self.filter_worker = FilterWorker(self)
-        self.filter_worker.filteringComplete.connect(self.on_filtering_complete)
     
     def setup_ui(self) -> None:
         self.control_group = QGroupBox()
@@ -330,6 +440,13 @@ class LogInsight(QMainWindow):
         self.include_case_sensitive.toggled.connect(self.toggle_include_case_sensitive)
         
         self.include_case_layout.addWidget(self.include_case_sensitive)
+        
+        # Include keywords regular expression toggle
+        self.include_regex = QToolButton()
+        self.include_regex.setCheckable(True)
+        self.include_regex.setText(".*")
+        self.include_regex.setToolTip("Regular Expression: keywords are matched as regular expressions")
+        self.include_case_layout.addWidget(self.include_regex)
         self.filter_layout.addWidget(self.include_case_frame, 1, 2)
         
         # Exclude keywords
@@ -353,6 +470,13 @@ class LogInsight(QMainWindow):
         self.exclude_case_sensitive.toggled.connect(self.toggle_exclude_case_sensitive)
         
         self.exclude_case_layout.addWidget(self.exclude_case_sensitive)
+        
+        # Exclude keywords regular expression toggle
+        self.exclude_regex = QToolButton()
+        self.exclude_regex.setCheckable(True)
+        self.exclude_regex.setText(".*")
+        self.exclude_regex.setToolTip("Regular Expression: keywords are matched as regular expressions")
+        self.exclude_case_layout.addWidget(self.exclude_regex)
         self.filter_layout.addWidget(self.exclude_case_frame, 2, 2)
         
         # Time range
@@ -426,6 +550,12 @@ class LogInsight(QMainWindow):
         self.search_button.clicked.connect(self.search_log)
         self.buttons_layout.addWidget(self.search_button)
         
+        self.cancel_search_button = QPushButton("Cancel")
+        self.cancel_search_button.setToolTip("Cancel the running filter")
+        self.cancel_search_button.setEnabled(False)
+        self.cancel_search_button.clicked.connect(self.cancel_search)
+        self.buttons_layout.addWidget(self.cancel_search_button)
+        
         self.tail_log_btn = QToolButton()
         self.tail_log_btn.setToolTip("Tail Log")
         self.tail_log_btn.setCheckable(True)
@@ -454,7 +584,7 @@ class LogInsight(QMainWindow):
         self.buttons_layout.addStretch()
         
         self.open_button = QPushButton("Open Log File")
-        self.open_button.clicked.connect(self.open_log_file)
+        self.open_button.clicked.connect(lambda: self.open_log_file())
         self.buttons_layout.addWidget(self.open_button)
         
         self.button_layout.addWidget(self.button_frame)
@@ -462,10 +592,17 @@ class LogInsight(QMainWindow):
         # Add operations section to control panel
         self.control_content_layout.addWidget(self.button_widget)
         
-        # Results display area
-        self.result_text = QTextEdit()
-        self.result_text.setReadOnly(True)
-        self.result_text.setLineWrapMode(QTextEdit.LineWrapMode.WidgetWidth) 
+        # Results display area, only the visible rows are fetched and painted
+        self.result_model = LogResultModel(self)
+        # Text search matches refer to rows, they are void once the rows are replaced
+        self.result_model.modelReset.connect(self.reset_search_matches)
+        # The timeline counts the shown rows as matches
+        self.result_model.modelReset.connect(self.reset_timeline_matches)
+        self.result_model.rowsInserted.connect(self.on_result_rows_inserted)
+        self.result_model.rowsAboutToBeRemoved.connect(self.on_result_rows_removed)
+        self.result_text = LogView()
+        self.result_text.set_model(self.result_model)
+        self.result_text.set_word_wrap(True)
         self.result_text.setFont(QFont("Consolas", self.current_font_size))
         self.result_text.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.result_text.customContextMenuRequested.connect(self.show_context_menu)
@@ -473,9 +610,20 @@ class LogInsight(QMainWindow):
         
         # Set default prompt text
         if not self.current_file:
-            self.result_text.setAlignment(Qt.AlignmentFlag.AlignCenter)
             self.apply_styled_prompt_text()
         
+        # Line counts per log level, unchecking a level filters it out
+        self.level_bar = LevelBar()
+        self.level_bar.levelsChanged.connect(self.on_levels_changed)
+        self.main_layout.addWidget(self.level_bar)
+        
+        # Line and match counts per time bucket, selecting a range sets the time filter
+        self.timeline_view = TimelineView()
+        self.timeline_view.setToolTip("Click or drag to filter a time range, right click to zoom out")
+        self.timeline_view.rangeSelected.connect(self.on_timeline_range_selected)
+        self.timeline_view.setVisible(False)
+        self.main_layout.addWidget(self.timeline_view)
+        
         self.main_layout.addWidget(self.result_text, 1)  # Add stretch factor to make results area occupy more space
         
         # Status bar
@@ -488,6 +636,24 @@ class LogInsight(QMainWindow):
         self.help_btn.setToolTip("Help")
         self.help_btn.clicked.connect(self.show_help_dialog)
         
+        # Progress of the running filter, hidden while idle
+        self.search_progress = QProgressBar()
+        self.search_progress.setRange(0, 100)
+        self.search_progress.setMaximumWidth(150)
+        self.search_progress.setMaximumHeight(16)
+        self.search_progress.setVisible(False)
+        self.statusBar().addPermanentWidget(self.search_progress)
+        
+        # Stage timings, counters and gauges, tracing only runs while the panel is shown
+        self.diagnostics_panel = DiagnosticsPanel(self.diagnostic_gauges, self)
+        self.addDockWidget(Qt.DockWidgetArea.BottomDockWidgetArea, self.diagnostics_panel)
+        # Shown from the start when tracing was turned on through LOGINSIGHT_TRACE
+        self.diagnostics_panel.setVisible(tracer.enabled)
+        self.diagnostics_btn = QToolButton()
+        self.diagnostics_btn.setDefaultAction(self.diagnostics_panel.toggleViewAction())
+        self.diagnostics_btn.setToolTip("Diagnostics (Ctrl+Shift+D)")
+        self.statusBar().addPermanentWidget(self.diagnostics_btn)
+        
         # Add permanent widget to right side of status bar
         self.statusBar().addPermanentWidget(self.help_btn)
     
@@ -540,18 +706,29 @@ class LogInsight(QMainWindow):
             self.theme_toggle_btn.setIcon(QIcon(self.get_icon_path('THEME_DARK')))
             self.theme_toggle_btn.setToolTip("switch to light theme")
             self.result_text.setStyleSheet("background-color: black; color: white;")
+            self.timeline_view.setStyleSheet("background-color: black; color: white;")
         else:
             # Light mode
             self.theme_toggle_btn.setIcon(QIcon(self.get_icon_path('THEME_LIGHT')))
             self.theme_toggle_btn.setToolTip("switch to dark theme")
             self.result_text.setStyleSheet("background-color: white; color: black;")
+            self.timeline_view.setStyleSheet("background-color: white; color: black;")
     
     def apply_styled_prompt_text(self) -> None:
-        """Apply styled HTML format to the default prompt text
+        """Show the default prompt text with its configured style
+        """
+        self.result_model.clear()
+        self.result_text.set_placeholder(self.default_prompt_text, QColor(self.prompt_text_color),
+                                         self.prompt_text_size, centered=True)
+    
+    def show_result_message(self, message: str) -> None:
+        """Clear the result area and show a plain message in it
+        
+        Args:
+            message: Message to show
         """
-        # Create HTML with the configured style properties
-        prompt_html = f'<div style="font-size: {self.prompt_text_size}pt; color: {self.prompt_text_color}; font-weight: bold;">{self.default_prompt_text}</div>'
-        self.result_text.setHtml(prompt_html)
+        self.result_model.clear()
+        self.result_text.set_placeholder(message)
     
     
     def validate_time_format(self, time_str: str) -> bool:
@@ -597,50 +774,316 @@ class LogInsight(QMainWindow):
             self.end_time_entry.setStyleSheet("QLineEdit { padding: 2px 4px; background-color: #FFDDDD; border: 1px solid #FF0000; } QLineEdit::placeholder { color: #888; font-style: italic; }")
             self.end_time_entry.setToolTip("Invalid time format! Please use format: HH:MM:SS.mmm")
     
-    def open_log_file(self) -> None:
-        file_path, _ = QFileDialog.getOpenFileName(
-            self,
-            "Select Log File",
-            "",
-            "Log Files (*.log);;Text Files (*.txt);;All Files (*.*)"
-        )
+    def open_log_file(self, file_path: Optional[str] = None) -> None:
+        """Open a log file, asking the user to pick one or more if no path is given
         
+        Args:
+            file_path: Path of the log file to open
+        """
         if file_path:
-            try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-                    self.log_content = file.readlines()
-                    self.last_file_position = file.tell()
-                
-                # Remove previous file from watcher if exists
-                if self.current_file and self.current_file in self.file_watcher.files():
-                    self.file_watcher.removePath(self.current_file)
-                
-                self.current_file = file_path
-                
-                
-                self.statusBar().showMessage(f"File loaded: {os.path.basename(file_path)} - {len(self.log_content)} lines")
-                # Update window title to show file path
-                self.setWindowTitle(f"LogInsight v{self.VERSION} - {file_path}")
-                
-                # Display log content in results area
-                self.result_text.setAlignment(Qt.AlignmentFlag.AlignLeft)
-                self.result_text.setText("".join(self.log_content))
-                
-                # Add file to watcher if tail mode is active
-                if self.tail_log_btn.isChecked():
-                    self.file_watcher.addPath(self.current_file)
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Cannot open file: {str(e)}")
+            file_paths = [file_path]
+        else:
+            file_paths, _ = QFileDialog.getOpenFileNames(
+                self,
+                "Select Log Files",
+                "",
+                "Log Files (*.log);;"
+                f"Compressed Log Files ({' '.join('*' + extension for extension in COMPRESSED_EXTENSIONS)});;"
+                "Text Files (*.txt);;All Files (*.*)"
+            )
+        
+        if file_paths:
+            self.open_log_files(file_paths)
     
-    def filter_log_content(self, log_lines: List[str]) -> Tuple[str, int]:
-        """
-        Filter log content based on filter conditions
+    def open_log_files(self, file_paths: List[str]) -> None:
+        """Open one log file, or several as one view merged by timestamp
         
         Args:
-            log_lines: List of log lines to filter
+            file_paths: Paths of the log files to open
+        """
+        try:
+            self.load_log_files(file_paths)
             
+            # Display log content in results area
+            self.show_all_lines()
+            
+            # Follow the file if tail mode is active, merged views are not tailed
+            if self.tail_log_btn.isChecked():
+                if isinstance(self.log_file, MergedLogFiles):
+                    self.tail_log_btn.setChecked(False)
+                else:
+                    self.start_tailing()
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Cannot open file: {str(e)}")
+    
+    def show_all_lines(self) -> None:
+        """Show every line of the loaded file, merged views are put in order in the background"""
+        if isinstance(self.log_file, MergedLogFiles):
+            self.stop_search_workers()
+            self.clear_results()
+            self.start_search_worker(FilterQuery.create([], False, [], False))
+        else:
+            self.result_model.set_lines(self.log_file, range(len(self.log_file)))
+    
+    def load_log_file(self, file_path: str) -> None:
+        """Map and index a log file, replacing the currently loaded one
+        
+        Compressed files are decompressed on the fly instead of being mapped.
+        
+        Args:
+            file_path: Path of the log file to load
+        """
+        log_file = self.open_source_file(file_path)
+        self.replace_log_file(log_file, [file_path])
+        
+        self.statusBar().showMessage(f"File loaded: {os.path.basename(file_path)} - {len(self.log_file)} lines"
+                                     f" - {self.log_file.encoding}")
+        # Update window title to show file path
+        self.setWindowTitle(f"LogInsight v{self.VERSION} - {file_path}")
+    
+    def load_log_files(self, file_paths: List[str]) -> None:
+        """Load log files, merging several of them into one timeline
+        
+        Args:
+            file_paths: Paths of the log files to load
+        """
+        if len(file_paths) == 1:
+            self.load_log_file(file_paths[0])
+            return
+        
+        log_files = []
+        try:
+            for file_path in file_paths:
+                log_files.append(self.open_source_file(file_path))
+        except Exception:
+            for log_file in log_files:
+                log_file.close()
+            raise
+        self.replace_log_file(MergedLogFiles(log_files), file_paths)
+        
+        self.statusBar().showMessage(f"Files merged: {len(file_paths)} files - {len(self.log_file)} lines")
+        names = ", ".join(MergedLogFiles.source_names(log_files))
+        self.setWindowTitle(f"LogInsight v{self.VERSION} - {names}")
+    
+    def open_source_file(self, file_path: str) -> LogFile:
+        """Map and index one log file with the configured workers and index cache"""
+        return LogFile.open(
+            file_path,
+            executor=self.get_worker_executor(),
+            cache_dir=LogFile.default_cache_dir() if self.index_cache else None
+        )
+    
+    def replace_log_file(self, log_file: LogFile | MergedLogFiles, file_paths: List[str]) -> None:
+        """Make a loaded file or merged view the current one, closing the previous one
+        
+        Args:
+            log_file: Newly loaded log file or merged view
+            file_paths: Paths of the loaded files
+        """
+        # Remove previous file from watcher if exists
+        if self.current_file and self.current_file in self.file_watcher.files():
+            self.file_watcher.removePath(self.current_file)
+        
+        # Results of running searches, line counts and the tail pipeline belong to the old file.
+        # Wait for every thread reading it, closing the file releases its handles.
+        self.stop_search_workers(wait=True)
+        self.stop_text_search_workers(wait=True)
+        self.stop_index_workers(wait=True)
+        self.stop_timeline_workers(wait=True)
+        self.stop_tailing()
+        
+        if self.log_file:
+            self.log_file.close()
+        
+        self.log_file = log_file
+        self.current_file = file_paths[0]
+        self.current_files = file_paths
+        self.rotated_lines = None
+        # Running searches may still store results in the old cache
+        self.filter_cache = FilterCache()
+        self.start_index_worker()
+        self.start_timeline_worker()
+    
+    def get_worker_executor(self):
+        """Get the shared process pool for indexing, None if only one worker is configured"""
+        workers = self.filter_workers or os.cpu_count() or 1
+        return LogFilter.get_executor(workers) if workers > 1 else None
+    
+    def source_files(self) -> List[LogFile]:
+        """Get the loaded log files, several for a merged view"""
+        if isinstance(self.log_file, MergedLogFiles):
+            return self.log_file.log_files
+        return [self.log_file] if self.log_file else []
+    
+    def start_index_worker(self) -> None:
+        """Start building the trigram index of every loaded file in the background"""
+        self.stop_index_workers()
+        if not self.trigram_index:
+            return
+        
+        for log_file in self.source_files():
+            if not TrigramIndex.supports(log_file.encoding):
+                continue
+            index_worker = IndexWorker(log_file, self.get_worker_executor(), parent=self)
+            index_worker.indexReady.connect(self.on_index_ready)
+            index_worker.indexFailed.connect(self.report_error)
+            index_worker.finished.connect(lambda index_worker=index_worker: self.on_index_worker_finished(index_worker))
+            self.index_workers.append(index_worker)
+            index_worker.start()
+    
+    def extend_index(self) -> None:
+        """Index lines appended since the trigram index was built, in the background
+        
+        Filters check unindexed lines one by one, so the index is extended
+        once enough of them accumulated.
+        """
+        if self.index_workers:
+            return
+        for log_file in self.source_files():
+            index = log_file.trigram_index
+            if index is None or index.unindexed_size(log_file) < index.EXTEND_SIZE:
+                continue
+            index_worker = IndexWorker(log_file, self.get_worker_executor(), index, parent=self)
+            index_worker.finished.connect(lambda index_worker=index_worker: self.on_index_worker_finished(index_worker))
+            self.index_workers.append(index_worker)
+            index_worker.start()
+    
+    def stop_index_workers(self, wait: bool = False) -> None:
+        """Cancel the running index builds
+        
+        Args:
+            wait: Whether to block until the worker threads have stopped
+        """
+        for index_worker in self.index_workers:
+            index_worker.cancel()
+            if wait:
+                index_worker.wait()
+    
+    def on_index_worker_finished(self, index_worker: IndexWorker) -> None:
+        """Release an index worker once its thread has stopped"""
+        if index_worker in self.index_workers:
+            self.index_workers.remove(index_worker)
+        index_worker.deleteLater()
+    
+    def on_index_ready(self, log_file: LogFile, index: TrigramIndex) -> None:
+        """Attach a finished trigram index to its log file
+        
+        Args:
+            log_file: Log file the index was built for
+            index: Finished trigram index
+        """
+        # The file may have been closed or replaced while the index was built
+        if not any(log_file is source_file for source_file in self.source_files()):
+            return
+        log_file.trigram_index = index
+        self.statusBar().showMessage(f"Keyword index ready: {os.path.basename(log_file.path)}", 3000)
+    
+    def start_timeline_worker(self) -> None:
+        """Count the lines of the loaded file per time bucket in the background"""
+        self.stop_timeline_workers()
+        self.timeline = None
+        self.timeline_view.set_timeline(None)
+        self.timeline_view.setVisible(False)
+        self.level_bar.set_counts(None)
+        if not self.log_file:
+            return
+        
+        timeline_worker = TimelineWorker(self.log_file, self)
+        timeline_worker.timelineReady.connect(lambda timeline: self.on_timeline_ready(timeline_worker, timeline))
+        timeline_worker.timelineFailed.connect(self.report_error)
+        timeline_worker.finished.connect(lambda: self.on_timeline_worker_finished(timeline_worker))
+        self.timeline_workers.append(timeline_worker)
+        timeline_worker.start()
+    
+    def stop_timeline_workers(self, wait: bool = False) -> None:
+        """Cancel the running line counts
+        
+        Args:
+            wait: Whether to block until the worker threads have stopped
+        """
+        for timeline_worker in self.timeline_workers:
+            timeline_worker.cancel()
+            if wait:
+                timeline_worker.wait()
+    
+    def on_timeline_worker_finished(self, timeline_worker: TimelineWorker) -> None:
+        """Release a timeline worker once its thread has stopped"""
+        if timeline_worker in self.timeline_workers:
+            self.timeline_workers.remove(timeline_worker)
+        timeline_worker.deleteLater()
+    
+    def on_timeline_ready(self, timeline_worker: TimelineWorker, timeline: Timeline) -> None:
+        """Show the line counts of the loaded file and count the shown rows
+        
+        Args:
+            timeline_worker: Worker that counted the lines
+            timeline: Line counts of the file
+        """
+        if timeline_worker.cancel_event.is_set() or timeline.log_file is not self.log_file:
+            return
+        self.timeline = timeline
+        # Lines indexed while the count ran
+        timeline.update_lines()
+        self.reset_timeline_matches()
+        self.timeline_view.set_timeline(timeline)
+        self.timeline_view.setVisible(timeline.lines.total > 0)
+        self.level_bar.set_counts(timeline.level_counts)
+    
+    def update_timeline(self) -> None:
+        """Count the lines indexed since the last update, such as tailed lines"""
+        if self.timeline is not None and self.timeline.update_lines():
+            self.timeline_view.setVisible(self.timeline.lines.total > 0)
+            self.timeline_view.update()
+            self.level_bar.set_counts(self.timeline.level_counts)
+    
+    def reset_timeline_matches(self) -> None:
+        """Count the rows of the result view again once they were replaced"""
+        if self.timeline is None:
+            return
+        model = self.result_model
+        # Rows showing every line of the file are the line counts already
+        self.timeline.reset_matches(model.source is self.log_file and isinstance(model.line_ids, array))
+        self.timeline.add_matches(model.line_ids, model.first_row, len(model.line_ids))
+        self.timeline_view.update()
+    
+    def on_result_rows_inserted(self, parent, first: int, last: int) -> None:
+        """Add rows appended to the result view to the match counts"""
+        if self.timeline is None or self.timeline.matches is None:
+            return
+        first_row = self.result_model.first_row
+        self.timeline.add_matches(self.result_model.line_ids, first_row + first, first_row + last + 1)
+        self.timeline_view.update()
+    
+    def on_result_rows_removed(self, parent, first: int, last: int) -> None:
+        """Remove rows about to be dropped from the result view from the match counts"""
+        if self.timeline is None or self.timeline.matches is None:
+            return
+        first_row = self.result_model.first_row
+        self.timeline.add_matches(self.result_model.line_ids, first_row + first, first_row + last + 1, -1)
+        self.timeline_view.update()
+    
+    def on_timeline_range_selected(self, start_ms: int, end_ms: int) -> None:
+        """Filter the time range selected on the timeline strip
+        
+        Args:
+            start_ms: First millisecond of the range
+            end_ms: Last millisecond of the range
+        """
+        self.start_time_entry.setText(LogFilter.format_time(start_ms))
+        self.end_time_entry.setText(LogFilter.format_time(end_ms))
+        self.search_log()
+    
+    def on_levels_changed(self) -> None:
+        """Filter again with the checked levels, the keyword matches are reused from the filter cache"""
+        if self.log_file:
+            self.search_log()
+    
+    def build_filter_query(self) -> Tuple[Optional[FilterQuery], str]:
+        """
+        Build the filter query from the filter conditions
+        
         Returns:
-            Tuple of filtered text content and number of matches
+            Tuple of the query and an error message, the query is None if the conditions are invalid
         """
         # Parse include keywords
         include_input: str = self.include_entry.text().strip()
@@ -655,6 +1098,8 @@ class LogInsight(QMainWindow):
         
         include_case_sensitive: bool = self.include_case_sensitive.isChecked()
         exclude_case_sensitive: bool = self.exclude_case_sensitive.isChecked()
+        include_regex: bool = self.include_regex.isChecked()
+        exclude_regex: bool = self.exclude_regex.isChecked()
         
         # Validate time formats (UI-specific validation)
         time_format: str = "%H:%M:%S.%f"
@@ -664,65 +1109,189 @@ class LogInsight(QMainWindow):
             # Highlight the input field with error style
             self.start_time_entry.setStyleSheet("QLineEdit { padding: 2px 4px; background-color: #FFDDDD; border: 1px solid #FF0000; } QLineEdit::placeholder { color: #888; font-style: italic; }")
             self.start_time_entry.setToolTip("Invalid time format! Please use format: HH:MM:SS.mmm")
-            return "Invalid start time format, please use format: " + time_format, 0
+            return None, "Invalid start time format, please use format: " + time_format
             
         # Validate end time format
         if end_time and not self.validate_time_format(end_time):
             # Highlight the input field with error style
             self.end_time_entry.setStyleSheet("QLineEdit { padding: 2px 4px; background-color: #FFDDDD; border: 1px solid #FF0000; } QLineEdit::placeholder { color: #888; font-style: italic; }")
             self.end_time_entry.setToolTip("Invalid time format! Please use format: HH:MM:SS.mmm")
-            return "Invalid end time format, please use format: " + time_format, 0
-        
-        # Compile patterns
-        include_patterns = LogFilter.compile_patterns(include_terms, include_case_sensitive)
-        exclude_patterns = LogFilter.compile_patterns(exclude_terms, exclude_case_sensitive)
-        
-        # Use the shared filtering logic
-        return LogFilter.filter_logs(
-            log_lines,
-            include_patterns,
-            exclude_patterns,
-            start_time,
-            end_time
-        )
+            return None, "Invalid end time format, please use format: " + time_format
+        
+        query = FilterQuery.create(include_terms, include_case_sensitive,
+                                   exclude_terms, exclude_case_sensitive,
+                                   start_time, end_time, include_regex, exclude_regex,
+                                   self.level_bar.selected_levels())
+        
+        # Validate regular expressions before they reach the search worker
+        for entry, compile_matcher in ((self.include_entry, query.include_matcher),
+                                       (self.exclude_entry, query.exclude_matcher)):
+            entry.setStyleSheet("")
+            try:
+                compile_matcher()
+            except re.error as e:
+                entry.setStyleSheet("QLineEdit { background-color: #FFDDDD; border: 1px solid #FF0000; }")
+                return None, f"Invalid regular expression: {str(e)}"
+        return query, ""
 
     def search_log(self) -> None:
-        if not self.log_content:
+        if not self.log_file:
             QMessageBox.warning(self, "Warning", "Please open a log file first")
             return
         
+        # A new query makes the running one stale
+        self.stop_search_workers()
+        if self.log_file.is_truncated():
+            self.reload_truncated_file()
         self.clear_results()
+        # Tailed lines are filtered with the new query once the search covered the file
+        if self.log_tailer is not None:
+            self.log_tailer.set_query(None, 0)
         
         # Apply filter conditions
-        result_text, match_count = self.filter_log_content(self.log_content)
+        query, error_message = self.build_filter_query()
         
-        # Reset time input styles if search was successful
-        if isinstance(result_text, str) and not result_text.startswith("Invalid"):
-            # Reset start time input style
-            self.start_time_entry.setStyleSheet("QLineEdit { padding: 2px 4px; } QLineEdit::placeholder { color: #888; font-style: italic; }")
-            self.start_time_entry.setToolTip("")
-            
-            # Reset end time input style
-            self.end_time_entry.setStyleSheet("QLineEdit { padding: 2px 4px; } QLineEdit::placeholder { color: #888; font-style: italic; }")
-            self.end_time_entry.setToolTip("")
+        if error_message:
+            self.show_result_message(error_message)
+            self.statusBar().showMessage("Found 0 matches")
+            return
         
-        if match_count == 0:
-            self.result_text.setText("No matching results found.\n")
-        else:
-            self.result_text.setText(result_text)
+        # Reset time input styles if the conditions are valid
+        # Reset start time input style
+        self.start_time_entry.setStyleSheet("QLineEdit { padding: 2px 4px; } QLineEdit::placeholder { color: #888; font-style: italic; }")
+        self.start_time_entry.setToolTip("")
+        
+        # Reset end time input style
+        self.end_time_entry.setStyleSheet("QLineEdit { padding: 2px 4px; } QLineEdit::placeholder { color: #888; font-style: italic; }")
+        self.end_time_entry.setToolTip("")
         
-        self.statusBar().showMessage(f"Found {match_count} matches")
+        self.start_search_worker(query)
+    
+    def start_search_worker(self, query: FilterQuery) -> None:
+        """Filter the loaded file in the background, streaming the matches into the result view
+        
+        Args:
+            query: Normalized filter conditions
+        """
+        # Filter in the background, reusing earlier results and spreading the rest over worker processes
+        search_worker = SearchWorker(self.log_file, query, self.filter_cache,
+                                     self.filter_workers, self.filter_chunk_size, self)
+        search_worker.progressChanged.connect(lambda percent: self.on_search_progress(search_worker, percent))
+        search_worker.resultsAvailable.connect(lambda line_ids: self.on_search_results(search_worker, line_ids))
+        search_worker.searchComplete.connect(
+            lambda line_ids, end_line: self.on_search_complete(search_worker, line_ids, end_line))
+        search_worker.searchFailed.connect(lambda message: self.on_search_failed(search_worker, message))
+        search_worker.finished.connect(lambda: self.on_search_worker_finished(search_worker))
+        self.search_workers.append(search_worker)
+        
+        self.cancel_search_button.setEnabled(True)
+        self.search_progress.setValue(0)
+        self.search_progress.setVisible(True)
+        self.statusBar().showMessage("Filtering...")
+        search_worker.start()
+    
+    def is_search_running(self) -> bool:
+        """Check whether the current query is still being filtered"""
+        return bool(self.search_workers) and not self.search_workers[-1].cancel_event.is_set()
+    
+    def cancel_search(self) -> None:
+        """Cancel the running filter on user request"""
+        if not self.is_search_running():
+            return
+        self.stop_search_workers()
+        self.show_result_message("Filter cancelled.")
+        self.statusBar().showMessage("Filter cancelled")
+    
+    def stop_search_workers(self, wait: bool = False) -> None:
+        """Cancel the running searches, their results are dropped
+        
+        Args:
+            wait: Whether to block until the worker threads have stopped
+        """
+        for search_worker in self.search_workers:
+            search_worker.cancel()
+            if wait:
+                search_worker.wait()
+        self.cancel_search_button.setEnabled(False)
+        self.search_progress.setVisible(False)
+    
+    def on_search_worker_finished(self, search_worker: SearchWorker) -> None:
+        """Release a search worker once its thread has stopped"""
+        if search_worker in self.search_workers:
+            self.search_workers.remove(search_worker)
+        search_worker.deleteLater()
+    
+    def on_search_progress(self, search_worker: SearchWorker, percent: int) -> None:
+        if search_worker.cancel_event.is_set():
+            return
+        self.search_progress.setValue(percent)
+        self.statusBar().showMessage(f"Filtering... {percent}% - {self.result_model.rowCount()} matches")
+    
+    def on_search_results(self, search_worker: SearchWorker, line_ids: array) -> None:
+        """Append a batch of matches while the search is still running
+        
+        Args:
+            search_worker: Worker that found the matches
+            line_ids: Ids of the next matching lines, in file order
+        """
+        if search_worker.cancel_event.is_set():
+            return
+        with tracer.span("results.append", rows=len(line_ids)):
+            if self.result_model.source is not self.log_file:
+                self.result_model.set_lines(self.log_file, line_ids)
+            else:
+                self.result_model.append_lines(line_ids)
+        self.statusBar().showMessage(f"Filtering... {self.search_progress.value()}% - {self.result_model.rowCount()} matches")
+    
+    def report_error(self, message: str) -> None:
+        """Show an error of a background task in the status bar and record it for the diagnostics panel
+        
+        Args:
+            message: Error message
+        """
+        tracer.instant(message)
+        self.statusBar().showMessage(message)
+    
+    def on_search_failed(self, search_worker: SearchWorker, message: str) -> None:
+        if search_worker.cancel_event.is_set():
+            return
+        self.stop_search_workers()
+        self.show_result_message(f"Filter failed: {message}")
+        self.statusBar().showMessage("Filter failed")
+    
+    def on_search_complete(self, search_worker: SearchWorker, line_ids: array, end_line: int) -> None:
+        """Show the result of a finished search
+        
+        Args:
+            search_worker: Worker that ran the search
+            line_ids: Ids of the matching lines
+            end_line: Line after the last line the search covered
+        """
+        # Results of cancelled or replaced searches are stale
+        if search_worker.cancel_event.is_set() or search_worker.log_file is not self.log_file:
+            return
+        self.cancel_search_button.setEnabled(False)
+        self.search_progress.setVisible(False)
+        
+        # The matches were already streamed into the view in batches
+        if not line_ids:
+            self.show_result_message("No matching results found.")
+        self.statusBar().showMessage(f"Found {len(line_ids)} matches")
+        self.extend_index()
+        self.update_timeline()
+        
+        # Lines appended during the search are filtered like tailed lines
+        if self.log_tailer is not None:
+            self.log_tailer.set_query(search_worker.query, end_line)
     
     def clear_results(self) -> None:
-        self.result_text.clear()
+        self.result_model.clear()
         
         # Show default prompt text if no file is loaded
         if not self.current_file:
-            self.result_text.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            prompt_html = f'<div style="font-size: 16pt; font-weight: bold; color: #0066cc;">{self.default_prompt_text}</div>'
-            self.result_text.setHtml(prompt_html)
+            self.apply_styled_prompt_text()
         else:
-            self.result_text.setAlignment(Qt.AlignmentFlag.AlignLeft)
+            self.result_text.set_placeholder("")
     
     def show_context_menu(self, position) -> None:
         context_menu = QMenu()
@@ -740,19 +1309,27 @@ class LogInsight(QMainWindow):
             self.copy_all()
     
     def copy_selection(self) -> None:
-        self.result_text.copy()
+        self.result_text.copy_selection()
         self.statusBar().showMessage("Selected content copied to clipboard")
     
     def select_all(self) -> None:
-        self.result_text.selectAll()
+        self.result_text.select_all()
     
     def copy_all(self) -> None:
-        cursor = self.result_text.textCursor()
-        cursor.select(cursor.SelectionType.Document)
-        self.result_text.setTextCursor(cursor)
-        self.result_text.copy()
+        self.result_text.select_all()
+        self.result_text.copy_selection()
         self.statusBar().showMessage("All content copied to clipboard")
     
+    def diagnostic_gauges(self) -> Dict[str, float]:
+        """Sample the application state shown in the diagnostics panel"""
+        return {
+            "lines.indexed": len(self.log_file) if self.log_file is not None else 0,
+            "results.rows": self.result_model.rowCount(),
+            "tail.pending_matches": len(self.pending_tail_ids),
+            "workers.search": len(self.search_workers),
+            "workers.index": len(self.index_workers),
+        }
+    
     def setup_shortcuts(self) -> None:
         """Set up keyboard shortcuts"""
         # Set up Ctrl+F shortcut
@@ -762,6 +1339,10 @@ class LogInsight(QMainWindow):
         # Set up F1 shortcut for help
         self.help_shortcut = QShortcut(QKeySequence("F1"), self)
         self.help_shortcut.activated.connect(self.show_help_dialog)
+        
+        # Set up Ctrl+Shift+D shortcut for the diagnostics panel
+        self.diagnostics_shortcut = QShortcut(QKeySequence("Ctrl+Shift+D"), self)
+        self.diagnostics_shortcut.activated.connect(self.diagnostics_panel.toggleViewAction().trigger)
     
     def show_search_dialog(self) -> None:
         """Show search dialog"""
@@ -873,97 +1454,87 @@ class LogInsight(QMainWindow):
         """Triggered when search text changes"""
         search_text = self.search_entry.text()
         if not search_text:
+            self.stop_text_search_workers()
             self.clear_highlights()
-            self.search_matches = []
+            self.search_matches = SearchMatches()
             self.current_match_index = -1
             return
         
         self.find_all_matches(search_text)
-        
-        # No need to update status bar here as find_all_matches already does it
     
     def find_all_matches(self, search_text: str) -> None:
-        """Find all matching positions using batch processing to avoid UI freezing"""
-
+        """Find all matching positions in the result rows in the background
+        
+        A search still running for the previous text is cancelled. The rows
+        shown when the search starts are searched, rows appended later are not.
+        """
+        self.stop_text_search_workers()
         self.clear_highlights()
         
         # Reset match list
-        self.search_matches = []
+        self.search_matches = SearchMatches()
         self.current_match_index = -1
         
         if not search_text:
             return
         
-        # Get text content
-        document = self.result_text.document()
-        cursor = QTextCursor(document)
-        
-        # Move cursor to start of document
-        cursor.movePosition(QTextCursor.MoveOperation.Start)
-
-        # Set batch processing parameters
-        batch_size = 1000  # Maximum matches per batch
-        max_matches = 10000  # Maximum total matches limit
-        limit_reached = False  # Flag to track if we hit the max_matches limit
-        
-        # Create progress indicator
+        model = self.result_model
+        text_search_worker = TextSearchWorker(model.source, model.line_ids[model.first_row:], search_text,
+                                              model.dropped_rows, self)
+        text_search_worker.progressChanged.connect(
+            lambda percent: self.on_text_search_progress(text_search_worker, percent))
+        text_search_worker.searchComplete.connect(
+            lambda matches: self.on_text_search_complete(text_search_worker, matches))
+        text_search_worker.searchFailed.connect(self.report_error)
+        text_search_worker.finished.connect(lambda: self.on_text_search_worker_finished(text_search_worker))
+        self.text_search_workers.append(text_search_worker)
         self.statusBar().showMessage("Searching for matches...")
-        QApplication.processEvents()  # Ensure UI updates
+        text_search_worker.start()
+    
+    def reset_search_matches(self) -> None:
+        """Forget the text search matches of the previous result rows"""
+        self.stop_text_search_workers()
+        self.search_matches = SearchMatches()
+        self.current_match_index = -1
+    
+    def stop_text_search_workers(self, wait: bool = False) -> None:
+        """Cancel the running text searches, their matches are dropped
         
-        # Find matches (batch processing)
-        while True:
-            # Process current batch
-            batch_count = 0
-            batch_start_time = time.time()
-            
-            while batch_count < batch_size and len(self.search_matches) < max_matches:
-                # Find next occurrence, starting from current cursor position
-                found_cursor = document.find(search_text, cursor)
-                if found_cursor.isNull():
-                    break
-                
-                # Save match position
-                match_position = found_cursor.position() - len(search_text)
-                self.search_matches.append(match_position)
-                batch_count += 1
-                
-                # Update cursor position for next search
-                cursor = found_cursor
-                cursor.movePosition(QTextCursor.MoveOperation.Right)
-
-            # Exit loop if no more matches found in this batch
-            if batch_count == 0:
-                break
-            
-            # Check if max matches limit was reached
-            if len(self.search_matches) >= max_matches:
-                limit_reached = True
-                break
-
-            # Update status bar with progress
-            self.statusBar().showMessage(f"Found {len(self.search_matches)} matches...")
-            QApplication.processEvents()  # Ensure UI updates
-            
-            # Adjust batch size based on processing time
-            batch_time = time.time() - batch_start_time
-            if batch_time < 0.05 and batch_size < 5000:
-                batch_size = min(batch_size * 2, 5000)
-            elif batch_time > 0.2 and batch_size > 100:
-                batch_size = max(batch_size // 2, 100)
+        Args:
+            wait: Whether to block until the worker threads have stopped
+        """
+        for text_search_worker in self.text_search_workers:
+            text_search_worker.cancel()
+            if wait:
+                text_search_worker.wait()
     
-        # Highlight matches (only highlight matches near visible area)
-        self.highlight_visible_matches()
+    def on_text_search_worker_finished(self, text_search_worker: TextSearchWorker) -> None:
+        """Release a text search worker once its thread has stopped"""
+        if text_search_worker in self.text_search_workers:
+            self.text_search_workers.remove(text_search_worker)
+        text_search_worker.deleteLater()
     
+    def on_text_search_progress(self, text_search_worker: TextSearchWorker, percent: int) -> None:
+        if text_search_worker.cancel_event.is_set():
+            return
+        self.statusBar().showMessage(f"Searching for matches... {percent}%")
+    
+    def on_text_search_complete(self, text_search_worker: TextSearchWorker, matches: SearchMatches) -> None:
+        """Take the matches of the current search text and select the first one"""
+        if text_search_worker.cancel_event.is_set():
+            return
+        # Rows dropped from the front while the search ran
+        matches.drop_rows(self.result_model.dropped_rows - text_search_worker.dropped_rows)
+        self.search_matches = matches
+        
+        # The view looks up the matches of the rows it paints
+        self.result_text.set_matches(matches)
+        
         # If matches found, select the first one
         if self.search_matches:
             self.current_match_index = 0
             self.scroll_to_match(self.current_match_index)
-        
-            # Show message if max matches limit reached
-            if limit_reached:
-                self.statusBar().showMessage(f"Found over {max_matches} matches, showing first {max_matches} only")
-            else:
-                self.statusBar().showMessage(f"Found {len(self.search_matches)} matches")
+            self.statusBar().showMessage(f"Found {len(self.search_matches)} matches")
         else:
             self.statusBar().showMessage("No matches found")
     
@@ -993,60 +1564,15 @@ class LogInsight(QMainWindow):
         """
         if 0 <= index < len(self.search_matches):
             # Get match position
-            position = self.search_matches[index]
-            
-            # Create cursor and move to match position
-            cursor = QTextCursor(self.result_text.document())
-            cursor.setPosition(position)
-            cursor.setPosition(position + len(self.search_entry.text()), QTextCursor.MoveMode.KeepAnchor)
+            row, column = self.search_matches[index]
             
-            # Set text cursor and scroll to visible area
-            self.result_text.setTextCursor(cursor)
-            self.result_text.ensureCursorVisible()
-            
-            # Rehighlight matches in visible area after scrolling
-            # Delay slightly to ensure scrolling completes
-            QTimer.singleShot(50, self.highlight_visible_matches)
-    
-    def highlight_visible_matches(self) -> None:
-        """Only highlight matches near the current visible area
-        
-        This lazy loading approach significantly improves performance with many matches
-        """
-        if not self.search_matches or not self.search_entry:
-            return
-            
-        # Get current visible area
-        visible_cursor = self.result_text.cursorForPosition(self.result_text.viewport().rect().center())
-        visible_position = visible_cursor.position()
-        
-        # Calculate range before and after visible area (about 1000 characters each)
-        visible_range = 1000
-        start_pos = max(0, visible_position - visible_range)
-        end_pos = min(self.result_text.document().characterCount(), visible_position + visible_range)
-        
-        # Find matches within visible range
-        search_text = self.search_entry.text()
-        document = self.result_text.document()
-        
-        # Limit to 100 highlights to avoid performance issues
-        highlight_count = 0
-        max_highlights = 100
-        
-        for pos in self.search_matches:
-            if start_pos <= pos <= end_pos and highlight_count < max_highlights:
-                # 高亮匹配文本
-                cursor_highlight = QTextCursor(document)
-                cursor_highlight.setPosition(pos)
-                cursor_highlight.setPosition(pos + len(search_text), QTextCursor.MoveMode.KeepAnchor)
-                cursor_highlight.setCharFormat(self.search_highlight_format)
-                highlight_count += 1
+            # Select the match and scroll it into the visible area
+            self.result_text.set_selection((row, column), (row, column + self.search_matches.length))
+            self.result_text.ensure_row_visible(row)
+            self.result_text.ensure_column_visible(row, column)
     
     def clear_highlights(self) -> None:
-        cursor = QTextCursor(self.result_text.document())
-        cursor.select(QTextCursor.SelectionType.Document)
-        cursor.setCharFormat(QTextCharFormat())
-        cursor.clearSelection()
+        self.result_text.set_matches(None)
     
     def on_mouse_wheel(self, event: QWheelEvent) -> None:
         # check if Ctrl is pressed
@@ -1069,21 +1595,10 @@ class LogInsight(QMainWindow):
             # Handle event
             event.accept()
         else:
-            # If Ctrl is not pressed, pass the event to QTextEdit's native wheelEvent for normal scrolling
+            # If Ctrl is not pressed, pass the event to LogView's native wheelEvent for normal scrolling
             # Note: Cannot use super().wheelEvent(event) because current class is a subclass of QMainWindow
-            # Need to pass the event to QTextEdit's native method
-            QTextEdit.wheelEvent(self.result_text, event)
-            
-            # Update highlights after scrolling (use timer to delay execution, avoid frequent updates)
-            if self.search_matches and hasattr(self, 'search_entry') and self.search_entry:
-                if hasattr(self, 'scroll_timer'):
-                    self.scroll_timer.stop()
-                else:
-                    self.scroll_timer = QTimer()
-                    self.scroll_timer.setSingleShot(True)
-                    self.scroll_timer.timeout.connect(self.highlight_visible_matches)
-                
-                self.scroll_timer.start(100)  # 100ms delay to avoid frequent updates while scrolling
+            # Need to pass the event to LogView's native method
+            LogView.wheelEvent(self.result_text, event)
     
     def keyPressEvent(self, event) -> None:
         """Handle keyboard events, support Ctrl+Home and Ctrl+End shortcuts for navigation
@@ -1094,23 +1609,15 @@ class LogInsight(QMainWindow):
         # Check if Ctrl+Home combination is pressed (navigate to first line)
         if (event.modifiers() & Qt.KeyboardModifier.ControlModifier and 
                 event.key() == Qt.Key.Key_Home):
-            # Move text cursor to document start
-            cursor = self.result_text.textCursor()
-            cursor.movePosition(cursor.MoveOperation.Start)
-            self.result_text.setTextCursor(cursor)
             # Ensure view scrolls to top
-            self.result_text.ensureCursorVisible()
+            self.result_text.scroll_to_top()
             self.statusBar().showMessage("Navigated to first line")
             event.accept()
         # Check if Ctrl+End combination is pressed (navigate to last line)
         elif (event.modifiers() & Qt.KeyboardModifier.ControlModifier and 
                 event.key() == Qt.Key.Key_End):
-            # Move text cursor to document end
-            cursor = self.result_text.textCursor()
-            cursor.movePosition(cursor.MoveOperation.End)
-            self.result_text.setTextCursor(cursor)
             # Ensure view scrolls to bottom
-            self.result_text.ensureCursorVisible()
+            self.result_text.scroll_to_bottom()
             self.statusBar().showMessage("Navigated to last line")
             event.accept()
         else:
@@ -1123,11 +1630,10 @@ class LogInsight(QMainWindow):
         Args:
             checked: Button checked state
         """
+        self.result_text.set_word_wrap(checked)
         if checked:
-            self.result_text.setLineWrapMode(QTextEdit.LineWrapMode.WidgetWidth)
             self.word_wrap_btn.setIcon(QIcon(self.get_icon_path('WORD_WRAP_ON')))
         else:
-            self.result_text.setLineWrapMode(QTextEdit.LineWrapMode.NoWrap)
             self.word_wrap_btn.setIcon(QIcon(self.get_icon_path('WORD_WRAP_OFF')))
     
     def toggle_tail_log(self, checked: bool) -> None:
@@ -1140,18 +1646,15 @@ class LogInsight(QMainWindow):
         if checked:
             self.tail_log_btn.setIcon(QIcon(self.get_icon_path('TAIL_LOG_ON')))
             
-            if self.current_file and os.path.exists(self.current_file):
-                # Update last file position to current file size to only read new content
-                self.last_file_position = os.path.getsize(self.current_file)
-                print(f"Updated last_file_position to {self.last_file_position}")
-                
-                # Add file to watcher if not already watching
-                if self.current_file not in self.file_watcher.files():
-                    self.file_watcher.addPath(self.current_file)
-                    
+            if isinstance(self.log_file, MergedLogFiles):
+                self.tail_log_btn.setChecked(False)
+                QMessageBox.warning(self, "Warning", "Tail mode follows a single log file, open one file to tail it")
+                return
+            if self.log_file and os.path.exists(self.current_file):
+                self.start_tailing()
                 self.statusBar().showMessage("Log tail mode started")
             else:
-                print(f"Cannot enable tail mode: current_file={self.current_file}, exists={self.current_file and os.path.exists(self.current_file)}")
+                tracer.instant(f"Cannot enable tail mode: current_file={self.current_file}")
                 self.tail_log_btn.setChecked(False)
                 QMessageBox.warning(self, "Warning", "Please open a log file first")
                 return  # Don't save config in this case
@@ -1162,10 +1665,48 @@ class LogInsight(QMainWindow):
             # Remove file from watcher
             if self.current_file and self.current_file in self.file_watcher.files():
                 self.file_watcher.removePath(self.current_file)
+            self.stop_tailing()
                 
             self.statusBar().showMessage("Log tail mode stopped")
 
     
+    def start_tailing(self, first_line: Optional[int] = None) -> None:
+        """Watch the current file and follow its appended lines in the background
+        
+        Args:
+            first_line: First line to filter, defaults to the first line appended from now on
+        """
+        self.stop_tailing()
+        if self.current_file not in self.file_watcher.files():
+            self.file_watcher.addPath(self.current_file)
+        
+        if first_line is None:
+            if self.log_file.is_truncated():
+                # Truncated while it was not tailed, start over
+                self.reload_truncated_file()
+                first_line = 0
+            else:
+                # Index content appended so far so that only new lines are tailed
+                self.log_file.grow()
+                first_line = self.log_file.complete_line_count
+        tracer.instant(f"Tailing from line {first_line}")
+        
+        # A running search hands its query over once it covered the file
+        query = None
+        if not self.is_search_running():
+            query, _ = self.build_filter_query()
+        self.log_tailer = LogTailer(self.log_file, self.tail_signals.resultsAvailable.emit,
+                                    self.tail_signals.fileTruncated.emit,
+                                    self.tail_signals.fileRotated.emit,
+                                    self.tail_signals.errorOccurred.emit)
+        self.log_tailer.start(query, first_line)
+    
+    def stop_tailing(self) -> None:
+        """Stop the tail pipeline, its pending results are dropped"""
+        if self.log_tailer is not None:
+            self.log_tailer.stop()
+            self.log_tailer = None
+    
     def on_file_changed(self, path: str) -> None:
         """Handle file change events from QFileSystemWatcher
         
@@ -1176,77 +1717,159 @@ class LogInsight(QMainWindow):
             return
             
         if path != self.current_file:
-            print(f"Warning: File change event received for {path} but current file is {self.current_file}")
+            tracer.instant(f"File change event for {path} ignored, current file is {self.current_file}")
             return
-            
-        # Get current file size
-        current_size = os.path.getsize(path)
-
-        # Read only new content
-        with open(path, 'r', encoding='utf-8', errors='ignore') as file:
-                # If file is smaller than last position (file was truncated), read from beginning
-            if current_size < self.last_file_position:
-                    file.seek(0)
-                    self.last_file_position = 0
-            else:
-                    # Otherwise, read only new content from last position
-                    file.seek(self.last_file_position)
-
-            new_content = file.read()
-            # Update last position for next read
-            self.last_file_position = file.tell()
-
-        # Process new content in background thread if there's content
-        if new_content:
-            new_lines = new_content.splitlines(True)  # Keep line breaks
-
-            if new_lines:
-                    # Parse filter parameters
-                include_input = self.include_entry.text().strip()
-                include_terms = self.parse_keywords(include_input)
-
-                exclude_input = self.exclude_entry.text().strip()
-                exclude_terms = self.parse_keywords(exclude_input)
-
-                start_time = self.start_time_entry.text().strip()
-                end_time = self.end_time_entry.text().strip()
-
-                include_case_sensitive = self.include_case_sensitive.isChecked()
-                exclude_case_sensitive = self.exclude_case_sensitive.isChecked()
-
-                self.filter_worker.setup(
-                        new_lines,
-                        include_terms,
-                        exclude_terms,
-                        include_case_sensitive,
-                        exclude_case_sensitive,
-                        start_time,
-                        end_time
-                )
-
-                # Start the worker thread if it's not already running
-                if not self.filter_worker.isRunning():
-                    self.filter_worker.start()
+        
+        # The tail pipeline reads and filters the appended data in its own threads
+        if self.log_tailer is not None:
+            self.log_tailer.notify()
 
         # Re-add the file to the watcher if it was removed
         if path not in self.file_watcher.files() and self.tail_log_btn.isChecked():
                 self.file_watcher.addPath(path)
-                
-
-    def on_filtering_complete(self, filtered_content: str, match_count: int) -> None:
-        """Handle completion of background filtering
+    
+    def reload_truncated_file(self, rebuild: bool = False) -> None:
+        """Index a truncated file again from the beginning, dropping everything derived from it
         
         Args:
-            filtered_content: The filtered text content
-            match_count: Number of matching lines
+            rebuild: Whether to index again even if the file did not shrink, as the
+                tailer also reports files that were truncated and grew past their old size
         """
-        if filtered_content:
-            # Append filtered content to results text box
-            self.result_text.append(filtered_content)
-            # Scroll to bottom
-            self.result_text.verticalScrollBar().setValue(self.result_text.verticalScrollBar().maximum())
-            
-            self.statusBar().showMessage(f"Appended {match_count} matching log lines")
+        # Nothing may read the index while it is rebuilt
+        tailing = self.log_tailer is not None
+        self.stop_tailing()
+        self.stop_search_workers(wait=True)
+        self.stop_text_search_workers(wait=True)
+        self.stop_index_workers(wait=True)
+        self.stop_timeline_workers(wait=True)
+        self.log_file.refresh(rebuild=rebuild)
+        self.filter_cache = FilterCache()
+        self.start_index_worker()
+        self.start_timeline_worker()
+        self.result_model.set_lines(self.log_file, array('Q'))
+        self.statusBar().showMessage("Log file was truncated, it was indexed again")
+        if tailing:
+            self.start_tailing(0)
+    
+    def on_tail_truncated(self) -> None:
+        """Index a truncated file again and tail it from the beginning"""
+        self.stop_tailing()
+        if not self.log_file or not self.tail_log_btn.isChecked():
+            return
+        self.reload_truncated_file(rebuild=True)
+        self.start_tailing(0)
+    
+    def on_tail_rotated(self) -> None:
+        """Follow the file that replaced a rotated one, keeping the lines shown from the old file"""
+        self.stop_tailing()
+        if not self.log_file or not self.tail_log_btn.isChecked():
+            return
+        
+        try:
+            log_file = LogFile.open(
+                self.current_file,
+                executor=self.get_worker_executor(),
+                cache_dir=LogFile.default_cache_dir() if self.index_cache else None
+            )
+        except OSError as e:
+            self.report_error(f"Error opening the new log file after rotation: {str(e)}")
+            return
+        
+        # Searches, cached results and the keyword index belong to the rotated file,
+        # wait for the threads reading it before it may be closed
+        self.stop_search_workers(wait=True)
+        self.stop_index_workers(wait=True)
+        self.stop_timeline_workers(wait=True)
+        rotated_file = self.log_file
+        shown_lines = self.result_model.source
+        self.log_file = log_file
+        self.filter_cache = FilterCache()
+        self.start_index_worker()
+        self.start_timeline_worker()
+        
+        if shown_lines is not None and shown_lines in (rotated_file, self.rotated_lines):
+            self.rotated_lines = RotatedLogLines(shown_lines, log_file)
+            self.result_model.set_source(self.rotated_lines)
+        else:
+            self.rotated_lines = None
+            # The sidecar index of the path describes the new file now
+            rotated_file.cache_dir = None
+            rotated_file.close()
+        
+        # The watcher may still be attached to the rotated file
+        if self.current_file in self.file_watcher.files():
+            self.file_watcher.removePath(self.current_file)
+        self.statusBar().showMessage("Log file was rotated, following the new file")
+        self.start_tailing(0)
+    
+    def on_tail_results(self, generation: int, line_ids: array, end_line: int) -> None:
+        """Collect the matches among the tailed lines until the next view update
+        
+        Args:
+            generation: Generation of the query the lines were filtered with
+            line_ids: Ids of the matching lines
+            end_line: Line after the last filtered line
+        """
+        # Results of stopped pipelines and replaced queries are stale
+        if self.log_tailer is None or generation != self.log_tailer.generation:
+            return
+        if generation != self.pending_tail_generation:
+            self.pending_tail_ids = array('Q')
+            self.pending_tail_generation = generation
+        self.pending_tail_ids.extend(line_ids)
+        # The timeline counts every tailed line, matching or not
+        if (self.pending_tail_ids or self.timeline is not None) and not self.tail_flush_timer.isActive():
+            self.tail_flush_timer.start()
+    
+    def flush_tail_results(self) -> None:
+        """Append the collected tailed matches to the results, at most once per frame"""
+        self.update_timeline()
+        line_ids = self.pending_tail_ids
+        self.pending_tail_ids = array('Q')
+        if (not line_ids or self.log_tailer is None
+                or self.pending_tail_generation != self.log_tailer.generation):
+            return
+        
+        shown_lines = self.result_model.source
+        if shown_lines is not None and shown_lines is self.rotated_lines:
+            # Lines of the new file follow the lines kept from the rotated one
+            line_ids = array('Q', (line_id + self.rotated_lines.base_line for line_id in line_ids))
+        elif shown_lines is not self.log_file:
+            self.result_model.set_lines(self.log_file, array('Q'))
+        if self.result_model.rowCount():
+            # A line shown while it was still incomplete is not appended again
+            last_line = self.result_model.line_id(self.result_model.rowCount() - 1)
+            line_ids = line_ids[bisect_right(line_ids, last_line):]
+            if not line_ids:
+                return
+        
+        # Only follow the new lines while the user has not scrolled up
+        follow = self.result_text.is_at_bottom()
+        with tracer.span("results.append", rows=len(line_ids)):
+            self.result_model.append_lines(line_ids)
+        excess = self.result_model.rowCount() - self.tail_max_lines
+        if self.tail_max_lines and excess > 0:
+            self.drop_result_rows(excess)
+        if follow:
+            self.result_text.scroll_to_bottom()
+        
+        message = f"Appended {len(line_ids)} matching log lines"
+        if self.result_model.dropped_rows:
+            message += f", {self.result_model.dropped_rows} older lines hidden (Filter Log shows them again)"
+        self.statusBar().showMessage(message)
+        self.extend_index()
+    
+    def drop_result_rows(self, count: int) -> None:
+        """Drop the oldest rows of the result view, the lines stay in the file index
+        
+        Args:
+            count: Number of rows to drop
+        """
+        self.result_model.drop_first_rows(count)
+        # Text search matches refer to rows
+        if self.search_matches:
+            dropped_matches = self.search_matches.drop_rows(count)
+            self.current_match_index = max(-1, self.current_match_index - dropped_matches)
     
     def parse_keywords(self, input_str: str) -> List[str]:
         """parse keywords, support space separation and keywords with spaces inside quotes
@@ -1256,24 +1879,7 @@ class LogInsight(QMainWindow):
         Returns:
             Parsed keyword list
         """
-        
-        if not input_str:
-            return []
-            
-        keywords: List[str] = []
-        # regular expression matching: content inside quotes as a keyword, or non-space character sequence as a keyword
-        pattern: Pattern = re.compile(r'"([^"]*)"|\S+')
-        
-        matches = pattern.finditer(input_str)
-        for match in matches:
-            # if it's inside quotes, group(1) will have a value
-            if match.group(1) is not None:
-                keywords.append(match.group(1))
-            else:
-                # otherwise, use the full match
-                keywords.append(match.group(0))
-                
-        return [keyword.strip() for keyword in keywords if keyword.strip()]
+        return parse_keywords(input_str)
     
     def load_config(self) -> None:
         if not os.path.exists(self.CONFIG_FILE):
@@ -1283,7 +1889,7 @@ class LogInsight(QMainWindow):
         try:
             with open(self.CONFIG_FILE, 'r', encoding='utf-8') as f:
                 config = json.load(f)
-            print(f"Configuration loaded: {config}")
+            tracer.instant("Configuration loaded", config=config)
                 
             # restore search conditions
             if "include_keywords" in config and config["include_keywords"]:
@@ -1305,11 +1911,38 @@ class LogInsight(QMainWindow):
             if "exclude_case_sensitive" in config:
                 self.exclude_case_sensitive.setChecked(config["exclude_case_sensitive"])
                 
+            # restore regular expression settings
+            if "include_regex" in config:
+                self.include_regex.setChecked(config["include_regex"])
+                
+            if "exclude_regex" in config:
+                self.exclude_regex.setChecked(config["exclude_regex"])
+                
+            # restore level selection
+            if "hidden_levels" in config:
+                self.level_bar.set_hidden_levels(config["hidden_levels"])
+                
             # restore word wrap setting
             if "word_wrap" in config:
                 self.word_wrap_btn.setChecked(config["word_wrap"])
                 # toggle_word_wrap will be called by the toggled signal
                 
+            # restore parallel filtering settings
+            if "filter_workers" in config:
+                self.filter_workers = config["filter_workers"]
+                
+            if "filter_chunk_size" in config:
+                self.filter_chunk_size = config["filter_chunk_size"]
+                
+            if "index_cache" in config:
+                self.index_cache = config["index_cache"]
+                
+            if "trigram_index" in config:
+                self.trigram_index = config["trigram_index"]
+            
+            if "tail_max_lines" in config:
+                self.tail_max_lines = config["tail_max_lines"]
+                
             # restore font size
             if "font_size" in config:
                 self.current_font_size = config["font_size"]
@@ -1333,47 +1966,48 @@ class LogInsight(QMainWindow):
                     self.control_content_widget.setVisible(False)
                     
             # First restore last open file and apply filters
-            if "last_file" in config and config["last_file"] and os.path.exists(config["last_file"]):
-                self.current_file = config["last_file"]
-                with open(self.current_file, 'r', encoding='utf-8', errors='ignore') as file:
-                    self.log_content = file.readlines()
-                    self.last_file_position = file.tell()
-                
-                self.statusBar().showMessage(f"File loaded: {os.path.basename(self.current_file)} - {len(self.log_content)} lines")
-                self.setWindowTitle(f"LogInsight v{self.VERSION} - {self.current_file}")
+            last_files = [path for path in config.get("last_files", []) if os.path.exists(path)]
+            if len(last_files) > 1:
+                # Several files were merged, tail mode does not apply to them
+                self.load_log_files(last_files)
+                if (self.include_entry.text().strip() or 
+                    self.exclude_entry.text().strip() or 
+                    self.start_time_entry.text().strip() or 
+                    self.end_time_entry.text().strip() or
+                    self.level_bar.selected_levels() is not None):
+                    self.search_log()
+                else:
+                    self.show_all_lines()
+            elif "last_file" in config and config["last_file"] and os.path.exists(config["last_file"]):
+                self.load_log_file(config["last_file"])
                 
                 # Apply filters if any filter conditions exist
                 if (self.include_entry.text().strip() or 
                     self.exclude_entry.text().strip() or 
                     self.start_time_entry.text().strip() or 
-                    self.end_time_entry.text().strip()):
-                    result_text, match_count = self.filter_log_content(self.log_content)
-                    if match_count == 0:
-                        self.result_text.setText("No matching results found.\n")
-                    else:
-                        self.result_text.setText(result_text)
-                        self.statusBar().showMessage(f"Found {match_count} matches")
+                    self.end_time_entry.text().strip() or
+                    self.level_bar.selected_levels() is not None):
+                    self.search_log()
                 else:
                     # If no filters, show all content
-                    self.result_text.setText("".join(self.log_content))
+                    self.result_model.set_lines(self.log_file, range(len(self.log_file)))
                 
                 # Then restore tail log button state only if we have a valid file
                 if "tail_log_checked" in config:
-                    print(f"Restoring tail log button state: {config['tail_log_checked']}")
+                    tracer.instant(f"Restoring tail log button state: {config['tail_log_checked']}")
                     # Temporarily disconnect the toggled signal to avoid triggering the toggle_tail_log function
                     self.tail_log_btn.toggled.disconnect(self.toggle_tail_log)
                     self.tail_log_btn.setChecked(config["tail_log_checked"])
                     # Reconnect the toggled signal
                     self.tail_log_btn.toggled.connect(self.toggle_tail_log)
                     
-                    # add file to watcher if tail mode is enabled
+                    # Follow the file if tail mode is enabled
                     if self.tail_log_btn.isChecked():
-                        if self.current_file not in self.file_watcher.files():
-                            self.file_watcher.addPath(self.current_file)
+                        self.start_tailing()
             else:
                 # No valid file exists, ensure tail log is off
                 if "tail_log_checked" in config:
-                    print("No valid file exists, setting tail log button to unchecked")
+                    tracer.instant("No valid file exists, setting tail log button to unchecked")
                     self.tail_log_btn.setChecked(False)
                 
         except Exception as e:
@@ -1388,9 +2022,18 @@ class LogInsight(QMainWindow):
             "end_time": self.end_time_entry.text(),
             "include_case_sensitive": self.include_case_sensitive.isChecked(),
             "exclude_case_sensitive": self.exclude_case_sensitive.isChecked(),
+            "include_regex": self.include_regex.isChecked(),
+            "exclude_regex": self.exclude_regex.isChecked(),
+            "hidden_levels": self.level_bar.hidden_levels(),
             "word_wrap": self.word_wrap_btn.isChecked(),
             "font_size": self.current_font_size,
+            "filter_workers": self.filter_workers,
+            "filter_chunk_size": self.filter_chunk_size,
+            "index_cache": self.index_cache,
+            "trigram_index": self.trigram_index,
+            "tail_max_lines": self.tail_max_lines,
             "last_file": self.current_file if self.current_file else "",
+            "last_files": self.current_files,
             "theme": self.theme_toggle_btn.isChecked(),  # Add theme configuration
             "filter_collapsed": self.filter_collapsed,  # Save filter collapse state
             "button_collapsed": self.button_collapsed,  # Save button area collapse state
@@ -1411,6 +2054,18 @@ class LogInsight(QMainWindow):
             event: Close event
         """
         self.save_config()
+        # Stop searches, tailing and the index build before their worker processes go away
+        self.stop_search_workers(wait=True)
+        self.stop_text_search_workers(wait=True)
+        self.stop_tailing()
+        self.stop_index_workers(wait=True)
+        self.stop_timeline_workers(wait=True)
+        # Close the current file once nothing reads it any more, persisting its index
+        if self.log_file:
+            self.log_file.close()
+            self.log_file = None
+        # Stop filter worker processes
+        LogFilter.shutdown_executor()
         # Accept the close event
         event.accept()
 
@@ -1428,22 +2083,18 @@ class LogInsight(QMainWindow):
     
     @override
     def dropEvent(self, event: QDropEvent) -> None:
-        """Handle drop event, open dropped file
+        """Handle drop event, open dropped files, several of them as one merged view
         
         Args:
             event: Drop event object
         """
-        # Get list of dropped file URLs
-        urls = event.mimeData().urls()
+        # Get local paths of the dropped files
+        file_paths = [url.toLocalFile() for url in event.mimeData().urls()]
         
-        # If files were dropped
-        if urls:
-            # Get local path of first file (only process first file)
-            file_path = urls[0].toLocalFile()
-            
-            # If it's a valid file path, open the file
-            if file_path and os.path.isfile(file_path):
-                self.open_log_file(file_path)  # Use open_log_file instead of duplicating code
+        # Open the valid file paths
+        file_paths = [file_path for file_path in file_paths if file_path and os.path.isfile(file_path)]
+        if file_paths:
+            self.open_log_files(file_paths)
                 
 
     def show_help_dialog(self) -> None:
@@ -1475,6 +2126,8 @@ class LogInsight(QMainWindow):
         help_dialog.exec()
 
 if __name__ == "__main__":
+    # Required for filter worker processes in frozen executables
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = LogInsight()
     window.showMaximized()  
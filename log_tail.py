@@ -0,0 +1,353 @@
+# Tail pipeline for Log Insight
+# Kept free of Qt imports, results are handed to callbacks from the pipeline threads
+
+import os
+import queue
+import threading
+import time
+from array import array
+from itertools import count
+from typing import Callable, Optional, Tuple, Union
+
+from log_file import LogFile
+from log_filter import FilterQuery, LogFilter, Matcher
+from perf_trace import tracer
+
+# Anything with line(index) -> str and len(), such as a LogFile
+LineSource = Union[LogFile, 'RotatedLogLines']
+
+# Callback receiving the query generation, the ids of matching appended lines
+# and the line after the last filtered one
+TailResultCallback = Callable[[int, array, int], None]
+
+
+class LogTailer:
+    """Follows a growing log file and filters the appended lines
+
+    Two threads form a pipeline. The reader thread waits for change
+    notifications, coalescing any that arrive while it is busy, and extends
+    the line index of the log file through its persistent file handle in
+    steps of at most READ_CHUNK_SIZE bytes. After every step it queues the
+    new number of complete lines. The filter thread takes these marks off the
+    queue and filters every line up to the latest one. The queue is bounded,
+    so a reader that gets ahead of the filter waits instead of indexing
+    without limit.
+
+    The filter thread keeps its own position and always continues exactly
+    where it stopped, so no line is skipped however the events are batched.
+    Results are tagged with the generation of the query, which changes with
+    every set_query call, so that callers can drop results of replaced
+    queries.
+
+    Change notifications are optional. The reader also polls the file, often
+    while it grows and backing off to MAX_POLL_INTERVAL while it is idle, so
+    tailing keeps working on file systems without change events. Rotation is
+    detected by the device and inode behind the path. The old file is drained
+    until it stayed idle for ROTATION_IDLE_TIME and all of its lines are
+    filtered, only then the owner is told to follow the new file.
+    """
+
+    # Maximum number of bytes indexed per reader step
+    READ_CHUNK_SIZE: int = 4 * 1024 * 1024
+
+    # Maximum number of reader steps the filter thread may fall behind
+    QUEUE_SIZE: int = 4
+
+    # Maximum number of lines filtered per result callback
+    FILTER_BATCH_LINES: int = 65536
+
+    # Seconds between checks for new data while the file keeps growing
+    MIN_POLL_INTERVAL: float = 0.1
+
+    # Longest interval the checks back off to while the file is idle
+    MAX_POLL_INTERVAL: float = 2.0
+
+    # Seconds a rotated file has to stay idle before its successor is followed
+    ROTATION_IDLE_TIME: float = 1.0
+
+    # Bytes at the end of the indexed data that are checked before every step
+    SAMPLE_SIZE: int = 256
+
+    # Query generations, unique across tailers so results of a stopped one never pass as current
+    _generations = count(1)
+
+    def __init__(self, log_file: LogFile, on_results: TailResultCallback,
+                 on_truncated: Callable[[], None], on_rotated: Callable[[], None],
+                 on_error: Optional[Callable[[str], None]] = None) -> None:
+        """Set up the pipeline, start() runs it
+
+        Args:
+            log_file: Log file to follow, its index is extended by the reader thread
+            on_results: Callback receiving the matches of each filtered batch
+            on_truncated: Callback run once if the file was truncated, the
+                pipeline stops then, as resetting the index must not race with readers
+            on_rotated: Callback run once the file was replaced by a new one at
+                the same path and every line of the old one was filtered, the
+                pipeline stops then
+            on_error: Callback receiving the message of an error in a pipeline
+                thread, which keeps running. Errors are recorded with the tracer as well
+        """
+        self.log_file: LogFile = log_file
+        self.on_results: TailResultCallback = on_results
+        self.on_truncated: Callable[[], None] = on_truncated
+        self.on_rotated: Callable[[], None] = on_rotated
+        self.on_error: Optional[Callable[[str], None]] = on_error
+        self.poll_interval: float = self.MIN_POLL_INTERVAL
+        # Device and inode of the followed file
+        self.identity: Tuple[int, int] = log_file.file_identity()
+        # Set once the path leads to another file
+        self.rotated: bool = False
+        # Changed by every set_query call
+        self.generation: int = 0
+        self.query: Optional[FilterQuery] = None
+        self.include_matcher: Optional[Matcher] = None
+        self.exclude_matcher: Optional[Matcher] = None
+        # First line the filter thread has not handled yet
+        self.next_line: int = 0
+        # Number of complete lines announced by the reader thread
+        self.end_line: int = log_file.complete_line_count
+        # Copy of the last indexed bytes and the offset they end at, see _data_unchanged
+        self._sample_end: int = log_file.size
+        self._sample: bytes = log_file.read_from_disk(max(0, self._sample_end - self.SAMPLE_SIZE), self._sample_end)
+        self._last_growth: float = time.monotonic()
+        # Set by the reader thread once a rotated file is completely indexed
+        self._drained: bool = False
+        self._lock = threading.Lock()
+        self._changed = threading.Event()
+        self._stopped = threading.Event()
+        self._marks: queue.Queue = queue.Queue(self.QUEUE_SIZE)
+        self._reader = threading.Thread(target=self._read_loop, name="LogTailReader", daemon=True)
+        self._filter = threading.Thread(target=self._filter_loop, name="LogTailFilter", daemon=True)
+
+    def start(self, query: Optional[FilterQuery], first_line: int) -> int:
+        """Start following the file
+
+        Args:
+            query: Filter conditions for the appended lines, None to hold off filtering
+            first_line: First line to filter
+
+        Returns:
+            Generation of the query
+        """
+        generation = self.set_query(query, first_line)
+        self._reader.start()
+        self._filter.start()
+        self.notify()
+        return generation
+
+    def notify(self) -> None:
+        """Signal that the file may have changed, repeated calls are coalesced"""
+        self._changed.set()
+
+    def set_query(self, query: Optional[FilterQuery], first_line: int) -> int:
+        """Filter from a given line on with new conditions
+
+        Results of the previous query that are still in flight are tagged with
+        the previous generation.
+
+        Args:
+            query: Filter conditions, None to hold off filtering
+            first_line: First line to filter with the new conditions
+
+        Returns:
+            Generation of the new query
+        """
+        include_matcher = query.include_matcher() if query else None
+        exclude_matcher = query.exclude_matcher() if query else None
+        with self._lock:
+            self.generation = next(self._generations)
+            self.query = query
+            self.include_matcher = include_matcher
+            self.exclude_matcher = exclude_matcher
+            self.next_line = first_line
+            generation = self.generation
+        self._wake_filter()
+        return generation
+
+    def stop(self, wait: bool = True) -> None:
+        """Stop both threads
+
+        Args:
+            wait: Whether to block until the threads have stopped
+        """
+        self._stopped.set()
+        self._changed.set()
+        self._wake_filter()
+        if wait:
+            for thread in (self._reader, self._filter):
+                if thread.is_alive() and thread is not threading.current_thread():
+                    thread.join()
+
+    @property
+    def stopped(self) -> bool:
+        return self._stopped.is_set()
+
+    def _report_error(self, message: str) -> None:
+        tracer.instant(message, path=self.log_file.path)
+        if self.on_error is not None:
+            self.on_error(message)
+
+    def _wake_filter(self) -> None:
+        """Let the filter thread look at its position again without a new mark"""
+        try:
+            self._marks.put_nowait(None)
+        except queue.Full:
+            # The filter thread has marks to take anyway
+            pass
+
+    def _read_loop(self) -> None:
+        """Index appended data whenever a change is notified or the poll interval passed"""
+        while not self._stopped.is_set():
+            notified = self._changed.wait(self.poll_interval)
+            self._changed.clear()
+            if self._stopped.is_set():
+                break
+            try:
+                grown = self._read_new_data()
+            except (OSError, ValueError) as e:
+                self._report_error(f"Error reading appended log data: {str(e)}")
+                grown = False
+            if self._drained:
+                break
+
+            # Poll often while data flows or a rotation is pending, back off while idle
+            if grown or self.rotated:
+                self.poll_interval = self.MIN_POLL_INTERVAL
+            elif not notified:
+                self.poll_interval = min(self.poll_interval * 2, self.MAX_POLL_INTERVAL)
+
+    def _read_new_data(self) -> bool:
+        """Index everything appended so far, one bounded step at a time
+
+        Returns:
+            True if new data was indexed
+        """
+        log_file = self.log_file
+        start_size = log_file.size
+        while not self._stopped.is_set():
+            if not self._data_unchanged() or not log_file.grow(self.READ_CHUNK_SIZE):
+                self._stopped.set()
+                self._wake_filter()
+                self.on_truncated()
+                break
+            if log_file.complete_line_count > self.end_line:
+                self._put_mark(log_file.complete_line_count)
+            # Searches grow the index as well, so remember where the sample was taken
+            self._sample_end = log_file.size
+            self._sample = log_file.read_from_disk(max(0, self._sample_end - self.SAMPLE_SIZE), self._sample_end)
+            if log_file.size < log_file.file_size():
+                continue
+
+            if log_file.size > start_size:
+                self._last_growth = time.monotonic()
+            if not self.rotated:
+                self.rotated = self._path_replaced()
+            if self.rotated and time.monotonic() - self._last_growth >= self.ROTATION_IDLE_TIME:
+                # The old file is complete, so its last line counts even without a line break
+                self._put_mark(len(log_file))
+                self._drained = True
+                self._wake_filter()
+            break
+        return log_file.size > start_size
+
+    def _data_unchanged(self) -> bool:
+        """Check that the end of the indexed data is still in place
+
+        A file truncated in place, as logrotate's copytruncate does, can grow
+        past its previous size again before the truncation is noticed.
+        """
+        if not self._sample:
+            return True
+        return self.log_file.read_from_disk(self._sample_end - len(self._sample), self._sample_end) == self._sample
+
+    def _path_replaced(self) -> bool:
+        """Check whether the path leads to another file than the followed one"""
+        try:
+            stat = os.stat(self.log_file.path)
+        except FileNotFoundError:
+            # Renamed away and not created again yet, keep following the old file
+            return False
+        return (stat.st_dev, stat.st_ino) != self.identity
+
+    def _put_mark(self, end_line: int) -> None:
+        """Queue a mark, waiting while the filter thread is too far behind"""
+        while not self._stopped.is_set():
+            try:
+                self._marks.put(end_line, timeout=0.1)
+                tracer.gauge("tail.queue", self._marks.qsize())
+                return
+            except queue.Full:
+                continue
+
+    def _filter_loop(self) -> None:
+        """Filter the lines announced by the reader thread in file order"""
+        while not self._stopped.is_set():
+            mark = self._marks.get()
+            # Take every mark queued meanwhile and filter up to the latest one in one go
+            while True:
+                if mark is not None:
+                    self.end_line = max(self.end_line, mark)
+                try:
+                    mark = self._marks.get_nowait()
+                except queue.Empty:
+                    break
+            try:
+                self._filter_new_lines()
+            except Exception as e:
+                self._report_error(f"Error filtering appended log lines: {str(e)}")
+            if self._drained and (self.query is None or self.next_line >= self.end_line):
+                # Every line of the rotated file was handed over
+                self._stopped.set()
+                self._changed.set()
+                self.on_rotated()
+
+    def _filter_new_lines(self) -> None:
+        """Filter from the current position up to the latest mark in bounded batches"""
+        while not self._stopped.is_set():
+            with self._lock:
+                generation = self.generation
+                query = self.query
+                include_matcher = self.include_matcher
+                exclude_matcher = self.exclude_matcher
+                first_line = self.next_line
+            end_line = min(self.end_line, first_line + self.FILTER_BATCH_LINES)
+            tracer.gauge("tail.backlog", self.end_line - first_line)
+            if query is None or first_line >= end_line:
+                return
+
+            line_ids = LogFilter.filter_line_range(self.log_file, first_line, end_line,
+                                                   include_matcher, exclude_matcher,
+                                                   query.start_ms, query.end_ms, query.levels)
+            if line_ids is None:
+                # The lines could not be read completely, keep the position so that they are not skipped
+                return
+            with self._lock:
+                if generation != self.generation:
+                    # Replaced meanwhile, continue from the position of the new query
+                    continue
+                self.next_line = end_line
+            self.on_results(generation, line_ids, end_line)
+
+
+class RotatedLogLines:
+    """Line source spanning a rotated log file and the file that replaced it
+
+    Keeps lines shown from the rotated file readable in the result view
+    while the new file is followed. Ids below base_line address the lines
+    of the rotated source, later ids the lines of the current file shifted
+    by base_line. Repeated rotations nest.
+    """
+
+    def __init__(self, rotated: LineSource, current: LogFile) -> None:
+        self.rotated: LineSource = rotated
+        self.current: LogFile = current
+        self.base_line: int = len(rotated)
+
+    def __len__(self) -> int:
+        return self.base_line + len(self.current)
+
+    def line(self, index: int) -> str:
+        """Get a decoded line, including its line break"""
+        if index < self.base_line:
+            return self.rotated.line(index)
+        return self.current.line(index - self.base_line)
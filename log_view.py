@@ -0,0 +1,599 @@
+# Virtualized result view for Log Insight
+
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from PyQt6.QtWidgets import QAbstractScrollArea, QApplication
+from PyQt6.QtGui import (QColor, QFont, QKeyEvent, QKeySequence, QMouseEvent, QPainter, QPaintEvent,
+                         QPalette, QResizeEvent, QTextCharFormat, QTextLayout, QTextOption)
+from PyQt6.QtCore import QAbstractListModel, QEvent, QModelIndex, QPointF, QRect, QRectF, Qt
+
+from perf_trace import tracer
+from text_search import SearchMatches
+
+# Position of a character in the view, as (row, column)
+TextPosition = Tuple[int, int]
+
+# Column used to address the end of a row without fetching its text
+END_OF_ROW: int = 2 ** 31 - 1
+
+
+class LogResultModel(QAbstractListModel):
+    """List model over the ids of the log lines shown in the result view
+
+    Rows only hold line ids. The text of a row is fetched from the log source
+    when the row is displayed, so the model costs a few bytes per row.
+
+    Rows can be dropped from the front, such as the oldest tailed lines once
+    a cap is reached. The array of ids is used as a ring buffer: dropped ids
+    are only skipped and compacted away once they make up half of the array,
+    so dropping rows costs no copy per call.
+    """
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        # Any object providing line(index) -> str, such as a LogFile
+        self.source = None
+        # Either a range (all lines shown) or an array of line ids
+        self.line_ids: Sequence[int] = range(0)
+        # Ids at the start of line_ids that were dropped but not compacted away yet
+        self.first_row: int = 0
+        # Rows dropped from the front since the rows were last replaced
+        self.dropped_rows: int = 0
+
+    def set_lines(self, source, line_ids: Sequence[int]) -> None:
+        """Replace the displayed rows
+
+        Args:
+            source: Object providing the text of the lines
+            line_ids: Ids of the lines to show, a range or an array
+        """
+        self.beginResetModel()
+        self.source = source
+        self.line_ids = line_ids
+        self.first_row = 0
+        self.dropped_rows = 0
+        self.endResetModel()
+
+    def set_source(self, source) -> None:
+        """Replace the line source without touching the rows
+
+        Args:
+            source: Object providing the same text for the ids of the current rows
+        """
+        self.source = source
+
+    def append_lines(self, line_ids: Sequence[int]) -> None:
+        """Append rows at the end of the model
+
+        Args:
+            line_ids: Ids of the lines to append, in ascending order
+        """
+        if not line_ids:
+            return
+        first_row = self.rowCount()
+        self.beginInsertRows(QModelIndex(), first_row, first_row + len(line_ids) - 1)
+        if (isinstance(self.line_ids, range) and line_ids[0] == self.line_ids.stop
+                and line_ids[-1] == self.line_ids.stop + len(line_ids) - 1):
+            # Contiguous lines, keep the compact range representation
+            self.line_ids = range(self.line_ids.start, line_ids[-1] + 1)
+        else:
+            if not isinstance(self.line_ids, array):
+                self.line_ids = array('Q', self.line_ids)
+            self.line_ids.extend(line_ids)
+        self.endInsertRows()
+
+    def drop_first_rows(self, count: int) -> None:
+        """Remove rows from the start of the model
+
+        Args:
+            count: Number of rows to remove
+        """
+        count = min(count, self.rowCount())
+        if count <= 0:
+            return
+        self.beginRemoveRows(QModelIndex(), 0, count - 1)
+        if isinstance(self.line_ids, range):
+            self.line_ids = self.line_ids[count:]
+        else:
+            self.first_row += count
+            if self.first_row * 2 >= len(self.line_ids):
+                del self.line_ids[:self.first_row]
+                self.first_row = 0
+        self.dropped_rows += count
+        self.endRemoveRows()
+
+    def clear(self) -> None:
+        """Remove all rows"""
+        self.set_lines(None, range(0))
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self.line_ids) - self.first_row
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or role != Qt.ItemDataRole.DisplayRole:
+            return None
+        return self.line_text(index.row())
+
+    def line_id(self, row: int) -> int:
+        """Get the id of the log line shown in a row"""
+        return self.line_ids[self.first_row + row]
+
+    def line_text(self, row: int) -> str:
+        """Get the text shown in a row, without its line break"""
+        return self.source.line(self.line_ids[self.first_row + row]).rstrip('\r\n')
+
+
+class LogView(QAbstractScrollArea):
+    """Scroll area painting only the visible rows of a LogResultModel
+
+    The vertical scroll bar counts rows rather than pixels, so the cost of
+    scrolling, resizing, zooming and toggling word wrap depends on the number
+    of visible rows only, not on the size of the result.
+    """
+
+    # Horizontal padding around the text, in pixels
+    TEXT_MARGIN: int = 4
+
+    # Matches highlighted per row at most, a long row can hold many thousands
+    MAX_ROW_HIGHLIGHTS: int = 1000
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.model: Optional[LogResultModel] = None
+        self.word_wrap: bool = True
+        # Laid out rows of the last paint, keyed by row
+        self._layouts: Dict[int, Tuple[QTextLayout, float]] = {}
+        # Widest unwrapped row seen so far, for the horizontal scroll bar
+        self._max_row_width: float = 0
+        # Selection anchor and cursor, equal when nothing is selected
+        self._anchor: TextPosition = (0, 0)
+        self._cursor: TextPosition = (0, 0)
+        # Highlighted text search matches, looked up by row while painting
+        self._matches: Optional[SearchMatches] = None
+        # Vertical extent of the rows painted with highlights, as (top, height)
+        self._highlighted_rows: List[Tuple[float, float]] = []
+        self.highlight_format = QTextCharFormat()
+        self.highlight_format.setBackground(Qt.GlobalColor.yellow)
+        self.highlight_format.setForeground(Qt.GlobalColor.black)
+        # Message shown when there are no rows
+        self._placeholder: str = ""
+        self._placeholder_color: Optional[QColor] = None
+        self._placeholder_size: int = 0
+        self._placeholder_centered: bool = False
+
+        self.setFocusPolicy(Qt.FocusPolicy.StrongFocus)
+        self.viewport().setCursor(Qt.CursorShape.IBeamCursor)
+        self.verticalScrollBar().setSingleStep(1)
+        self.verticalScrollBar().valueChanged.connect(self.viewport().update)
+        self.horizontalScrollBar().valueChanged.connect(self.viewport().update)
+
+    def set_model(self, model: LogResultModel) -> None:
+        """Attach the model providing the rows"""
+        self.model = model
+        model.modelReset.connect(self._on_model_reset)
+        model.rowsInserted.connect(self._on_rows_changed)
+        model.rowsRemoved.connect(self._on_rows_removed)
+        self._on_model_reset()
+
+    def row_count(self) -> int:
+        return self.model.rowCount() if self.model else 0
+
+    def _on_model_reset(self) -> None:
+        self._layouts.clear()
+        self._max_row_width = 0
+        self._anchor = self._cursor = (0, 0)
+        self._matches = None
+        self.verticalScrollBar().setValue(0)
+        self.horizontalScrollBar().setValue(0)
+        self._update_scroll_bars()
+        self.viewport().update()
+
+    def _on_rows_changed(self) -> None:
+        self._layouts.clear()
+        self._update_scroll_bars()
+        self.viewport().update()
+
+    def _on_rows_removed(self, parent: QModelIndex, first: int, last: int) -> None:
+        """Keep showing the same rows when rows before them were removed"""
+        count = last - first + 1
+        if first == 0:
+            def shift(position: TextPosition) -> TextPosition:
+                row, column = position
+                return (row - count, column) if row >= count else (0, 0)
+            self._anchor = shift(self._anchor)
+            self._cursor = shift(self._cursor)
+            top = max(0, self.verticalScrollBar().value() - count)
+            self._on_rows_changed()
+            self.verticalScrollBar().setValue(top)
+        else:
+            self._on_rows_changed()
+
+    def set_placeholder(self, text: str, color: Optional[QColor] = None,
+                        point_size: int = 0, centered: bool = False) -> None:
+        """Set the message painted while the view has no rows
+
+        Args:
+            text: Message text
+            color: Text color, defaults to the palette text color
+            point_size: Font size in points, defaults to the view font size
+            centered: Whether to paint the message bold in the middle of the view
+        """
+        self._placeholder = text
+        self._placeholder_color = color
+        self._placeholder_size = point_size
+        self._placeholder_centered = centered
+        self.viewport().update()
+
+    def set_word_wrap(self, enabled: bool) -> None:
+        """Enable or disable wrapping long rows at the view width"""
+        self.word_wrap = enabled
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff if enabled
+                                          else Qt.ScrollBarPolicy.ScrollBarAsNeeded)
+        self._invalidate_layouts()
+
+    def set_matches(self, matches: Optional[SearchMatches]) -> None:
+        """Set the text search matches painted with the highlight format
+
+        Only the matches of the painted rows are looked up, by bisection, so
+        the number of matches does not matter. The owner of the matches
+        drops their rows along with the rows of the model.
+
+        Args:
+            matches: Matches to highlight, None to remove the highlights
+        """
+        if matches is None:
+            # Only the rows painted with highlights need a repaint
+            if self._matches is not None:
+                width = self.viewport().width()
+                for top, height in self._highlighted_rows:
+                    self.viewport().update(QRect(0, int(top), width, int(height) + 2))
+            self._matches = None
+            self._highlighted_rows = []
+            return
+        self._matches = matches
+        self.viewport().update()
+
+    def _invalidate_layouts(self) -> None:
+        self._layouts.clear()
+        self._max_row_width = 0
+        self._update_scroll_bars()
+        self.viewport().update()
+
+    def _text_width(self) -> float:
+        return max(1, self.viewport().width() - 2 * self.TEXT_MARGIN)
+
+    def _create_layout(self, row: int) -> Tuple[QTextLayout, float]:
+        """Lay out the text of a row, returning the layout and its height"""
+        layout = QTextLayout(self.model.line_text(row), self.font())
+        option = QTextOption()
+        option.setWrapMode(QTextOption.WrapMode.WrapAtWordBoundaryOrAnywhere if self.word_wrap
+                           else QTextOption.WrapMode.NoWrap)
+        layout.setTextOption(option)
+
+        width = self._text_width()
+        height = 0.0
+        layout.beginLayout()
+        while True:
+            line = layout.createLine()
+            if not line.isValid():
+                break
+            line.setLineWidth(width)
+            line.setPosition(QPointF(0, height))
+            height += line.height()
+            if not self.word_wrap:
+                self._max_row_width = max(self._max_row_width, line.naturalTextWidth())
+        layout.endLayout()
+
+        if height == 0:
+            # Empty row still takes one line
+            height = float(self.fontMetrics().height())
+        return layout, height
+
+    def _layout(self, row: int) -> Tuple[QTextLayout, float]:
+        entry = self._layouts.get(row)
+        if entry is None:
+            entry = self._create_layout(row)
+            self._layouts[row] = entry
+        return entry
+
+    def _update_scroll_bars(self) -> None:
+        """Update scroll bar ranges so that the last row can be scrolled into view"""
+        count = self.row_count()
+        viewport_height = self.viewport().height()
+
+        # Find the first row of the last page by walking back from the end
+        last_top = count
+        used = 0.0
+        while last_top > 0:
+            used += self._layout(last_top - 1)[1]
+            if used > viewport_height:
+                break
+            last_top -= 1
+        if last_top == count:
+            last_top = max(0, count - 1)
+
+        vertical = self.verticalScrollBar()
+        vertical.setRange(0, last_top)
+        vertical.setPageStep(max(1, count - last_top))
+
+        horizontal = self.horizontalScrollBar()
+        if self.word_wrap:
+            horizontal.setRange(0, 0)
+        else:
+            horizontal.setRange(0, max(0, int(self._max_row_width - self._text_width())))
+            horizontal.setPageStep(int(self._text_width()))
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self.viewport())
+        palette = self.palette()
+        painter.setPen(palette.color(QPalette.ColorRole.Text))
+
+        if self.row_count() == 0:
+            self._paint_placeholder(painter)
+            return
+
+        selection_format = QTextCharFormat()
+        selection_format.setBackground(palette.color(QPalette.ColorRole.Highlight))
+        selection_format.setForeground(palette.color(QPalette.ColorRole.HighlightedText))
+        selection_start, selection_end = self.selection_range()
+
+        x = self.TEXT_MARGIN - self.horizontalScrollBar().value()
+        y = 0.0
+        row = self.verticalScrollBar().value()
+        count = self.row_count()
+        height = self.viewport().height()
+        exposed = event.rect()
+        used_layouts: Dict[int, Tuple[QTextLayout, float]] = {}
+        highlighted_rows: List[Tuple[float, float]] = []
+        matches = self._matches
+        match_count = len(matches) if matches is not None else 0
+        # Matches are sorted by row, the ones of the painted rows follow each other
+        match_index = matches.index_of_row(row) if match_count else 0
+
+        with tracer.span("render", first_row=row):
+            while row < count and y < height:
+                layout, row_height = self._layout(row)
+                used_layouts[row] = (layout, row_height)
+
+                formats = []
+                while match_index < match_count:
+                    match_row, column = matches[match_index]
+                    if match_row != row:
+                        break
+                    if len(formats) == self.MAX_ROW_HIGHLIGHTS:
+                        match_index = matches.index_of_row(row + 1)
+                        break
+                    formats.append(self._format_range(column, matches.length, self.highlight_format))
+                    match_index += 1
+                if formats:
+                    highlighted_rows.append((y, row_height))
+                if selection_start[0] <= row <= selection_end[0] and selection_start != selection_end:
+                    start = selection_start[1] if row == selection_start[0] else 0
+                    end = selection_end[1] if row == selection_end[0] else END_OF_ROW
+                    formats.append(self._format_range(start, end - start, selection_format))
+
+                # Rows outside the repainted area keep their pixels
+                if y + row_height > exposed.top() and y < exposed.bottom() + 1:
+                    layout.draw(painter, QPointF(x, y), formats)
+                y += row_height
+                row += 1
+
+        # Keep only the layouts of the visible rows
+        self._layouts = used_layouts
+        self._highlighted_rows = highlighted_rows
+
+    @staticmethod
+    def _format_range(start: int, length: int, text_format: QTextCharFormat) -> QTextLayout.FormatRange:
+        format_range = QTextLayout.FormatRange()
+        format_range.start = start
+        format_range.length = length
+        format_range.format = text_format
+        return format_range
+
+    def _paint_placeholder(self, painter: QPainter) -> None:
+        if not self._placeholder:
+            return
+        font = QFont(self.font())
+        if self._placeholder_size:
+            font.setPointSize(self._placeholder_size)
+        if self._placeholder_color is not None:
+            painter.setPen(self._placeholder_color)
+        rect = QRectF(self.viewport().rect()).adjusted(self.TEXT_MARGIN, 0, -self.TEXT_MARGIN, 0)
+        if self._placeholder_centered:
+            font.setBold(True)
+            flags = Qt.AlignmentFlag.AlignCenter
+        else:
+            flags = Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop
+        painter.setFont(font)
+        painter.drawText(rect, flags.value | Qt.TextFlag.TextWordWrap.value, self._placeholder)
+
+    def first_visible_row(self) -> int:
+        return self.verticalScrollBar().value()
+
+    def last_visible_row(self) -> int:
+        """Get the last row that is at least partially visible"""
+        row = self.first_visible_row()
+        count = self.row_count()
+        y = 0.0
+        while row < count - 1:
+            y += self._layout(row)[1]
+            if y >= self.viewport().height():
+                break
+            row += 1
+        return row
+
+    def position_at(self, x: float, y: float) -> TextPosition:
+        """Get the row and column under a point of the viewport"""
+        count = self.row_count()
+        if count == 0:
+            return (0, 0)
+        row = self.first_visible_row()
+        if y < 0:
+            return (row, 0)
+
+        top = 0.0
+        while True:
+            layout, row_height = self._layout(row)
+            if y < top + row_height or row == count - 1:
+                break
+            top += row_height
+            row += 1
+
+        text_x = x - self.TEXT_MARGIN + self.horizontalScrollBar().value()
+        text_y = y - top
+        for index in range(layout.lineCount()):
+            line = layout.lineAt(index)
+            if text_y < line.y() + line.height() or index == layout.lineCount() - 1:
+                return (row, line.xToCursor(text_x))
+        return (row, 0)
+
+    def ensure_row_visible(self, row: int) -> None:
+        """Scroll the minimum amount needed to show a row completely"""
+        vertical = self.verticalScrollBar()
+        if row < vertical.value():
+            vertical.setValue(row)
+            return
+
+        # Nothing to do if the row already ends inside the viewport
+        bottom = 0.0
+        for visible_row in range(vertical.value(), row + 1):
+            bottom += self._layout(visible_row)[1]
+            if bottom > self.viewport().height():
+                break
+        else:
+            return
+
+        # Put the row at the bottom of the viewport
+        top = row
+        used = self._layout(row)[1]
+        while top > 0:
+            height = self._layout(top - 1)[1]
+            if used + height > self.viewport().height():
+                break
+            used += height
+            top -= 1
+        vertical.setValue(top)
+
+    def ensure_column_visible(self, row: int, column: int) -> None:
+        """Scroll horizontally so that a column of an unwrapped row is visible"""
+        if self.word_wrap:
+            return
+        layout = self._layout(row)[0]
+        if layout.lineCount() == 0:
+            return
+        x = layout.lineAt(0).cursorToX(column)[0]
+        horizontal = self.horizontalScrollBar()
+        if x < horizontal.value() or x > horizontal.value() + self._text_width():
+            horizontal.setValue(int(max(0, x - self._text_width() / 2)))
+
+    def scroll_to_top(self) -> None:
+        self.verticalScrollBar().setValue(0)
+
+    def scroll_to_bottom(self) -> None:
+        self.verticalScrollBar().setValue(self.verticalScrollBar().maximum())
+
+    def is_at_bottom(self) -> bool:
+        """Check whether the last row is scrolled into view"""
+        return self.verticalScrollBar().value() >= self.verticalScrollBar().maximum()
+
+    def resizeEvent(self, event: QResizeEvent) -> None:
+        super().resizeEvent(event)
+        if self.word_wrap and event.size().width() != event.oldSize().width():
+            self._layouts.clear()
+        self._update_scroll_bars()
+
+    def changeEvent(self, event: QEvent) -> None:
+        super().changeEvent(event)
+        if event.type() == QEvent.Type.FontChange:
+            self._invalidate_layouts()
+
+    def selection_range(self) -> Tuple[TextPosition, TextPosition]:
+        """Get the selection as ordered (start, end) positions"""
+        return min(self._anchor, self._cursor), max(self._anchor, self._cursor)
+
+    def has_selection(self) -> bool:
+        return self._anchor != self._cursor
+
+    def set_selection(self, anchor: TextPosition, cursor: TextPosition) -> None:
+        """Select the text between two positions"""
+        self._anchor = anchor
+        self._cursor = cursor
+        self.viewport().update()
+
+    def select_all(self) -> None:
+        count = self.row_count()
+        if count:
+            self.set_selection((0, 0), (count - 1, END_OF_ROW))
+
+    def selected_text(self) -> str:
+        """Get the selected text, fetching the selected rows from the model"""
+        if not self.has_selection():
+            return ""
+        (start_row, start_column), (end_row, end_column) = self.selection_range()
+        if start_row == end_row:
+            return self.model.line_text(start_row)[start_column:end_column]
+
+        with tracer.span("join", rows=end_row - start_row + 1):
+            parts = [self.model.line_text(start_row)[start_column:]]
+            for row in range(start_row + 1, end_row):
+                parts.append(self.model.line_text(row))
+            parts.append(self.model.line_text(end_row)[:end_column])
+            return "\n".join(parts)
+
+    def copy_selection(self) -> None:
+        """Copy the selected text to the clipboard"""
+        text = self.selected_text()
+        if text:
+            QApplication.clipboard().setText(text)
+
+    def mousePressEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MouseButton.LeftButton:
+            position = self.position_at(event.position().x(), event.position().y())
+            if event.modifiers() & Qt.KeyboardModifier.ShiftModifier:
+                self.set_selection(self._anchor, position)
+            else:
+                self.set_selection(position, position)
+        super().mousePressEvent(event)
+
+    def mouseMoveEvent(self, event: QMouseEvent) -> None:
+        if event.buttons() & Qt.MouseButton.LeftButton:
+            y = event.position().y()
+            # Scroll while dragging outside of the viewport
+            if y < 0:
+                self.verticalScrollBar().setValue(self.verticalScrollBar().value() - 1)
+            elif y > self.viewport().height():
+                self.verticalScrollBar().setValue(self.verticalScrollBar().value() + 1)
+            self.set_selection(self._anchor, self.position_at(event.position().x(), y))
+        super().mouseMoveEvent(event)
+
+    def mouseDoubleClickEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MouseButton.LeftButton and self.row_count():
+            # Select the whole row
+            row = self.position_at(event.position().x(), event.position().y())[0]
+            self.set_selection((row, 0), (row, END_OF_ROW))
+        super().mouseDoubleClickEvent(event)
+
+    def keyPressEvent(self, event: QKeyEvent) -> None:
+        vertical = self.verticalScrollBar()
+        key = event.key()
+
+        if event.matches(QKeySequence.StandardKey.Copy):
+            self.copy_selection()
+        elif event.matches(QKeySequence.StandardKey.SelectAll):
+            self.select_all()
+        elif key == Qt.Key.Key_Up:
+            vertical.setValue(vertical.value() - 1)
+        elif key == Qt.Key.Key_Down:
+            vertical.setValue(vertical.value() + 1)
+        elif key == Qt.Key.Key_PageUp:
+            vertical.setValue(vertical.value() - vertical.pageStep())
+        elif key == Qt.Key.Key_PageDown:
+            vertical.setValue(vertical.value() + vertical.pageStep())
+        else:
+            # Unhandled keys such as Ctrl+Home/End propagate to the main window
+            super().keyPressEvent(event)
+            return
+        event.accept()
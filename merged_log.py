@@ -0,0 +1,198 @@
+# Merged view over several log files for Log Insight
+# Kept free of Qt imports, filtering runs in the caller's thread
+
+import os
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from heapq import heapify, heappop, heappush
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from log_file import LogFile
+from log_filter import BatchCallback, FilterCache, FilterCancelled, FilterQuery, LogFilter, ProgressCallback
+from perf_trace import tracer
+
+
+class MergedLogFiles:
+    """Several log files read as one timeline, ordered by timestamp
+
+    Each source keeps its own line, timestamp and trigram index. A line id of
+    the merged view holds the index of the source in its upper bits and the
+    line number within the source in the lower SOURCE_SHIFT bits, so the
+    files are never concatenated and no line is copied. Every line is shown
+    with a tag naming its source.
+
+    The timeline is produced by a lazy k-way merge. A heap holds the next
+    line of every source, and the source with the earliest one hands over
+    all of its lines up to the next line of any other source at once, found
+    by binary search within the current run of non-decreasing timestamps.
+    Lines keep their order within their source, lines with equal timestamps
+    are ordered by source.
+    """
+
+    # Bits of a merged line id holding the line number within its source
+    SOURCE_SHIFT: int = 40
+
+    # Number of merged line ids handed over per batch
+    MERGE_BATCH_SIZE: int = 65536
+
+    def __init__(self, log_files: List[LogFile]) -> None:
+        """Merge indexed log files
+
+        Args:
+            log_files: Sources in the order their lines are preferred on equal timestamps
+        """
+        self.log_files: List[LogFile] = log_files
+        self.tags: List[str] = [f"[{name}] " for name in self.source_names(log_files)]
+        # Filter results are cached per source, as each source grows on its own
+        self.caches: List[FilterCache] = [FilterCache() for _ in log_files]
+        for log_file in log_files:
+            log_file.ensure_timestamps()
+
+    @staticmethod
+    def source_names(log_files: List[LogFile]) -> List[str]:
+        """Get a short distinct name for every source, its file name where that is unique"""
+        names = [os.path.basename(log_file.path) for log_file in log_files]
+        return [name if names.count(name) == 1 else f"{name}#{index + 1}"
+                for index, name in enumerate(names)]
+
+    def __len__(self) -> int:
+        return sum(len(log_file) for log_file in self.log_files)
+
+    @property
+    def paths(self) -> List[str]:
+        return [log_file.path for log_file in self.log_files]
+
+    def line_id(self, source: int, line: int) -> int:
+        """Get the merged line id of a line of a source"""
+        return (source << self.SOURCE_SHIFT) | line
+
+    def split_line_id(self, line_id: int) -> Tuple[int, int]:
+        """Get the source and the line number within it of a merged line id"""
+        return line_id >> self.SOURCE_SHIFT, line_id & ((1 << self.SOURCE_SHIFT) - 1)
+
+    def line(self, line_id: int) -> str:
+        """Get a decoded line with its source tag, including its line break"""
+        source, line = self.split_line_id(line_id)
+        return self.tags[source] + self.log_files[source].line(line)
+
+    def is_truncated(self) -> bool:
+        """Check whether any source shrank below its indexed data"""
+        return any(log_file.is_truncated() for log_file in self.log_files)
+
+    def grow(self) -> bool:
+        """Extend the index of every source with appended data
+
+        Returns:
+            False if any source is smaller than its indexed data, True otherwise
+        """
+        return all([log_file.grow() for log_file in self.log_files])
+
+    def refresh(self, rebuild: bool = False) -> None:
+        """Index truncated sources again and drop the cached results of every source
+
+        Args:
+            rebuild: Whether to index every source again, see LogFile.refresh
+        """
+        for log_file, cache in zip(self.log_files, self.caches):
+            log_file.refresh(rebuild=rebuild)
+            cache.clear()
+
+    def close(self) -> None:
+        for log_file in self.log_files:
+            log_file.close()
+
+    def merge(self, source_line_ids: Sequence[Sequence[int]]) -> Iterator[array]:
+        """Merge ascending line numbers of every source into timestamp order
+
+        Args:
+            source_line_ids: Ascending line numbers for every source
+
+        Yields:
+            Arrays of at most about MERGE_BATCH_SIZE merged line ids, in timeline order
+        """
+        heap = [(self.log_files[source].timestamps[line_ids[0]], source, 0)
+                for source, line_ids in enumerate(source_line_ids) if line_ids]
+        heapify(heap)
+        batch = array('Q')
+        while heap:
+            _, source, position = heappop(heap)
+            log_file = self.log_files[source]
+            line_ids = source_line_ids[source]
+            timestamps = log_file.timestamps
+            if heap:
+                # Binary search needs ascending timestamps, so stay within the current run
+                run_starts = log_file.time_run_starts
+                run_index = bisect_right(run_starts, line_ids[position])
+                run_end = (bisect_left(line_ids, run_starts[run_index], position)
+                           if run_index < len(run_starts) else len(line_ids))
+                next_time, next_source, _ = heap[0]
+                # On equal timestamps the source listed first goes first
+                search = bisect_right if source < next_source else bisect_left
+                end = max(search(line_ids, next_time, position, run_end, key=timestamps.__getitem__),
+                          position + 1)
+            else:
+                end = len(line_ids)
+
+            base = source << self.SOURCE_SHIFT
+            batch.extend(map(base.__or__, line_ids[position:end]))
+            if end < len(line_ids):
+                heappush(heap, (timestamps[line_ids[end]], source, end))
+            if len(batch) >= self.MERGE_BATCH_SIZE:
+                yield batch
+                batch = array('Q')
+        if batch:
+            yield batch
+
+    def filter(self, query: FilterQuery, workers: int = 0, chunk_size: int = 0,
+               progress: Optional[ProgressCallback] = None,
+               cancel_event: Optional[threading.Event] = None,
+               batch: Optional[BatchCallback] = None) -> array:
+        """Filter every source with the same query and merge the matches into timeline order
+
+        Each source is filtered with its own time and keyword indexes and
+        cached results, like a single log file.
+
+        Args:
+            query: Normalized filter conditions
+            workers: Number of worker processes, 0 for one per CPU core
+            chunk_size: Bytes per worker task, 0 for PARALLEL_CHUNK_SIZE
+            progress: Callback receiving the filtered and total number of bytes over all sources
+            cancel_event: Event that stops the run with FilterCancelled once set
+            batch: Callback receiving the next merged matches, in timeline order
+
+        Returns:
+            Compact array with the merged id of every matching line
+
+        Raises:
+            FilterCancelled: If cancel_event was set before the run finished
+        """
+        total_bytes = sum(log_file.size for log_file in self.log_files)
+        done_bytes = 0
+        source_line_ids = []
+        for log_file, cache in zip(self.log_files, self.caches):
+            if query.matches_all():
+                line_ids = range(len(log_file))
+            else:
+                def report(source_done: int, source_total: int, log_file: LogFile = log_file,
+                           done_bytes: int = done_bytes) -> None:
+                    if progress is not None and source_total:
+                        progress(done_bytes + log_file.size * source_done // source_total, total_bytes)
+
+                line_ids = LogFilter.filter_cached(log_file, query, cache, workers=workers,
+                                                   chunk_size=chunk_size, progress=report,
+                                                   cancel_event=cancel_event)
+            source_line_ids.append(line_ids)
+            done_bytes += log_file.size
+            if progress is not None:
+                progress(done_bytes, total_bytes)
+
+        merged_ids = array('Q')
+        for merged_batch in self.merge(source_line_ids):
+            if cancel_event is not None and cancel_event.is_set():
+                raise FilterCancelled()
+            tracer.count("merge.lines", len(merged_batch))
+            merged_ids.extend(merged_batch)
+            if batch is not None:
+                batch(merged_batch)
+        return merged_ids
@@ -0,0 +1,251 @@
+# Hot-path instrumentation for Log Insight
+# Kept free of Qt imports, so the file, filter and tail modules can report to it
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak memory is not reported there
+    resource = None
+
+
+class _NoSpan:
+    """Stand-in returned by Tracer.span while tracing is off, does nothing"""
+
+    __slots__ = ()
+
+    def __enter__(self) -> '_NoSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Span:
+    """Times a stage from entering to leaving a with block
+
+    Spans nest per thread. The time of inner spans is subtracted from the
+    self time of the enclosing one, so stage totals can be compared without
+    counting nested stages twice.
+    """
+
+    __slots__ = ('tracer', 'name', 'args', 'start', 'child_time')
+
+    def __init__(self, tracer: 'Tracer', name: str, args: Optional[dict]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+        self.start = 0
+        self.child_time = 0
+
+    def __enter__(self) -> 'Span':
+        self.tracer._stack().append(self)
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        duration = time.perf_counter_ns() - self.start
+        stack = self.tracer._stack()
+        stack.pop()
+        if stack:
+            stack[-1].child_time += duration
+        self.tracer._record_span(self, duration)
+
+
+class StageStats:
+    """Accumulated timings of one stage"""
+
+    __slots__ = ('calls', 'total_ns', 'self_ns', 'max_ns')
+
+    def __init__(self) -> None:
+        self.calls: int = 0
+        self.total_ns: int = 0
+        self.self_ns: int = 0
+        self.max_ns: int = 0
+
+
+class Tracer:
+    """Collects stage timings, counters and gauges while enabled
+
+    Stages are timed with span(), counters add up with count() and gauges,
+    such as queue depths and memory use, keep their latest value with
+    gauge(). Every span, gauge sample and instant event is also kept as a
+    trace event, the last MAX_EVENTS of them, for export in the Chrome trace
+    format, which chrome://tracing and Perfetto open.
+
+    While disabled, span() hands out a shared object that does nothing and
+    the other calls return right away, so the instrumented code only pays
+    for one attribute check. Spans are placed around chunks of work, never
+    around single lines. Work done in worker processes is timed as a whole
+    by the process that waits for it.
+    """
+
+    # Trace events kept for export
+    MAX_EVENTS: int = 200000
+
+    # Instant events kept for the diagnostics panel
+    MAX_MESSAGES: int = 200
+
+    def __init__(self) -> None:
+        # Set LOGINSIGHT_TRACE=1 to trace from startup on
+        self.enabled: bool = os.environ.get('LOGINSIGHT_TRACE', '') not in ('', '0')
+        self.stages: Dict[str, StageStats] = {}
+        self.counters: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+        # Trace events as (phase, name, start in ns, duration in ns, thread id, args)
+        self.events: Deque[Tuple[str, str, int, int, int, Optional[dict]]] = deque(maxlen=self.MAX_EVENTS)
+        self.messages: Deque[Tuple[float, str]] = deque(maxlen=self.MAX_MESSAGES)
+        self.thread_names: Dict[int, str] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Trace timestamps count from here
+        self._origin: int = time.perf_counter_ns()
+
+    def enable(self, enabled: bool) -> None:
+        """Turn collection on or off, collected data is kept"""
+        self.enabled = enabled
+
+    def reset(self) -> None:
+        """Drop everything collected so far"""
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+            self.gauges = {}
+            self.events.clear()
+            self.messages.clear()
+            self._origin = time.perf_counter_ns()
+
+    def span(self, name: str, **args) -> Span | _NoSpan:
+        """Time a stage, use as a context manager
+
+        Args:
+            name: Stage name, dotted names such as index.timestamps group related stages
+            args: Details shown with the event in the trace viewer
+        """
+        if not self.enabled:
+            return _NO_SPAN
+        return Span(self, name, args or None)
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Add to a counter, such as the number of bytes read"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def gauge(self, name: str, value: float) -> None:
+        """Sample a value that goes up and down, such as a queue depth"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        with self._lock:
+            self.gauges[name] = value
+            self.events.append(('C', name, now, 0, 0, {name: value}))
+
+    def instant(self, message: str, **args) -> None:
+        """Record a point in time with a message, such as a state change"""
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        with self._lock:
+            self.events.append(('i', message, now, 0, threading.get_ident(), args or None))
+            self.messages.append((time.time(), message))
+
+    def _stack(self) -> List[Span]:
+        """Get the open spans of the current thread"""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+            thread = threading.current_thread()
+            self.thread_names[thread.ident] = thread.name
+        return stack
+
+    def _record_span(self, span: Span, duration: int) -> None:
+        with self._lock:
+            stats = self.stages.get(span.name)
+            if stats is None:
+                stats = self.stages[span.name] = StageStats()
+            stats.calls += 1
+            stats.total_ns += duration
+            stats.self_ns += duration - span.child_time
+            if duration > stats.max_ns:
+                stats.max_ns = duration
+            self.events.append(('X', span.name, span.start, duration, threading.get_ident(), span.args))
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Copy the current stage timings, counters and gauges
+
+        Returns:
+            Dictionary with 'stages' mapping stage names to calls and times in
+            milliseconds, and 'counters' and 'gauges' mapping names to values
+        """
+        with self._lock:
+            stages = {
+                name: {
+                    'calls': stats.calls,
+                    'total_ms': stats.total_ns / 1e6,
+                    'self_ms': stats.self_ns / 1e6,
+                    'max_ms': stats.max_ns / 1e6,
+                }
+                for name, stats in self.stages.items()
+            }
+            return {'stages': stages, 'counters': dict(self.counters), 'gauges': dict(self.gauges)}
+
+    def chrome_trace(self) -> dict:
+        """Convert the collected events to the Chrome trace event format"""
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+            origin = self._origin
+        trace_events = [
+            {'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': name}}
+            for tid, name in list(self.thread_names.items())
+        ]
+        for phase, name, start, duration, tid, args in events:
+            event = {'name': name, 'ph': phase, 'ts': (start - origin) / 1000, 'pid': pid, 'tid': tid}
+            if phase == 'X':
+                event['dur'] = duration / 1000
+            elif phase == 'i':
+                event['s'] = 't'
+            if args:
+                event['args'] = args
+            trace_events.append(event)
+        return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
+
+    def export_chrome_trace(self, path: str) -> None:
+        """Write the collected events as a Chrome trace JSON file"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f)
+
+
+def memory_usage() -> Tuple[Optional[int], Optional[int]]:
+    """Get the current and the peak resident memory of this process in bytes
+
+    Returns:
+        Tuple of the current and the peak size, None where the platform does not tell
+    """
+    current = None
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            current = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    peak = None
+    if resource is not None:
+        # Reported in kilobytes on Linux and in bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+    return current, peak
+
+
+# Shared by all modules, enabled from the diagnostics panel
+tracer = Tracer()
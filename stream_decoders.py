@@ -0,0 +1,374 @@
+# Decoders that can resume inside a gzip member or bzip2 stream, for the seek points of compressed_log
+# Kept free of Qt imports like the compressed file backend using them
+
+import bz2
+import ctypes
+import ctypes.util
+import weakref
+import zlib
+from typing import Any, List, NamedTuple, Optional, Tuple
+
+
+class StreamCheckpoint(NamedTuple):
+    """State needed to resume decompression inside a gzip member or bzip2 stream
+
+    Unlike a copy of a decompressor, it can be stored in the sidecar file.
+    Decompression resumes by feeding the compressed data from the file
+    offset of its seek point on.
+    """
+    # gzip: unused bits of the byte before the file offset; bzip2: bits of the byte at the file offset before the block
+    bits: int
+    # gzip: value of those unused bits; bzip2: block size digit of the stream header
+    value: int
+    # gzip: last 32 KB of decompressed data of the member, the history the next block may refer to; bzip2: empty
+    window: bytes
+
+
+class SeekPoint(NamedTuple):
+    """Position the decompression can be resumed from"""
+    # Offset in the decompressed data
+    data_offset: int
+    # Offset of the next compressed byte in the file
+    file_offset: int
+    # StreamCheckpoint or in-memory copy of the decompressor state, None where a new member, stream or frame starts
+    state: Any
+
+
+class _ZStream(ctypes.Structure):
+    """z_stream of the zlib C library"""
+    _fields_ = [
+        ("next_in", ctypes.c_void_p),
+        ("avail_in", ctypes.c_uint),
+        ("total_in", ctypes.c_ulong),
+        ("next_out", ctypes.c_void_p),
+        ("avail_out", ctypes.c_uint),
+        ("total_out", ctypes.c_ulong),
+        ("msg", ctypes.c_char_p),
+        ("state", ctypes.c_void_p),
+        ("zalloc", ctypes.c_void_p),
+        ("zfree", ctypes.c_void_p),
+        ("opaque", ctypes.c_void_p),
+        ("data_type", ctypes.c_int),
+        ("adler", ctypes.c_ulong),
+        ("reserved", ctypes.c_ulong),
+    ]
+
+
+def _load_zlib() -> Optional[ctypes.CDLL]:
+    """Load the zlib C library for the inflate calls the zlib module does not offer
+
+    Returns:
+        The library, None if it cannot be found, such as on Windows where
+        Python links zlib statically
+    """
+    path = ctypes.util.find_library('z') or ctypes.util.find_library('zlib')
+    if path is None:
+        return None
+    try:
+        library = ctypes.CDLL(path)
+        library.zlibVersion.restype = ctypes.c_char_p
+        stream = ctypes.POINTER(_ZStream)
+        library.inflateInit2_.argtypes = [stream, ctypes.c_int, ctypes.c_char_p, ctypes.c_int]
+        library.inflate.argtypes = [stream, ctypes.c_int]
+        library.inflateEnd.argtypes = [stream]
+        library.inflatePrime.argtypes = [stream, ctypes.c_int, ctypes.c_int]
+        library.inflateSetDictionary.argtypes = [stream, ctypes.c_char_p, ctypes.c_uint]
+        if not library.zlibVersion().startswith(b'1.'):
+            return None
+    except (OSError, AttributeError):
+        return None
+    return library
+
+
+_zlib = _load_zlib()
+
+Z_OK = 0
+Z_STREAM_END = 1
+Z_BUF_ERROR = -5
+Z_BLOCK = 5
+
+
+def _inflate_end(stream: _ZStream) -> None:
+    """Release the zlib state of an inflater once it goes away"""
+    _zlib.inflateEnd(ctypes.byref(stream))
+
+
+class GzipInflater:
+    """Inflate one gzip member, recording checkpoints at deflate block boundaries
+
+    Works like zlib.decompressobj, but goes through the zlib C library so
+    that inflate stops at every block boundary (Z_BLOCK). Where at least
+    spacing bytes were decompressed since the last checkpoint, the bit
+    position and the last 32 KB of output are recorded, like zran.c of the
+    zlib examples. A member resumed from such a checkpoint is inflated as
+    raw deflate data, so its trailer is skipped without checking the CRC.
+    """
+
+    # History a deflate block may refer back to
+    WINDOW_SIZE: int = 32 * 1024
+
+    # Decompressed bytes taken out per inflate call
+    OUTPUT_SIZE: int = 256 * 1024
+
+    # Size of the gzip trailer, CRC32 and length
+    TRAILER_SIZE: int = 8
+
+    def __init__(self, data_offset: int, file_offset: int, spacing: int,
+                 checkpoint: Optional[StreamCheckpoint] = None) -> None:
+        """Start inflating at a member start or at a checkpoint
+
+        Args:
+            data_offset: Offset in the decompressed data of the first output byte
+            file_offset: Offset in the file of the first input byte
+            spacing: Decompressed bytes between checkpoints
+            checkpoint: Checkpoint to resume from, None at the start of a member
+
+        Raises:
+            zlib.error: If the state cannot be set up
+        """
+        self._stream = _ZStream()
+        stream = ctypes.byref(self._stream)
+        # Raw deflate from a checkpoint, otherwise a gzip header is expected
+        window_bits = -15 if checkpoint is not None else 16 + 15
+        self._check(_zlib.inflateInit2_(stream, window_bits, _zlib.zlibVersion(), ctypes.sizeof(_ZStream)))
+        weakref.finalize(self, _inflate_end, self._stream)
+        self.window: bytes = b''
+        if checkpoint is not None:
+            if checkpoint.bits:
+                self._check(_zlib.inflatePrime(stream, checkpoint.bits, checkpoint.value))
+            self._check(_zlib.inflateSetDictionary(stream, checkpoint.window, len(checkpoint.window)))
+            self.window = checkpoint.window
+        # Trailer bytes still to skip once the raw deflate data ended
+        self._trailer: int = self.TRAILER_SIZE if checkpoint is not None else 0
+        self._deflate_end: bool = False
+        self._output = ctypes.create_string_buffer(self.OUTPUT_SIZE)
+        self._last_byte: int = 0
+        self.data_offset: int = data_offset
+        self.file_offset: int = file_offset
+        self.spacing: int = spacing
+        self._last_checkpoint: int = data_offset
+        self.eof: bool = False
+        self.unused_data: bytes = b''
+        # Checkpoints recorded since the caller last took them
+        self.seek_points: List[SeekPoint] = []
+
+    @staticmethod
+    def _check(status: int) -> None:
+        if status != Z_OK:
+            raise zlib.error(f"Error {status} while setting up decompression")
+
+    def decompress(self, data: bytes) -> bytes:
+        """Inflate the next compressed bytes, see zlib.Decompress.decompress"""
+        if self._deflate_end:
+            return self._skip_trailer(data)
+        stream = self._stream
+        output = self._output
+        pointer = ctypes.byref(stream)
+        input_buffer = ctypes.create_string_buffer(data, len(data))
+        stream.next_in = ctypes.addressof(input_buffer)
+        stream.avail_in = len(data)
+        parts = []
+        while True:
+            stream.next_out = ctypes.addressof(output)
+            stream.avail_out = self.OUTPUT_SIZE
+            status = _zlib.inflate(pointer, Z_BLOCK)
+            produced = self.OUTPUT_SIZE - stream.avail_out
+            if produced:
+                part = ctypes.string_at(output, produced)
+                parts.append(part)
+                self.data_offset += produced
+                self.window = (self.window + part)[-self.WINDOW_SIZE:]
+            consumed = len(data) - stream.avail_in
+            if status == Z_STREAM_END:
+                self.file_offset += consumed
+                parts.append(self._end_deflate(data[consumed:]))
+                break
+            if status != Z_OK and status != Z_BUF_ERROR:
+                message = stream.msg.decode('ascii', 'replace') if stream.msg else ""
+                raise zlib.error(f"Error {status} while decompressing data: {message}")
+            # Stopped after the end of a block that is not the last one
+            if (stream.data_type & 128 and not stream.data_type & 64
+                    and self.data_offset - self._last_checkpoint >= self.spacing):
+                self._add_checkpoint(data, consumed)
+            if status == Z_BUF_ERROR or (not stream.avail_in and produced < self.OUTPUT_SIZE):
+                # Everything given is consumed and the output is drained
+                self.file_offset += consumed
+                break
+        if data:
+            self._last_byte = data[-1]
+        stream.next_in = None
+        return b''.join(parts)
+
+    def _add_checkpoint(self, data: bytes, consumed: int) -> None:
+        bits = self._stream.data_type & 7
+        value = 0
+        if bits:
+            # The unused bits are the high bits of the last byte taken in
+            last_byte = data[consumed - 1] if consumed else self._last_byte
+            value = last_byte >> (8 - bits)
+        self.seek_points.append(SeekPoint(self.data_offset, self.file_offset + consumed,
+                                          StreamCheckpoint(bits, value, self.window)))
+        self._last_checkpoint = self.data_offset
+
+    def _end_deflate(self, rest: bytes) -> bytes:
+        self._deflate_end = True
+        if not self._trailer:
+            # The gzip wrapper consumed the trailer itself
+            self.eof = True
+            self.unused_data = rest
+            return b''
+        return self._skip_trailer(rest)
+
+    def _skip_trailer(self, data: bytes) -> bytes:
+        skipped = min(self._trailer, len(data))
+        self._trailer -= skipped
+        self.file_offset += skipped
+        if not self._trailer:
+            self.eof = True
+            self.unused_data = data[skipped:]
+        return b''
+
+
+class Bzip2BlockDecoder:
+    """Decompress one bzip2 stream block by block, recording a checkpoint at every block
+
+    bzip2 blocks are independent, but start at any bit position. Block
+    starts are found by their 48-bit magic number at every bit offset, and
+    every block is decompressed on its own as a stream of one block, built
+    from its bits, an end of stream marker and its CRC as the stream CRC.
+    A magic number found by chance inside compressed data fails to
+    decompress, the block is then taken up to the next one.
+    """
+
+    BLOCK_MAGIC: int = 0x314159265359
+    END_MAGIC: int = 0x177245385090
+
+    # Magic numbers shifted to every bit offset, as the five bytes they fill completely
+    _PATTERNS: List[Tuple[bytes, int]] = [
+        ((magic << (8 - shift)).to_bytes(7, 'big')[1:6], shift)
+        for magic in (BLOCK_MAGIC, END_MAGIC) for shift in range(8)
+    ]
+
+    def __init__(self, data_offset: int, file_offset: int,
+                 checkpoint: Optional[StreamCheckpoint] = None) -> None:
+        """Start at a stream header or at a checkpoint
+
+        Args:
+            data_offset: Offset in the decompressed data of the first output byte
+            file_offset: Offset in the file of the first input byte
+            checkpoint: Checkpoint to resume from, None at the start of a stream
+        """
+        # Compressed data from the current block on, and its offset in the file
+        self._buffer: bytearray = bytearray()
+        self._buffer_offset: int = file_offset
+        # Block size digit of the stream header, None until the header was read
+        self._level: Optional[int] = None
+        # Bit position of the current block in the buffer
+        self._bit: int = 0
+        # Bit position up to which the buffer holds no further magic number
+        self._scanned_bit: int = 0
+        if checkpoint is not None:
+            self._level = checkpoint.value
+            self._bit = checkpoint.bits
+        self.data_offset: int = data_offset
+        self.eof: bool = False
+        self.unused_data: bytes = b''
+        # Checkpoints recorded since the caller last took them
+        self.seek_points: List[SeekPoint] = []
+
+    def decompress(self, data: bytes) -> bytes:
+        """Decompress the blocks completed by the next compressed bytes, see bz2.BZ2Decompressor"""
+        self._buffer += data
+        if self._level is None:
+            if len(self._buffer) < 4:
+                return b''
+            if self._buffer[:3] != b'BZh' or self._buffer[3] not in b'123456789':
+                raise OSError("Invalid data stream")
+            self._level = self._buffer[3]
+            self._bit = 32
+        parts = []
+        while not self.eof:
+            magic = self._bits_at(self._bit, 48)
+            if magic is None:
+                break
+            if magic == self.END_MAGIC:
+                # Marker, stream CRC and padding to the next byte
+                end = (self._bit + 80 + 7) // 8
+                if len(self._buffer) >= end:
+                    self.eof = True
+                    self.unused_data = bytes(self._buffer[end:])
+                break
+            if magic != self.BLOCK_MAGIC:
+                raise OSError("Invalid data stream")
+            block = self._next_block()
+            if block is None:
+                break
+            parts.append(block)
+        return b''.join(parts)
+
+    def _next_block(self) -> Optional[bytes]:
+        """Decompress the block at the current bit position once the next marker arrived"""
+        search = max(self._bit + 80, self._scanned_bit)
+        while True:
+            marker = self._find_marker(search)
+            if marker is None:
+                self._scanned_bit = max(search, (len(self._buffer) - 7) * 8)
+                return None
+            try:
+                block = bz2.decompress(self._single_block_stream(marker))
+            except (OSError, ValueError, EOFError):
+                # A magic number by chance inside the block
+                search = marker + 1
+                continue
+            break
+        self.seek_points.append(SeekPoint(self.data_offset, self._buffer_offset + self._bit // 8,
+                                          StreamCheckpoint(self._bit % 8, self._level, b'')))
+        self.data_offset += len(block)
+        # Drop the bytes before the next block
+        drop = marker // 8
+        del self._buffer[:drop]
+        self._buffer_offset += drop
+        self._bit = marker - drop * 8
+        self._scanned_bit = 0
+        return block
+
+    def _find_marker(self, start_bit: int) -> Optional[int]:
+        """Find the first block or end of stream magic number at or after a bit position"""
+        buffer = self._buffer
+        found = None
+        for pattern, shift in self._PATTERNS:
+            # The pattern starts one byte after the byte holding the first bits of the magic
+            index = buffer.find(pattern, start_bit // 8 + 1)
+            while index >= 0:
+                bit = (index - 1) * 8 + shift
+                if found is not None and bit >= found:
+                    break
+                if bit >= start_bit and self._bits_at(bit, 48) in (self.BLOCK_MAGIC, self.END_MAGIC):
+                    found = bit
+                    break
+                index = buffer.find(pattern, index + 1)
+        return found
+
+    def _bits_at(self, bit: int, count: int) -> Optional[int]:
+        """Read count bits from a bit position of the buffer, None if they did not arrive yet"""
+        end = bit + count
+        if (end + 7) // 8 > len(self._buffer):
+            return None
+        value = int.from_bytes(self._buffer[bit // 8:(end + 7) // 8], 'big')
+        return (value >> ((8 - end % 8) % 8)) & ((1 << count) - 1)
+
+    def _single_block_stream(self, end_bit: int) -> bytes:
+        """Build a bzip2 stream holding only the block between the current bit position and end_bit"""
+        length = end_bit - self._bit
+        block = self._bits_at(self._bit, length)
+        crc = self._bits_at(self._bit + 48, 32)
+        # One block, so the stream CRC is the block CRC
+        value = (((block << 48) | self.END_MAGIC) << 32) | crc
+        bits = length + 80
+        padding = -bits % 8
+        return b'BZh' + bytes([self._level]) + (value << padding).to_bytes((bits + padding) // 8, 'big')
+
+
+def gzip_checkpoints_supported() -> bool:
+    """Check whether gzip members can be resumed from persisted checkpoints, which needs the zlib C library"""
+    return _zlib is not None
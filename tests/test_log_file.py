@@ -0,0 +1,62 @@
+# Tests of the memory-mapped log file backend
+
+import subprocess
+import sys
+import textwrap
+
+from log_file import LogFile
+
+LINES = [f"12:00:{second:02d}.000 INFO line {second}\n" for second in range(60)]
+
+
+def write_log(path, lines) -> str:
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+def test_lines_and_partial_last_line(tmp_path):
+    log_file = LogFile(write_log(tmp_path / "a.log", LINES + ["12:01:00.000 INFO partial"]))
+    assert len(log_file) == len(LINES) + 1
+    assert log_file.complete_line_count == len(LINES)
+    assert log_file.lines() == LINES + ["12:01:00.000 INFO partial"]
+    assert log_file.line(-1) == "12:01:00.000 INFO partial"
+    log_file.close()
+
+
+def test_grow_completes_the_partial_line(tmp_path):
+    path = write_log(tmp_path / "a.log", LINES[:10] + ["12:00:10.000 INFO li"])
+    log_file = LogFile(path)
+    with open(path, 'a') as file:
+        file.write("ne 10\n" + ''.join(LINES[11:20]))
+    assert log_file.grow()
+    assert log_file.lines() == LINES[:20]
+    assert not log_file.partial
+    log_file.close()
+
+
+def test_read_lines_joins_the_lines(tmp_path):
+    log_file = LogFile(write_log(tmp_path / "a.log", LINES))
+    line_ids = [0, 3, 4, 59]
+    assert log_file.read_lines(line_ids) == b''.join(log_file.line_bytes(line_id) for line_id in line_ids)
+    assert log_file.read_lines([]) == b''
+    log_file.close()
+
+
+def test_reads_after_truncation_do_not_crash(tmp_path):
+    # Touching a mapping past the end of a truncated file raises SIGBUS, so run it in a separate process
+    path = write_log(tmp_path / "a.log", LINES * 2000)
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path[:0] = {sys.path!r}
+        from log_file import LogFile
+        log_file = LogFile({path!r})
+        open({path!r}, 'w').close()
+        assert log_file.line(50000) == ''
+        assert log_file.read_lines([10, 20, 30]) == b''
+        assert log_file.read_bytes(0, log_file.size) == b''
+        assert log_file.is_truncated()
+        assert log_file.refresh()
+        assert len(log_file) == 0
+    """)
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,318 @@
+# Tests of the Qt-free filter engine
+
+import pytest
+
+from log_filter import LogFilter
+
+LINES = [b"12:00:00.000 INFO started", b"", b"12:00:01.000 ERROR zzz failed", b"last"]
+
+
+def filter_lines(data: bytes, include: list, exclude: list, regex: bool = True) -> list:
+    """Filter raw data and return the matching lines"""
+    include_matcher = LogFilter.compile_matcher(include, True, regex)
+    exclude_matcher = LogFilter.compile_matcher(exclude, True, regex)
+    lines = data.split(b'\n')
+    return [lines[line_id] for line_id in
+            LogFilter.filter_bytes(data, 'utf-8', 0, include_matcher, exclude_matcher)]
+
+
+@pytest.mark.parametrize("data", [b'\n'.join(LINES), b'\n'.join(LINES) + b'\n', b''])
+@pytest.mark.parametrize("pattern", [".*", "x*", "z?", "^", "$"])
+def test_empty_matching_include_pattern_matches_every_line(data, pattern):
+    lines = data.split(b'\n')
+    expected = lines[:-1] if data.endswith(b'\n') or not data else lines
+    assert filter_lines(data, [pattern], []) == expected
+
+
+@pytest.mark.parametrize("data", [b'\n'.join(LINES), b'\n'.join(LINES) + b'\n'])
+@pytest.mark.parametrize("pattern", [".*", "x*", "z?", "^", "$"])
+def test_empty_matching_exclude_pattern_excludes_every_line(data, pattern):
+    assert filter_lines(data, [], [pattern]) == []
+    assert filter_lines(data, ["zzz"], [pattern]) == []
+
+
+@pytest.mark.parametrize("data", [b'\n'.join(LINES), b'\n'.join(LINES) + b'\n'])
+def test_empty_line_pattern(data):
+    assert filter_lines(data, ["^$"], []) == [b""]
+    assert filter_lines(data, [], ["^$"]) == [line for line in LINES if line]
+
+
+def test_empty_matching_pattern_on_decoded_text():
+    text = "a\nß\nlast"
+    for pattern in (".*", "z?", "^"):
+        matcher = LogFilter.compile_matcher([pattern], False, True)
+        assert list(LogFilter.match_spans(text, matcher, None)) == [(0, 2), (2, 4), (4, 8)]
+        assert list(LogFilter.match_spans(text, None, matcher)) == []
+
+
+WORDS = ["Error", "error", "ERROR", "timeout", "Timeout after", "straße", "STRASSE", "日志", "req-42", "id=ff"]
+
+
+def make_log(path, line_count: int = 3000, seed: int = 1) -> str:
+    """Write a log of random lines, with continuation lines and a last line without a line break"""
+    import random
+    rng = random.Random(seed)
+    lines = []
+    for index in range(line_count):
+        if index % 17 == 5:
+            lines.append("    at com.example.Trace(Foo.java:12)")
+        else:
+            words = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 4)))
+            lines.append(f"{index // 120 % 24:02d}:{index // 2 % 60:02d}:{index % 60:02d}.000 INFO {words}")
+    path.write_text('\n'.join(lines), encoding='utf-8')
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def sample_log(tmp_path_factory):
+    from log_file import LogFile
+    log_file = LogFile(make_log(tmp_path_factory.mktemp("filter") / "sample.log"))
+    yield log_file
+    log_file.close()
+    LogFilter.shutdown_executor()
+
+
+@pytest.mark.parametrize("include, exclude, case_sensitive", [
+    (["error"], [], False),
+    (["Error", "timeout"], ["req-42"], True),
+    ([], ["error", "日志"], False),
+    (["Timeout after"], [], False),
+    ([], [], True),
+])
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_filter_agrees_with_line_by_line(sample_log, include, exclude, case_sensitive, workers):
+    include_matcher = LogFilter.compile_matcher(include, case_sensitive)
+    exclude_matcher = LogFilter.compile_matcher(exclude, case_sensitive)
+    for start_time, end_time in (("", ""), ("03:00:00.000", "12:30:00.000")):
+        expected = LogFilter.filter_line_ids(sample_log, include_matcher, exclude_matcher, start_time, end_time)
+        got = LogFilter.filter_line_ids_parallel(sample_log, include_matcher, exclude_matcher, start_time, end_time,
+                                                 workers=workers, chunk_size=4096)
+        assert list(got) == list(expected)
+
+
+def test_parallel_filter_line_range_and_batches(sample_log):
+    matcher = LogFilter.compile_matcher(["error"], False)
+    batches = []
+    got = LogFilter.filter_line_ids_parallel(sample_log, matcher, None, workers=2, chunk_size=2048,
+                                             first_line=100, end_line=2500, batch=batches.append)
+    expected = [line_id for line_id in LogFilter.filter_line_ids(sample_log, matcher, None)
+                if 100 <= line_id < 2500]
+    assert list(got) == expected
+    assert [line_id for batch in batches for line_id in batch] == expected
+
+
+def test_trie_regex_matches_like_an_alternation():
+    import random
+    import re
+    from log_filter import KeywordMatcher
+    rng = random.Random(4)
+    for _ in range(200):
+        terms = [''.join(rng.choice('ab.*c') for _ in range(rng.randint(1, 5))) for _ in range(rng.randint(1, 6))]
+        trie = re.compile(KeywordMatcher.trie_regex(terms))
+        alternation = re.compile('|'.join(map(re.escape, terms)))
+        for _ in range(20):
+            text = ''.join(rng.choice('ab.*cd') for _ in range(rng.randint(0, 12)))
+            assert bool(trie.search(text)) == bool(alternation.search(text)), (terms, text)
+
+
+def test_trie_regex_drops_terms_with_a_shorter_prefix():
+    from log_filter import KeywordMatcher
+    assert KeywordMatcher.trie_regex(["error", "err", "errand"]) == "err"
+
+
+def test_keyword_matcher_casefolds():
+    matcher = LogFilter.compile_matcher(["STRASSE", "Error"], False)
+    assert matcher.search("die straße")
+    assert matcher.search("an ERROR")
+    assert not matcher.search("a warning")
+    assert not LogFilter.compile_matcher(["Error"], True).search("an ERROR")
+
+
+def query(include=(), exclude=(), include_case_sensitive=False, exclude_case_sensitive=False,
+          start_time="", end_time="", include_regex=False, levels=None):
+    from log_filter import FilterQuery
+    return FilterQuery.create(list(include), include_case_sensitive, list(exclude), exclude_case_sensitive,
+                              start_time, end_time, include_regex, False, levels)
+
+
+@pytest.mark.parametrize("narrow, broad, expected", [
+    (query(["timeout error"]), query(["error"]), True),
+    (query(["error"]), query(["timeout error"]), False),
+    (query(["Error"], include_case_sensitive=True), query(["error"]), True),
+    (query(["error"]), query(["Error"], include_case_sensitive=True), False),
+    (query(["error", "timeout"]), query(["error"]), False),
+    (query(["error"]), query(["error", "timeout"]), True),
+    (query(["error"]), query(), True),
+    (query(), query(["error"]), False),
+    (query(exclude=["debug", "trace"]), query(exclude=["debug"]), True),
+    (query(exclude=["debug"]), query(exclude=["debug", "trace"]), False),
+    (query(start_time="01:00:00.000", end_time="02:00:00.000"), query(start_time="00:30:00.000"), True),
+    (query(start_time="00:30:00.000"), query(start_time="01:00:00.000", end_time="02:00:00.000"), False),
+    (query(levels=[4, 5]), query(levels=[3, 4, 5]), True),
+    (query(), query(levels=[3, 4, 5]), False),
+    (query([r"err\w+"], include_regex=True), query([r"err\w+"], include_regex=True), True),
+    (query([r"error"], include_regex=True), query(["error"]), False),
+])
+def test_query_is_within(narrow, broad, expected):
+    assert narrow.is_within(broad) == expected
+
+
+def test_cached_results_agree_with_fresh_runs(sample_log):
+    from log_filter import FilterCache
+    queries = [
+        query(["error"]),
+        query(["error timeout"]),
+        query(["error"], ["req-42"]),
+        query(["error"], ["req-42", "日志"], start_time="02:00:00.000"),
+        query(["ERROR"], include_case_sensitive=True),
+        query(["error"], levels=[3]),
+        query(),
+        query(["error"]),
+    ]
+    cache = FilterCache()
+    for filter_query in queries:
+        fresh = LogFilter.filter_cached(sample_log, filter_query, FilterCache(), workers=1)
+        assert list(LogFilter.filter_cached(sample_log, filter_query, cache, workers=1)) == list(fresh)
+        # Levels are selected from the cached result of the same keywords
+        assert cache.get(filter_query.without_levels()) is not None
+
+
+def test_cached_result_is_extended_when_the_file_grows(tmp_path):
+    from log_file import LogFile
+    from log_filter import FilterCache
+    path = tmp_path / "grow.log"
+    path.write_text("12:00:00.000 INFO error one\n12:00:01.000 INFO fine\n")
+    log_file = LogFile(str(path))
+    cache = FilterCache()
+    filter_query = query(["error"])
+    assert list(LogFilter.filter_cached(log_file, filter_query, cache, workers=1)) == [0]
+    with open(path, 'a') as file:
+        file.write("12:00:02.000 INFO error two\n")
+    log_file.grow()
+    assert list(LogFilter.filter_cached(log_file, filter_query, cache, workers=1)) == [0, 2]
+    assert list(LogFilter.filter_cached(log_file, query(["error two"]), cache, workers=1)) == [2]
+    log_file.close()
+
+
+@pytest.mark.parametrize("pattern, literals", [
+    (r"Timeout after \d+ ms", ["Timeout after "]),
+    (r"(?:connection|socket) refused", [" refused"]),
+    (r"status=5\d\d", ["status=5"]),
+    (r"error|warn", ["error", "warn"]),
+    (r"(foo)?bar", ["bar"]),
+    (r"(?i)error", ["error"]),
+    (r"a.*b", None),
+    (r"err", ["err"]),
+    (r"er", None),
+])
+def test_regex_required_literals(pattern, literals):
+    from log_filter import RegexMatcher
+    matcher = RegexMatcher([pattern], True)
+    assert (matcher.keywords.terms if matcher.keywords else None) == literals
+
+
+@pytest.mark.parametrize("case_sensitive", [True, False])
+def test_regex_prefilter_never_drops_a_match(case_sensitive):
+    import random
+    import re
+    from log_filter import RegexMatcher
+    rng = random.Random(6)
+    patterns = [r"Timeout after \d+ ms", r"(?:connection|socket) refused", r"status=5\d\d", r"(?i)STATUS=5",
+                r"^ERROR\b", r"req-\d+$", r"straße|日志"]
+    pieces = ["Timeout after ", "12", " ms", "connection", "socket", " refused", "status=5", "STATUS=5", "ERROR",
+              "error ", "req-", "42", "straße", "STRASSE", "日志", " "]
+    for pattern in patterns:
+        matcher = RegexMatcher([pattern], case_sensitive)
+        expected = re.compile(pattern, 0 if case_sensitive else re.IGNORECASE)
+        for _ in range(300):
+            line = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 6)))
+            assert matcher.search(line) == bool(expected.search(line)), (pattern, line)
+
+
+@pytest.mark.parametrize("pattern", [r"(a+)+$", r"(\w+\s?)+$", r"(.*a){20}", r"(x|(a*))+", r"(?:a+)*"])
+def test_nested_unbounded_repeats_are_rejected(pattern):
+    import re
+    with pytest.raises(re.error):
+        LogFilter.compile_matcher([pattern], True, True)
+
+
+@pytest.mark.parametrize("pattern", [r"(a++)+$", r"(?>a+)+$", r"(\d{1,3}\.){3}\d+", r"a+b+", r"(ab)+c"])
+def test_safe_repeats_are_accepted(pattern):
+    assert LogFilter.compile_matcher([pattern], True, True) is not None
+
+
+def test_backreferences_need_a_single_expression():
+    import re
+    assert LogFilter.compile_matcher([r"(\w+) \1"], True, True).search("hello hello")
+    with pytest.raises(re.error):
+        LogFilter.compile_matcher([r"(\w+) \1", "other"], True, True)
+
+
+def decoded_reference(data: bytes, encoding: str, include_matcher, exclude_matcher) -> list:
+    """Filter raw data by decoding and testing every line on its own"""
+    lines = data.split(b'\n')
+    if data.endswith(b'\n') or not data:
+        lines.pop()
+    return [line_id for line_id, line in enumerate(lines)
+            if (include_matcher is None or include_matcher.search(line.decode(encoding, errors='replace')))
+            and (exclude_matcher is None or not exclude_matcher.search(line.decode(encoding, errors='replace')))]
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "gbk", "latin-1"])
+@pytest.mark.parametrize("case_sensitive", [True, False])
+@pytest.mark.parametrize("regex", [False, True])
+def test_byte_matching_agrees_with_decoded_matching(encoding, case_sensitive, regex):
+    import random
+    rng = random.Random(23)
+    def encodable(text: str) -> bool:
+        return text.encode(encoding, errors='ignore').decode(encoding) == text
+    
+    pieces = [word for word in WORDS + ["丒", "ß", " ", "\n"] if encodable(word)]
+    terms = [["error"], ["Timeout after"], ["strasse"], ["straße"], ["日志"], ["error", "req-42"]]
+    if regex:
+        terms += [[r"req-\d+"], [r"^error\b"], [r"(?:Error|timeout) \w+"]]
+    for _ in range(40):
+        data = ''.join(rng.choice(pieces) for _ in range(rng.randint(0, 60))).encode(encoding)
+        include, exclude = rng.choice(terms + [[]]), rng.choice(terms + [[]])
+        if not all(map(encodable, include + exclude)):
+            continue
+        include_matcher = LogFilter.compile_matcher(include, case_sensitive, regex)
+        exclude_matcher = LogFilter.compile_matcher(exclude, case_sensitive, regex)
+        assert (list(LogFilter.filter_bytes(data, encoding, 0, include_matcher, exclude_matcher))
+                == decoded_reference(data, encoding, include_matcher, exclude_matcher)), (data, include, exclude)
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "latin-1"])
+def test_case_insensitive_keyword_matches_characters_folding_to_ascii(encoding):
+    data = "straße\nSTRASSE\nstrasbourg\n".encode(encoding)
+    matcher = LogFilter.compile_matcher(["strasse"], False)
+    assert list(LogFilter.filter_bytes(data, encoding, 0, matcher, None)) == [0, 1]
+    assert list(LogFilter.filter_bytes(data, encoding, 0, None, matcher)) == [2]
+
+
+def test_gbk_keyword_across_characters_is_not_a_match():
+    # The second byte of 丒 is 'E', so the raw bytes of the first line hold b'Error'
+    data = "丒rror one\nError two\n".encode('gbk')
+    assert b'Error' in data.split(b'\n')[0]
+    for regex in (False, True):
+        matcher = LogFilter.compile_matcher(["Error"], True, regex)
+        assert list(LogFilter.filter_bytes(data, 'gbk', 0, matcher, None)) == [1]
+        assert list(LogFilter.filter_bytes(data, 'gbk', 0, None, matcher)) == [0]
+
+
+def test_invalid_bytes_do_not_join_a_keyword():
+    data = b"Err\xffor one\nError two\n\xff\xfe\n"
+    for case_sensitive in (True, False):
+        matcher = LogFilter.compile_matcher(["Error"], case_sensitive)
+        assert list(LogFilter.filter_bytes(data, 'utf-8', 0, matcher, None)) == [1]
+        assert list(LogFilter.filter_bytes(data, 'utf-8', 0, None, matcher)) == [0, 2]
+
+
+@pytest.mark.parametrize("encoding", ["utf-8", "gbk"])
+@pytest.mark.parametrize("case_sensitive", [True, False])
+def test_unterminated_last_line_is_matched(encoding, case_sensitive):
+    data = "ERROR one\nok\n日志 ERROR".encode(encoding)
+    matcher = LogFilter.compile_matcher(["ERROR"], case_sensitive)
+    assert list(LogFilter.filter_bytes(data, encoding, 5, matcher, None)) == [5, 7]
+    assert list(LogFilter.filter_bytes(data, encoding, 5, None, matcher)) == [6]
+    assert list(LogFilter.filter_bytes(data, encoding, 5, None, None)) == [5, 6, 7]
@@ -0,0 +1,165 @@
+# Tests of the tail pipeline
+
+import os
+import threading
+
+import pytest
+
+from log_file import LogFile
+from log_filter import FilterQuery, LogFilter
+from log_tail import LogTailer, RotatedLogLines
+
+
+class TailRecorder:
+    """Collects the callbacks of a LogTailer"""
+
+    def __init__(self) -> None:
+        self.line_ids = []
+        self.end_line = 0
+        self.truncated = threading.Event()
+        self.rotated = threading.Event()
+        self.progress = threading.Condition()
+
+    def on_results(self, generation, line_ids, end_line) -> None:
+        with self.progress:
+            self.line_ids.extend(line_ids)
+            self.end_line = end_line
+            self.progress.notify_all()
+
+    def wait_for(self, end_line: int) -> None:
+        with self.progress:
+            assert self.progress.wait_for(lambda: self.end_line >= end_line, timeout=10), self.end_line
+
+
+def start_tailer(log_file, query, recorder) -> LogTailer:
+    tailer = LogTailer(log_file, recorder.on_results, recorder.truncated.set, recorder.rotated.set)
+    tailer.MIN_POLL_INTERVAL = 0.01
+    tailer.MAX_POLL_INTERVAL = 0.05
+    tailer.ROTATION_IDLE_TIME = 0.1
+    tailer.start(query, len(log_file))
+    return tailer
+
+
+def append(path, lines) -> None:
+    with open(path, 'a') as file:
+        file.write(''.join(lines))
+
+
+def make_line(index: int) -> str:
+    return f"12:00:00.000 {'ERROR' if index % 3 == 0 else 'INFO'} line {index}\n"
+
+
+@pytest.fixture
+def log_path(tmp_path):
+    path = str(tmp_path / "app.log")
+    append(path, map(make_line, range(10)))
+    return path
+
+
+def test_appended_lines_are_filtered_once_in_order(log_path):
+    log_file = LogFile(log_path)
+    recorder = TailRecorder()
+    tailer = start_tailer(log_file, FilterQuery.create(["ERROR"], True, [], False), recorder)
+    tailer.READ_CHUNK_SIZE = 4096
+    for first in range(10, 20010, 1000):
+        append(log_path, map(make_line, range(first, first + 1000)))
+        tailer.notify()
+    recorder.wait_for(20010)
+    tailer.stop()
+    assert recorder.line_ids == [line_id for line_id in range(10, 20010) if line_id % 3 == 0]
+    log_file.close()
+
+
+def test_partial_line_waits_for_its_line_break(log_path):
+    log_file = LogFile(log_path)
+    recorder = TailRecorder()
+    tailer = start_tailer(log_file, FilterQuery.create([], False, [], False), recorder)
+    append(log_path, ["12:00:00.000 INFO half"])
+    tailer.notify()
+    append(log_path, [" done\n"])
+    tailer.notify()
+    recorder.wait_for(11)
+    tailer.stop()
+    assert recorder.line_ids == [10]
+    assert log_file.line(10) == "12:00:00.000 INFO half done\n"
+    log_file.close()
+
+
+def test_truncation_stops_the_pipeline(log_path):
+    log_file = LogFile(log_path)
+    recorder = TailRecorder()
+    tailer = start_tailer(log_file, FilterQuery.create([], False, [], False), recorder)
+    with open(log_path, 'w') as file:
+        file.write(make_line(100))
+    tailer.notify()
+    assert recorder.truncated.wait(10)
+    tailer.stop()
+    assert tailer.stopped
+    assert log_file.refresh()
+    assert log_file.line(0) == make_line(100)
+    log_file.close()
+
+
+def test_truncation_is_noticed_after_the_file_grew_back(log_path):
+    log_file = LogFile(log_path)
+    recorder = TailRecorder()
+    tailer = start_tailer(log_file, FilterQuery.create([], False, [], False), recorder)
+    # Truncated and grown past the previous size before the reader looks, like copytruncate can
+    with open(log_path, 'w') as file:
+        file.write(''.join(make_line(index + 100) for index in range(20)))
+    tailer.notify()
+    assert recorder.truncated.wait(10)
+    tailer.stop()
+    assert recorder.line_ids == []
+    assert log_file.refresh(rebuild=True)
+    assert log_file.lines() == [make_line(index + 100) for index in range(20)]
+    log_file.close()
+
+
+def test_rotation_hands_over_after_the_old_lines(log_path):
+    log_file = LogFile(log_path)
+    recorder = TailRecorder()
+    tailer = start_tailer(log_file, FilterQuery.create([], False, [], False), recorder)
+    append(log_path, map(make_line, range(10, 15)))
+    os.rename(log_path, log_path + ".1")
+    append(log_path, map(make_line, range(100, 103)))
+    append(log_path + ".1", ["12:00:00.000 INFO last without break"])
+    tailer.notify()
+    assert recorder.rotated.wait(10)
+    tailer.stop()
+    # Every line of the old file was handed over, including the unterminated last one
+    assert recorder.line_ids == list(range(10, 16))
+    current = LogFile(log_path)
+    lines = RotatedLogLines(log_file, current)
+    assert len(lines) == 19
+    assert lines.line(15) == "12:00:00.000 INFO last without break"
+    assert lines.line(16) == make_line(100)
+    current.close()
+    log_file.close()
+
+
+def test_filter_line_range_refuses_truncated_lines(log_path):
+    log_file = LogFile(log_path)
+    matcher = LogFilter.compile_matcher(["ERROR"], True)
+    assert list(LogFilter.filter_line_range(log_file, 0, 10, matcher, None)) == [0, 3, 6, 9]
+    with open(log_path, 'r+') as file:
+        file.truncate(50)
+    assert LogFilter.filter_line_range(log_file, 0, 10, matcher, None) is None
+    log_file.close()
+
+
+def test_filter_errors_are_reported(log_path, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ValueError("broken")
+
+    monkeypatch.setattr(LogFilter, "filter_line_range", fail)
+    log_file = LogFile(log_path)
+    errors = []
+    reported = threading.Event()
+    tailer = LogTailer(log_file, lambda *args: None, lambda: None, lambda: None,
+                       lambda message: (errors.append(message), reported.set()))
+    tailer.start(FilterQuery.create([], False, [], False), 0)
+    assert reported.wait(10)
+    tailer.stop()
+    assert errors[0] == "Error filtering appended log lines: broken"
+    log_file.close()
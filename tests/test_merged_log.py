@@ -0,0 +1,90 @@
+# Tests of the merged view over several log files
+
+import heapq
+import random
+
+import pytest
+
+from log_file import LogFile
+from log_filter import FilterQuery
+from merged_log import MergedLogFiles
+
+
+def write_source(path, rng: random.Random, count: int) -> str:
+    """Write a log with ascending timestamps, a few continuation lines and jumps back in time"""
+    lines = []
+    time_ms = rng.randrange(1000)
+    for index in range(count):
+        if rng.random() < 0.1:
+            lines.append(f"  continued {index}\n")
+            continue
+        # Mostly ascending, with repeated times and the occasional jump back
+        time_ms = max(0, time_ms + rng.choice([0, 0, 1, 5, 20, 300]) - (500 if rng.random() < 0.03 else 0))
+        seconds, millis = divmod(time_ms, 1000)
+        level = rng.choice(["INFO", "WARN", "ERROR"])
+        lines.append(f"12:{seconds // 60:02d}:{seconds % 60:02d}.{millis:03d} {level} line {index}\n")
+    path.write_text(''.join(lines))
+    return str(path)
+
+
+def reference_merge(merged: MergedLogFiles, source_line_ids) -> list:
+    """Merge the lines of every source by timestamp and source, like heapq.merge"""
+    return [merged.line_id(source, line) for _, source, line in heapq.merge(*[
+        [(merged.log_files[source].timestamps[line], source, line) for line in line_ids]
+        for source, line_ids in enumerate(source_line_ids)])]
+
+
+@pytest.fixture
+def merged(tmp_path):
+    rng = random.Random(16)
+    merged = MergedLogFiles([LogFile(write_source(tmp_path / f"{name}.log", rng, count))
+                             for name, count in (("a", 400), ("b", 700), ("c", 1))])
+    yield merged
+    merged.close()
+
+
+def test_merge_orders_by_timestamp_then_source(merged, monkeypatch):
+    monkeypatch.setattr(MergedLogFiles, "MERGE_BATCH_SIZE", 64)
+    rng = random.Random(7)
+    all_line_ids = [range(len(log_file)) for log_file in merged.log_files]
+    subsets = [sorted(rng.sample(range(len(log_file)), len(log_file) // 3)) for log_file in merged.log_files]
+    assert len(list(merged.merge(all_line_ids))) > 1
+    for source_line_ids in (all_line_ids, subsets, [[], subsets[1], []], [[], [], []]):
+        batches = list(merged.merge(source_line_ids))
+        # A batch is handed over once it holds MERGE_BATCH_SIZE ids, so only the last one is smaller
+        assert all(len(batch) >= MergedLogFiles.MERGE_BATCH_SIZE for batch in batches[:-1])
+        assert [line_id for batch in batches for line_id in batch] == reference_merge(merged, source_line_ids)
+
+
+def test_equal_timestamps_keep_the_order_of_the_sources(tmp_path):
+    lines = ["12:00:00.000 INFO one\n", "12:00:00.000 INFO two\n", "12:00:01.000 INFO three\n"]
+    paths = []
+    for name in ("x", "y"):
+        (tmp_path / name).mkdir()
+        paths.append(tmp_path / name / "app.log")
+        paths[-1].write_text(''.join(lines))
+    merged = MergedLogFiles([LogFile(str(path)) for path in paths])
+    assert [merged.split_line_id(line_id) for batch in merged.merge([range(3), range(3)]) for line_id in batch] == [
+        (0, 0), (0, 1), (1, 0), (1, 1), (0, 2), (1, 2)]
+    assert merged.tags == ["[app.log#1] ", "[app.log#2] "]
+    assert merged.line(merged.line_id(1, 2)) == "[app.log#2] " + lines[2]
+    merged.close()
+
+
+def test_line_ids_hold_the_source_and_the_line(merged):
+    for source, line in ((0, 0), (1, 699), (2, 0), (1, (1 << MergedLogFiles.SOURCE_SHIFT) - 1)):
+        assert merged.split_line_id(merged.line_id(source, line)) == (source, line)
+    assert merged.tags == ["[a.log] ", "[b.log] ", "[c.log] "]
+    assert len(merged) == 1101
+
+
+def test_filter_merges_the_matches_of_every_source(merged):
+    query = FilterQuery.create(["error"], False, [], False, None, None, False, False, None)
+    source_line_ids = [[line for line in range(len(log_file)) if "error" in log_file.line(line).casefold()]
+                       for log_file in merged.log_files]
+    batches = []
+    result = merged.filter(query, workers=1, batch=batches.append)
+    assert list(result) == reference_merge(merged, source_line_ids)
+    assert [line_id for batch in batches for line_id in batch] == list(result)
+    # A second run is served from the caches of the sources
+    assert list(merged.filter(query, workers=1)) == list(result)
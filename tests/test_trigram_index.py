@@ -0,0 +1,82 @@
+# Tests of the trigram index narrowing keyword filters
+
+import random
+
+import pytest
+
+from log_file import LogFile
+from log_filter import LogFilter
+from trigram_index import TrigramIndex, decode_postings, encode_postings, last_posting
+
+
+@pytest.mark.parametrize("block_ids", [[], [0], [5, 6, 7], [0, 127, 128, 300, 70000, 2 ** 32 - 1]])
+def test_posting_lists_round_trip(block_ids):
+    encoded = encode_postings(block_ids)
+    assert list(decode_postings(encoded)) == block_ids
+    assert last_posting(encoded) == (block_ids[-1] if block_ids else 0)
+
+
+def test_posting_lists_append_to_an_encoded_list():
+    rng = random.Random(2)
+    block_ids = sorted(rng.sample(range(100000), 500))
+    for split in (0, 1, 250, 500):
+        head, tail = block_ids[:split], block_ids[split:]
+        encoded = encode_postings(head) + encode_postings(tail, last_posting(encode_postings(head)))
+        assert list(decode_postings(encoded)) == block_ids
+
+
+def write_lines(path, lines) -> None:
+    with open(path, 'a', encoding='utf-8') as file:
+        file.write(''.join(line + '\n' for line in lines))
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(TrigramIndex, "BLOCK_SIZE", 256)
+    monkeypatch.setattr(TrigramIndex, "TASK_SIZE", 2048)
+
+
+WORDS = ["connection", "refused", "Timeout", "straße", "日志", "id=ff00", "retry", "OK"]
+
+
+def random_lines(rng, count):
+    return [f"12:00:00.000 {' '.join(rng.choice(WORDS) for _ in range(rng.randint(0, 4)))}" for _ in range(count)]
+
+
+def test_extending_matches_building_at_once(tmp_path, small_blocks):
+    rng = random.Random(3)
+    lines = random_lines(rng, 3000)
+    path = tmp_path / "a.log"
+    write_lines(path, lines[:700])
+    growing = LogFile(str(path))
+    extended = TrigramIndex()
+    extended.extend(growing)
+    write_lines(path, lines[700:])
+    growing.grow()
+    extended.extend(growing)
+    built = TrigramIndex()
+    built.extend(growing)
+    assert extended.postings == built.postings
+    assert extended.block_starts == built.block_starts
+    growing.close()
+
+
+@pytest.mark.parametrize("case_sensitive", [True, False])
+def test_candidate_windows_cover_every_match(tmp_path, small_blocks, case_sensitive):
+    rng = random.Random(5)
+    path = tmp_path / "a.log"
+    write_lines(path, random_lines(rng, 2000))
+    log_file = LogFile(str(path))
+    index = TrigramIndex()
+    index.extend(log_file)
+    for terms in (["refused"], ["Timeout", "retry"], ["STRASSE"], ["id=ff00"], ["ss"]):
+        windows = index.candidate_windows(terms, case_sensitive, len(log_file))
+        matcher = LogFilter.compile_matcher(terms, case_sensitive)
+        matches = LogFilter.filter_line_ids(log_file, matcher, None)
+        if windows is None:
+            # Too short to narrow anything down
+            assert min(map(len, terms)) < 3
+            continue
+        assert all(any(start <= line_id < end for start, end in windows) for line_id in matches), terms
+        assert sum(end - start for start, end in windows) <= len(log_file)
+    log_file.close()
@@ -0,0 +1,205 @@
+# Text search over the rows of the result view, used by Ctrl+F
+# Kept free of Qt imports, so it runs in a worker thread and in the benchmarks
+
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Callable, Iterator, Optional, Sequence, Tuple
+
+from log_file import LogFile
+from log_filter import FilterCancelled
+from perf_trace import tracer
+
+# Callback receiving the number of rows searched so far and the total number of rows
+SearchProgress = Callable[[int, int], None]
+
+
+class SearchMatches:
+    """Positions of all occurrences of a text in the result rows
+
+    Positions are kept sorted by row and column in two compact arrays, so
+    millions of matches cost a few bytes each and any match can be reached
+    by its index. Rows can be dropped from the front as the result view
+    drops its oldest rows: dropped matches are only skipped and compacted
+    away once they make up half of the arrays, like LogResultModel does.
+    """
+
+    def __init__(self, length: int = 0) -> None:
+        """Create an empty match list
+
+        Args:
+            length: Length of every match in characters
+        """
+        self.length: int = length
+        self.rows: array = array('Q')
+        self.columns: array = array('L')
+        # Matches at the start of the arrays that were dropped but not compacted away yet
+        self.first: int = 0
+        # Rows dropped from the front, stored rows count from before the drops
+        self.row_offset: int = 0
+
+    def __len__(self) -> int:
+        return len(self.rows) - self.first
+
+    def __getitem__(self, index: int) -> Tuple[int, int]:
+        """Get the row and column of a match"""
+        if not 0 <= index < len(self):
+            raise IndexError("match index out of range")
+        index += self.first
+        return self.rows[index] - self.row_offset, self.columns[index]
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        offset = self.row_offset
+        for index in range(self.first, len(self.rows)):
+            yield self.rows[index] - offset, self.columns[index]
+
+    def index_of_row(self, row: int) -> int:
+        """Get the index of the first match in a row or after it, len(self) if there is none"""
+        return bisect_left(self.rows, row + self.row_offset, self.first) - self.first
+
+    def append(self, row: int, column: int) -> None:
+        self.rows.append(row + self.row_offset)
+        self.columns.append(column)
+
+    def drop_rows(self, count: int) -> int:
+        """Forget the matches in the first rows and renumber the others
+
+        Args:
+            count: Number of rows removed from the front
+
+        Returns:
+            Number of matches dropped
+        """
+        if count <= 0:
+            return 0
+        self.row_offset += count
+        end = bisect_left(self.rows, self.row_offset, self.first)
+        dropped = end - self.first
+        self.first = end
+        if self.first * 2 >= len(self.rows):
+            del self.rows[:self.first]
+            del self.columns[:self.first]
+            self.first = 0
+        return dropped
+
+
+class TextSearch:
+    """Finds every occurrence of a text in a list of log lines
+
+    Lines are searched in batches. Every batch is joined into one text and
+    scanned with str.find, so the cost per line stays a slice and the cost
+    per match a few calls into C. For a LogFile the raw bytes of a batch are
+    decoded at once, and contiguous lines are read as one slice of the
+    mapping. Like the previous row by row search, case is ignored by
+    lowering the text, and overlapping occurrences are all reported.
+    """
+
+    # Lines searched per batch, cancellation is checked between batches
+    BATCH_LINES: int = 32768
+
+    @classmethod
+    def find_all(cls, source, line_ids: Sequence[int], text: str, case_sensitive: bool = False,
+                 progress: Optional[SearchProgress] = None,
+                 cancel_event: Optional[threading.Event] = None) -> SearchMatches:
+        """Find all occurrences of a text in the given lines
+
+        Args:
+            source: Object providing line(index) -> str, such as a LogFile
+            line_ids: Ids of the searched lines, one per result row
+            text: Text to find
+            case_sensitive: Whether case must match
+            progress: Optional callback receiving the rows searched and the total
+            cancel_event: Optional event, the search stops when it is set
+
+        Returns:
+            Positions of the matches, rows are indexes into line_ids
+
+        Raises:
+            FilterCancelled: If cancel_event was set before the search finished
+        """
+        matches = SearchMatches(len(text))
+        total = len(line_ids)
+        if not text or not total:
+            return matches
+        needle = text if case_sensitive else text.lower()
+        read_batch = cls._read_bytes_batch if cls._can_read_bytes(source) else cls._read_text_batch
+        with tracer.span("search", lines=total):
+            for start in range(0, total, cls.BATCH_LINES):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise FilterCancelled()
+                batch = line_ids[start:start + cls.BATCH_LINES]
+                with tracer.span("read"):
+                    batch_text = read_batch(source, batch)
+                cls._find_in_batch(batch_text, needle, case_sensitive, start, matches)
+                if progress:
+                    progress(start + len(batch), total)
+        return matches
+
+    @staticmethod
+    def _can_read_bytes(source) -> bool:
+        """Check whether batches can be decoded at once, splitting at line break bytes"""
+        if not isinstance(source, LogFile):
+            return False
+        try:
+            return '\n'.encode(source.encoding) == b'\n'
+        except LookupError:
+            return False
+
+    @staticmethod
+    def _read_bytes_batch(log_file: LogFile, line_ids: Sequence[int]) -> str:
+        """Decode a batch of lines of a LogFile, each ending with a line break"""
+        offsets = log_file.offsets
+        first, last = line_ids[0], line_ids[-1]
+        if last - first == len(line_ids) - 1:
+            # Contiguous lines, such as an unfiltered file
+            data = log_file.read_bytes(offsets[first], offsets[last + 1])
+        else:
+            data = log_file.read_lines(line_ids)
+        text = data.decode(log_file.encoding, errors='ignore')
+        # Only the last line of a file can lack its line break
+        return text if text.endswith('\n') else text + '\n'
+
+    @staticmethod
+    def _read_text_batch(source, line_ids: Sequence[int]) -> str:
+        """Join a batch of lines of any source, each ending with a line break"""
+        lines = [source.line(line_id) for line_id in line_ids]
+        return ''.join([line if line.endswith('\n') else line + '\n' for line in lines])
+
+    @staticmethod
+    def _find_in_batch(text: str, needle: str, case_sensitive: bool, first_row: int,
+                       matches: SearchMatches) -> None:
+        """Add the matches in the joined text of a batch
+
+        Args:
+            text: Lines of the batch, each ending with a line break
+            needle: Text to find, lowered unless case_sensitive
+            case_sensitive: Whether the text is searched as is
+            first_row: Row of the first line of the batch
+            matches: Receives the matches
+        """
+        if not case_sensitive:
+            lowered = text.lower()
+            if len(lowered) != len(text):
+                # A few characters lower to more than one, columns are counted in each lowered line
+                for row, line in enumerate(text.split('\n')[:-1], first_row):
+                    line = line.lower()
+                    column = line.find(needle)
+                    while column >= 0:
+                        matches.append(row, column)
+                        column = line.find(needle, column + 1)
+                return
+            text = lowered
+        find = text.find
+        count = text.count
+        position = find(needle)
+        row = first_row
+        line_start = 0
+        scanned = 0
+        while position >= 0:
+            breaks = count('\n', scanned, position)
+            if breaks:
+                row += breaks
+                line_start = text.rfind('\n', scanned, position) + 1
+            scanned = position
+            matches.append(row, position - line_start)
+            position = find(needle, position + 1)
@@ -0,0 +1,196 @@
+# Log volume per time bucket for the timeline strip
+# Kept free of Qt imports, so the histograms are built in a worker thread and in the benchmarks
+
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from index_arrays import CHUNK_LINES, gather, iter_chunks
+from log_file import DAY_MS, LOG_LEVELS, LogFile
+from merged_log import MergedLogFiles
+from perf_trace import tracer
+
+
+class TimeHistogram:
+    """Number of lines per time bucket over one day
+
+    Timestamps are times of day, so the day is split into BUCKETS fixed
+    buckets and the counts live in one NumPy array. Values are added from
+    copies of slices of the timestamp arrays with np.bincount, so a hundred
+    million lines are counted without a Python-level pass over them. Lines
+    before the first timestamp are not counted.
+    """
+
+    # Milliseconds covered by one bucket
+    BUCKET_MS: int = 100
+
+    BUCKETS: int = DAY_MS // BUCKET_MS
+
+    # Fewer values than this are counted in place instead of through a bincount over every bucket
+    SMALL_UPDATE: int = BUCKETS // 16
+
+    def __init__(self) -> None:
+        self.counts: np.ndarray = np.zeros(self.BUCKETS, dtype=np.int64)
+        # Number of counted lines
+        self.total: int = 0
+
+    def clear(self) -> None:
+        self.counts.fill(0)
+        self.total = 0
+
+    def add_times(self, times: np.ndarray, sign: int = 1) -> None:
+        """Count timestamps in their buckets
+
+        Args:
+            times: Times of day in milliseconds, negative values are skipped
+            sign: 1 to add the lines, -1 to remove lines counted before
+        """
+        if not len(times):
+            return
+        if times.min() < 0:
+            times = times[times >= 0]
+        buckets = np.minimum(times // self.BUCKET_MS, self.BUCKETS - 1)
+        if len(buckets) < self.SMALL_UPDATE:
+            np.add.at(self.counts, buckets, sign)
+        else:
+            self.counts += sign * np.bincount(buckets, minlength=self.BUCKETS)
+        self.total += sign * len(buckets)
+
+    def add_lines(self, timestamps: array, start: int, end: int) -> None:
+        """Count the lines in a range of a timestamp array"""
+        for _, chunk in iter_chunks(timestamps, start, end, np.int64):
+            self.add_times(chunk)
+
+    def add_line_ids(self, timestamps: array, line_ids: np.ndarray, sign: int = 1) -> None:
+        """Count the lines with the given ids
+
+        Args:
+            timestamps: Timestamps of the lines, indexed by line id
+            line_ids: Ids of the lines in ascending order, as unsigned 64-bit integers
+            sign: 1 to add the lines, -1 to remove lines counted before
+        """
+        self.add_times(gather(timestamps, line_ids, np.int64), sign)
+
+    def sums(self, first: int, end: int, columns: int) -> np.ndarray:
+        """Add up the buckets of a range into evenly spread columns
+
+        Args:
+            first: First bucket of the range
+            end: Bucket after the last one of the range
+            columns: Number of columns, at most the number of buckets in the range
+
+        Returns:
+            Count of every column
+        """
+        edges = np.arange(columns, dtype=np.int64) * (end - first) // columns
+        return np.add.reduceat(self.counts[first:end], edges)
+
+    def used_range(self) -> Optional[Tuple[int, int]]:
+        """Get the first bucket holding lines and the bucket after the last one, None if there is none"""
+        used = np.flatnonzero(self.counts)
+        if not len(used):
+            return None
+        return int(used[0]), int(used[-1]) + 1
+
+
+class Timeline:
+    """Line counts and match counts per time bucket of a log file or merged view
+
+    Line counts, and the line counts per level shown by the level buttons,
+    only grow by the lines indexed since the last update, so following a
+    tailed file costs as much as its new lines. Match counts follow the
+    rows of the result view: rows added or dropped are added to or removed
+    from them.
+    """
+
+    def __init__(self, log_file: LogFile | MergedLogFiles) -> None:
+        self.log_file = log_file
+        self.lines: TimeHistogram = TimeHistogram()
+        # Number of lines on every level, indexed by level code
+        self.level_counts: np.ndarray = np.zeros(len(LOG_LEVELS), dtype=np.int64)
+        # Counts of the shown rows, None while the rows are not matches of a filter
+        self.matches: Optional[TimeHistogram] = None
+        # Complete lines counted so far, per source file
+        self.counted_lines: List[int] = [0] * len(self.sources())
+
+    def sources(self) -> List[LogFile]:
+        if isinstance(self.log_file, MergedLogFiles):
+            return self.log_file.log_files
+        return [self.log_file]
+
+    def ensure_timestamps(self) -> None:
+        """Parse the timestamps and levels of every source, so that they follow the index from now on"""
+        for log_file in self.sources():
+            log_file.ensure_timestamps()
+
+    def update_lines(self) -> bool:
+        """Count the lines indexed since the last update
+
+        Returns:
+            True if any count changed
+        """
+        changed = False
+        for source, log_file in enumerate(self.sources()):
+            timestamps = log_file.timestamps
+            levels = log_file.levels
+            if timestamps is None or levels is None:
+                continue
+            # A partial last line may still get another timestamp
+            end = min(len(timestamps), len(levels), log_file.complete_line_count)
+            start = self.counted_lines[source]
+            if end < start:
+                # Truncated and indexed again, count every source from scratch
+                self.lines.clear()
+                self.level_counts.fill(0)
+                self.counted_lines = [0] * len(self.counted_lines)
+                return self.update_lines()
+            if end > start:
+                with tracer.span("timeline.lines", lines=end - start):
+                    self.lines.add_lines(timestamps, start, end)
+                    for _, chunk in iter_chunks(levels, start, end, np.uint8):
+                        self.level_counts += np.bincount(chunk, minlength=len(LOG_LEVELS))[:len(LOG_LEVELS)]
+                self.counted_lines[source] = end
+                changed = True
+        return changed
+
+    def reset_matches(self, enabled: bool) -> None:
+        """Drop the match counts
+
+        Args:
+            enabled: Whether the shown rows are matches to count from now on
+        """
+        if not enabled:
+            self.matches = None
+        elif self.matches is None:
+            self.matches = TimeHistogram()
+        else:
+            self.matches.clear()
+
+    def add_matches(self, line_ids: Sequence[int], start: int, end: int, sign: int = 1) -> None:
+        """Add or remove a range of the shown rows to or from the match counts
+
+        Args:
+            line_ids: Array of the line ids of the shown rows
+            start: Index of the first row of the range in line_ids
+            end: Index after the last row of the range
+            sign: 1 for rows added to the view, -1 for rows dropped from it
+        """
+        if self.matches is None or end <= start:
+            return
+        with tracer.span("timeline.matches", rows=end - start):
+            for chunk_start in range(start, end, CHUNK_LINES):
+                chunk = line_ids[chunk_start:min(end, chunk_start + CHUNK_LINES)]
+                self._add_match_ids(np.frombuffer(chunk, dtype=np.uint64), sign)
+
+    def _add_match_ids(self, line_ids: np.ndarray, sign: int) -> None:
+        if not isinstance(self.log_file, MergedLogFiles):
+            self.matches.add_line_ids(self.log_file.timestamps, line_ids, sign)
+            return
+        # Merged ids are in time order, split them into the ascending line numbers of every source
+        shift = np.uint64(MergedLogFiles.SOURCE_SHIFT)
+        sources = line_ids >> shift
+        lines = line_ids & np.uint64((1 << MergedLogFiles.SOURCE_SHIFT) - 1)
+        for source in np.unique(sources).tolist():
+            source_lines = np.sort(lines[sources == source])
+            self.matches.add_line_ids(self.log_file.log_files[source].timestamps, source_lines, sign)
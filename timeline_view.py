@@ -0,0 +1,163 @@
+# Timeline strip for Log Insight
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+from PyQt6.QtWidgets import QToolTip, QWidget
+from PyQt6.QtGui import QColor, QFont, QMouseEvent, QPainter, QPaintEvent, QPalette
+from PyQt6.QtCore import QRectF, Qt, pyqtSignal
+
+from log_filter import LogFilter
+from timeline import TimeHistogram, Timeline
+
+
+class TimelineView(QWidget):
+    """Strip showing the number of lines and of matches per time bucket
+
+    The buckets of the shown time range are added up into one bar per
+    column of pixels, so painting costs the same for any number of lines.
+    Dragging over the strip selects a time range and a click selects the
+    time span of one bar. The strip then zooms into the selection, a right
+    click goes back to the range shown before.
+    """
+
+    # Emitted with the first and the last millisecond of a selected time range
+    rangeSelected = pyqtSignal(int, int)
+
+    STRIP_HEIGHT: int = 56
+
+    # Pixels the mouse must move while pressed before a click becomes a drag
+    DRAG_DISTANCE: int = 3
+
+    LINE_COLOR = QColor(70, 130, 180)
+    MATCH_COLOR = QColor(255, 140, 0)
+    SELECTION_COLOR = QColor(128, 128, 128, 80)
+
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.timeline: Optional[Timeline] = None
+        # Shown buckets as (first, end), None for every bucket holding lines
+        self.view_range: Optional[Tuple[int, int]] = None
+        # Ranges shown before each zoom, a right click goes back to the last one
+        self.zoom_history: List[Optional[Tuple[int, int]]] = []
+        # Pixel columns where the mouse was pressed and where it is dragged to
+        self._press_x: Optional[float] = None
+        self._drag_x: Optional[float] = None
+        self.setFixedHeight(self.STRIP_HEIGHT)
+        self.setMouseTracking(True)
+
+    def set_timeline(self, timeline: Optional[Timeline]) -> None:
+        """Show the counts of another log file, zoomed out"""
+        self.timeline = timeline
+        self.view_range = None
+        self.zoom_history = []
+        self.update()
+
+    def shown_range(self) -> Optional[Tuple[int, int]]:
+        """Get the first shown bucket and the bucket after the last one, None if nothing is shown"""
+        if self.timeline is None:
+            return None
+        return self.view_range or self.timeline.lines.used_range()
+
+    def _columns(self) -> Optional[Tuple[int, int, int]]:
+        """Get the shown range and the number of bars it is split into"""
+        shown = self.shown_range()
+        if shown is None or self.width() <= 0:
+            return None
+        first, end = shown
+        return first, end, min(self.width(), end - first)
+
+    def _column_at(self, x: float, column_count: int) -> int:
+        return min(column_count - 1, max(0, int(x * column_count / self.width())))
+
+    def _column_buckets(self, column: int, first: int, end: int, columns: int) -> Tuple[int, int]:
+        """Get the first bucket of a bar and the bucket after its last one, like TimeHistogram.sums"""
+        return first + column * (end - first) // columns, first + (column + 1) * (end - first) // columns
+
+    def paintEvent(self, event: QPaintEvent) -> None:
+        painter = QPainter(self)
+        palette = self.palette()
+        painter.fillRect(self.rect(), palette.color(QPalette.ColorRole.Window))
+        columns = self._columns()
+        if columns is None:
+            return
+        first, end, column_count = columns
+        bar_width = self.width() / column_count
+        height = self.height()
+
+        line_sums = self.timeline.lines.sums(first, end, column_count)
+        match_sums = None
+        if self.timeline.matches is not None:
+            match_sums = self.timeline.matches.sums(first, end, column_count)
+        peak = max(int(line_sums.max()), 1)
+        for sums, color in ((line_sums, self.LINE_COLOR), (match_sums, self.MATCH_COLOR)):
+            if sums is None:
+                continue
+            # Any bar holding lines gets at least one pixel, matches counted ahead of the lines are cut off
+            bar_heights = np.clip(sums * height // peak, np.minimum(sums, 1), height).tolist()
+            for column in np.flatnonzero(sums).tolist():
+                bar_height = bar_heights[column]
+                painter.fillRect(QRectF(column * bar_width, height - bar_height, bar_width, bar_height), color)
+
+        if self._press_x is not None and self._drag_x is not None:
+            left, right = sorted((self._press_x, self._drag_x))
+            painter.fillRect(QRectF(left, 0, right - left, height), self.SELECTION_COLOR)
+
+        # Bounds of the shown range
+        font = QFont(self.font())
+        font.setPointSize(8)
+        painter.setFont(font)
+        painter.setPen(palette.color(QPalette.ColorRole.WindowText))
+        flags = Qt.AlignmentFlag.AlignTop
+        painter.drawText(self.rect().adjusted(4, 2, -4, 0), flags | Qt.AlignmentFlag.AlignLeft,
+                         LogFilter.format_time(first * TimeHistogram.BUCKET_MS))
+        painter.drawText(self.rect().adjusted(4, 2, -4, 0), flags | Qt.AlignmentFlag.AlignRight,
+                         LogFilter.format_time(end * TimeHistogram.BUCKET_MS - 1))
+
+    def mousePressEvent(self, event: QMouseEvent) -> None:
+        if event.button() == Qt.MouseButton.LeftButton:
+            self._press_x = event.position().x()
+            self._drag_x = None
+        elif event.button() == Qt.MouseButton.RightButton and self.zoom_history:
+            self.view_range = self.zoom_history.pop()
+            self.update()
+
+    def mouseMoveEvent(self, event: QMouseEvent) -> None:
+        x = event.position().x()
+        if self._press_x is not None:
+            if self._drag_x is not None or abs(x - self._press_x) >= self.DRAG_DISTANCE:
+                self._drag_x = min(max(x, 0.0), float(self.width()))
+                self.update()
+            return
+        columns = self._columns()
+        if columns is None:
+            return
+        # Show the time span and the counts of the bar under the mouse
+        column = self._column_at(x, columns[2])
+        start, end = self._column_buckets(column, *columns)
+        lines = int(self.timeline.lines.counts[start:end].sum())
+        text = (f"{LogFilter.format_time(start * TimeHistogram.BUCKET_MS)} - "
+                f"{LogFilter.format_time(end * TimeHistogram.BUCKET_MS - 1)}\n{lines:,} lines")
+        if self.timeline.matches is not None:
+            text += f", {int(self.timeline.matches.counts[start:end].sum()):,} matches"
+        QToolTip.showText(event.globalPosition().toPoint(), text, self)
+
+    def mouseReleaseEvent(self, event: QMouseEvent) -> None:
+        if event.button() != Qt.MouseButton.LeftButton or self._press_x is None:
+            return
+        press_x, drag_x = self._press_x, self._drag_x
+        self._press_x = self._drag_x = None
+        columns = self._columns()
+        if columns is None:
+            return
+        if drag_x is None:
+            # A click selects the bar under the mouse
+            start, end = self._column_buckets(self._column_at(press_x, columns[2]), *columns)
+        else:
+            left, right = sorted((press_x, drag_x))
+            start = self._column_buckets(self._column_at(left, columns[2]), *columns)[0]
+            end = self._column_buckets(self._column_at(right, columns[2]), *columns)[1]
+        self.zoom_history.append(self.view_range)
+        self.view_range = (start, end)
+        self.update()
+        self.rangeSelected.emit(start * TimeHistogram.BUCKET_MS, end * TimeHistogram.BUCKET_MS - 1)
@@ -0,0 +1,379 @@
+# Trigram index for fast keyword filtering in Log Insight
+# Kept free of Qt imports so that it can be built in worker processes
+
+import os
+import re
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Executor
+from functools import lru_cache
+from itertools import accumulate, chain, repeat
+from operator import sub
+from typing import Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+from log_file import LogFile, ascii_compatible, read_file_range
+
+# Cuts a byte string into trigrams starting at every third byte
+TRIGRAM_PATTERN = re.compile(rb'...', re.DOTALL)
+
+# Runs of ASCII characters in a casefolded keyword
+ASCII_RUN_PATTERN = re.compile(r'[\x00-\x7f]+')
+
+# Non-ASCII characters that casefold to ASCII letters, such as 'ß' to 'ss'
+FOLD_TO_ASCII_CHARS: str = ''.join(char for char in map(chr, range(0x80, 0x10000))
+                                   if any(folded.isascii() for folded in char.casefold()))
+
+
+def block_trigrams(data: bytes) -> Set[bytes]:
+    """Get the lowercased trigrams inside the whitespace separated tokens of a block
+
+    Args:
+        data: Raw bytes of one or more lines
+
+    Returns:
+        Set of distinct trigrams
+    """
+    # Logs repeat most of their tokens, so deduplicate before cutting them up.
+    # Trigrams spanning the separator are never looked up, as keywords are
+    # split at whitespace as well.
+    tokens = b'\n'.join(set(data.lower().split()))
+    trigrams = set(TRIGRAM_PATTERN.findall(tokens))
+    trigrams.update(TRIGRAM_PATTERN.findall(tokens, 1))
+    trigrams.update(TRIGRAM_PATTERN.findall(tokens, 2))
+    return trigrams
+
+
+def encode_postings(block_ids: Iterable[int], previous: int = 0) -> bytes:
+    """Compress ascending block ids into delta encoded varints
+
+    Args:
+        block_ids: Ascending block ids
+        previous: Last block id of the posting list the result is appended to
+
+    Returns:
+        Encoded posting list, one byte per id for ids close to each other
+    """
+    block_ids = array('I', block_ids)
+    deltas = list(map(sub, block_ids, chain((previous,), block_ids)))
+    if not deltas or max(deltas) < 0x80:
+        return bytes(deltas)
+    encoded = bytearray()
+    for delta in deltas:
+        while delta >= 0x80:
+            encoded.append(delta & 0x7f | 0x80)
+            delta >>= 7
+        encoded.append(delta)
+    return bytes(encoded)
+
+
+def decode_postings(data: bytes) -> array:
+    """Expand a posting list compressed by encode_postings
+
+    Args:
+        data: Encoded posting list
+
+    Returns:
+        Array of ascending block ids
+    """
+    if data.isascii():
+        # Every delta fits in a single byte
+        return array('I', accumulate(data))
+    block_ids = array('I')
+    block_id = delta = shift = 0
+    for byte in data:
+        delta |= (byte & 0x7f) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            block_id += delta
+            block_ids.append(block_id)
+            delta = shift = 0
+    return block_ids
+
+
+def last_posting(data: bytes) -> int:
+    """Get the last block id of a posting list compressed by encode_postings, 0 if it is empty"""
+    if data.isascii():
+        return sum(data)
+    return decode_postings(data)[-1]
+
+
+@lru_cache(maxsize=None)
+def fold_pattern(encoding: str) -> Optional[Pattern]:
+    """Get a pattern finding characters that casefold to ASCII in encoded data"""
+    encoded_chars = []
+    for char in FOLD_TO_ASCII_CHARS:
+        try:
+            encoded_chars.append(re.escape(char.encode(encoding)))
+        except UnicodeEncodeError:
+            continue
+    return re.compile(b'|'.join(encoded_chars)) if encoded_chars else None
+
+
+def _index_blocks(path: str, encoding: str, bounds: List[int],
+                  first_block: int) -> Tuple[Dict[bytes, array], array, array]:
+    """Index consecutive blocks of a log file in a worker process
+
+    Args:
+        path: Path of the log file
+        encoding: Encoding of the log file
+        bounds: Byte offsets where the blocks start, followed by the end of the last one
+        first_block: Id of the first block
+
+    Returns:
+        Tuple of the block ids per trigram, the ids of blocks with undecodable
+        bytes and the ids of blocks with characters that casefold to ASCII
+    """
+    return _index_data(read_file_range(path, bounds[0], bounds[-1]), encoding, bounds, first_block)
+
+
+def _index_data(data: bytes, encoding: str, bounds: List[int],
+                first_block: int) -> Tuple[Dict[bytes, array], array, array]:
+    """Index consecutive blocks of raw log data starting at byte offset bounds[0], see _index_blocks"""
+    base = bounds[0]
+    folding_pattern = fold_pattern(encoding)
+    postings: Dict[bytes, array] = {}
+    undecodable_blocks = array('I')
+    folding_blocks = array('I')
+    for block_id, (start, end) in enumerate(zip(bounds, bounds[1:]), first_block):
+        block = data[start - base:end - base]
+        trigrams = block_trigrams(block)
+        for trigram in trigrams.difference(postings):
+            postings[trigram] = array('I')
+        # Append the block id to every posting list without a Python level loop
+        deque(map(array.append, map(postings.__getitem__, trigrams), repeat(block_id)), maxlen=0)
+        try:
+            block.decode(encoding)
+        except UnicodeDecodeError:
+            undecodable_blocks.append(block_id)
+        if folding_pattern and folding_pattern.search(block):
+            folding_blocks.append(block_id)
+    return postings, undecodable_blocks, folding_blocks
+
+
+class TrigramIndex:
+    """Inverted index from trigrams to the blocks of lines containing them
+
+    The file is split at line boundaries into blocks of about BLOCK_SIZE
+    bytes. For every lowercased trigram, a compressed posting list records
+    the blocks it occurs in. A keyword can only occur in the blocks holding
+    all of its trigrams, so include keywords narrow the lines that have to
+    be matched down to a few blocks. The index only prunes, the exact check
+    is still done by the keyword matcher.
+    """
+
+    # Approximate number of bytes per block
+    BLOCK_SIZE: int = 64 * 1024
+
+    # Approximate number of bytes indexed by one worker task
+    TASK_SIZE: int = 16 * 1024 * 1024
+
+    # Unindexed bytes at the end of a growing file worth extending the index for
+    EXTEND_SIZE: int = 4 * 1024 * 1024
+
+    def __init__(self, encoding: str = 'utf-8') -> None:
+        self.encoding: str = encoding
+        # First line of every block, followed by the line after the last block
+        self.block_starts: array = array('Q', [0])
+        # Compressed posting list of every trigram
+        self.postings: Dict[bytes, bytes] = {}
+        # Blocks that always have to be matched, see candidate_blocks
+        self.undecodable_blocks: array = array('I')
+        self.folding_blocks: array = array('I')
+        self.cancelled: bool = False
+
+    @property
+    def line_count(self) -> int:
+        """Number of lines covered by the index"""
+        return self.block_starts[-1]
+
+    @property
+    def block_count(self) -> int:
+        return len(self.block_starts) - 1
+
+    @staticmethod
+    def supports(encoding: str) -> bool:
+        """Check whether files in an encoding can be indexed
+
+        Trigrams are taken from raw bytes, so ASCII text has to be encoded as
+        plain ASCII bytes.
+        """
+        return ascii_compatible(encoding)
+
+    def cancel(self) -> None:
+        """Stop a build running in another thread after its current task"""
+        self.cancelled = True
+
+    def unindexed_size(self, log_file: LogFile) -> int:
+        """Get the number of bytes of complete lines that are not covered yet"""
+        offsets = log_file.offsets
+        return offsets[log_file.complete_line_count] - offsets[min(self.line_count, len(log_file))]
+
+    def extend(self, log_file: LogFile, executor: Optional[Executor] = None) -> None:
+        """Index the complete lines of a log file that are not covered yet
+
+        An index that is already in use can be extended from another thread.
+        New blocks only become visible once block_starts covers them, see
+        candidate_windows.
+
+        Args:
+            log_file: Indexed log file
+            executor: Process pool to index blocks in, None to index in this thread.
+                Files the workers cannot read directly are always indexed in this thread
+        """
+        offsets = log_file.offsets
+        end_line = log_file.complete_line_count
+        block_starts = [self.line_count]
+        while block_starts[-1] < end_line:
+            start = block_starts[-1]
+            end = bisect_left(offsets, offsets[start] + self.BLOCK_SIZE, start + 1)
+            block_starts.append(min(end, end_line))
+        if len(block_starts) < 2:
+            return
+
+        blocks_per_task = max(1, self.TASK_SIZE // self.BLOCK_SIZE)
+        tasks = [
+            (log_file.path, log_file.encoding,
+             [offsets[line] for line in block_starts[first:first + blocks_per_task + 1]],
+             self.block_count + first)
+            for first in range(0, len(block_starts) - 1, blocks_per_task)
+        ]
+
+        # Posting lists of the new blocks, encoded as the results arrive so that
+        # only compressed lists are held until they are merged
+        new_postings: Dict[bytes, bytearray] = {}
+        last_blocks: Dict[bytes, int] = {}
+        if executor is None or not log_file.worker_readable:
+            results = (_index_data(log_file.read_bytes(bounds[0], bounds[-1]), encoding, bounds, first_block)
+                       for _, encoding, bounds, first_block in tasks)
+        else:
+            results = self._run_tasks(executor, tasks)
+        for postings, undecodable_blocks, folding_blocks in results:
+            if self.cancelled:
+                return
+            for trigram, block_ids in postings.items():
+                last_block = last_blocks.get(trigram)
+                if last_block is None:
+                    new_postings[trigram] = bytearray()
+                    last_block = last_posting(self.postings.get(trigram, b''))
+                new_postings[trigram] += encode_postings(block_ids, last_block)
+                last_blocks[trigram] = block_ids[-1]
+            self.undecodable_blocks.extend(undecodable_blocks)
+            self.folding_blocks.extend(folding_blocks)
+
+        for trigram, encoded in new_postings.items():
+            self.postings[trigram] = self.postings.get(trigram, b'') + encoded
+        self.block_starts.extend(block_starts[1:])
+
+    def _run_tasks(self, executor: Executor, tasks: List[tuple]) -> Iterable[tuple]:
+        """Run index tasks in a process pool, yielding results in order
+
+        Only a few tasks are queued at a time, so that filter runs sharing the
+        pool do not wait for the whole index to be built.
+        """
+        max_pending = os.cpu_count() or 1
+        pending = deque()
+        for task in tasks:
+            if self.cancelled:
+                break
+            pending.append(executor.submit(_index_blocks, *task))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+    def candidate_blocks(self, terms: List[str], case_sensitive: bool) -> Optional[Set[int]]:
+        """Find the blocks that can contain any of the keywords
+
+        Blocks with undecodable bytes are always included, since decoding
+        drops those bytes and can join a keyword across them. Case insensitive
+        keywords also include the blocks with characters like 'ß' that
+        casefold to ASCII letters.
+
+        Args:
+            terms: Keywords, of which a line has to contain at least one
+            case_sensitive: Whether the keywords are matched case sensitively
+
+        Returns:
+            Set of block ids, or None if a keyword is too short to narrow the blocks
+        """
+        candidates = set()
+        for term in terms:
+            blocks = self._term_blocks(term, case_sensitive)
+            if blocks is None:
+                return None
+            candidates.update(blocks)
+        candidates.update(self.undecodable_blocks)
+        if not case_sensitive:
+            candidates.update(self.folding_blocks)
+        return candidates
+
+    def _term_blocks(self, term: str, case_sensitive: bool) -> Optional[Set[int]]:
+        """Find the blocks holding every trigram of a keyword"""
+        if case_sensitive:
+            try:
+                pieces = term.encode(self.encoding).lower().split()
+            except UnicodeEncodeError:
+                return None
+        else:
+            # Only ASCII characters casefold the same way as the lowercased index
+            pieces = [piece for run in ASCII_RUN_PATTERN.findall(term.casefold())
+                      for piece in run.encode('ascii').split()]
+
+        trigrams = {piece[i:i + 3] for piece in pieces for i in range(len(piece) - 2)}
+        if not trigrams:
+            return None
+
+        postings = []
+        for trigram in trigrams:
+            encoded = self.postings.get(trigram)
+            if encoded is None:
+                return set()
+            postings.append(encoded)
+
+        # Start with the rarest trigram to keep the intermediate sets small
+        postings.sort(key=len)
+        blocks = set(decode_postings(postings[0]))
+        for encoded in postings[1:]:
+            if not blocks:
+                break
+            blocks.intersection_update(decode_postings(encoded))
+        return blocks
+
+    def candidate_windows(self, terms: List[str], case_sensitive: bool,
+                          end_line: int = 0) -> Optional[List[Tuple[int, int]]]:
+        """Find the line ranges that can contain any of the keywords
+
+        Args:
+            terms: Keywords, of which a line has to contain at least one
+            case_sensitive: Whether the keywords are matched case sensitively
+            end_line: Number of lines in the file, the lines after the indexed
+                ones up to it are always candidates
+
+        Returns:
+            List of (start_line, end_line) ranges in file order, or None if
+            the keywords cannot be narrowed down
+        """
+        # Posting lists can already hold blocks of an extension in progress,
+        # only the blocks that block_starts covered beforehand are used
+        block_count = self.block_count
+        indexed_end = self.block_starts[block_count]
+        blocks = self.candidate_blocks(terms, case_sensitive)
+        if blocks is None:
+            return None
+        windows = []
+        for block_id in sorted(blocks):
+            if block_id >= block_count:
+                break
+            start, end = self.block_starts[block_id], self.block_starts[block_id + 1]
+            if windows and windows[-1][1] == start:
+                windows[-1] = (windows[-1][0], end)
+            else:
+                windows.append((start, end))
+        if indexed_end < end_line:
+            if windows and windows[-1][1] == indexed_end:
+                windows[-1] = (windows[-1][0], end_line)
+            else:
+                windows.append((indexed_end, end_line))
+        return windows